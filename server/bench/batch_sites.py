@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import ClientSession
+
+from .server import register_user, running_server
+
+SECRET = "JBSWY3DPEHPK3PXP"
+BATCH_SIZE = 1000
+
+
+async def one_call_per_site(
+    session: ClientSession, base_url: str, token: str, n_sites: int, concurrency: int
+) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(i: int):
+        async with semaphore:
+            async with session.post(
+                f"{base_url}/api/sites",
+                json={"name": f"site-{i}", "secret": SECRET},
+                headers={"Authorization": token},
+            ) as response:
+                response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(n_sites)))
+    return time.perf_counter() - start
+
+
+async def batched(
+    session: ClientSession, base_url: str, token: str, n_sites: int
+) -> float:
+    start = time.perf_counter()
+    for offset in range(0, n_sites, BATCH_SIZE):
+        operations = [
+            {"op": "create", "name": f"site-{i}", "secret": SECRET}
+            for i in range(offset, min(offset + BATCH_SIZE, n_sites))
+        ]
+        async with session.post(
+            f"{base_url}/api/sites/batch",
+            json={"operations": operations},
+            headers={"Authorization": token},
+        ) as response:
+            response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def main(args: argparse.Namespace):
+    async with running_server() as base_url, ClientSession() as session:
+        token = await register_user(session, base_url, "benchbatch")
+        single = await one_call_per_site(
+            session, base_url, token, args.sites, args.concurrency
+        )
+        batch = await batched(session, base_url, token, args.sites)
+
+    print(
+        json.dumps(
+            {
+                "sites": args.sites,
+                "one_call_per_site": {
+                    "seconds": single,
+                    "sites_per_second": args.sites / single,
+                },
+                "batch": {"seconds": batch, "sites_per_second": args.sites / batch},
+                "speedup": single / batch,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare POST /api/sites/batch with one POST /api/sites per site"
+    )
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from modules.api.utils.database import MIGRATIONS, SQL, connect
+
+SITES_PER_USER = 20
+NAME_SIZE = 64  # nom chiffré : IV + texte + tag
+SECRET_SIZE = 64
+
+
+def connect_default(path: str) -> sqlite3.Connection:
+    # Configuration d'origine : pragmas par défaut et index simple sur sites.user
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("BEGIN")
+        MIGRATIONS[0](db)
+    return db
+
+
+def populate(db: sqlite3.Connection, start_user: int, end_user: int):
+    with db:
+        db.executemany(
+            "INSERT INTO users (id, username, passhash) VALUES (?, ?, ?)",
+            (
+                (user_id, f"user{user_id}", b"")
+                for user_id in range(start_user, end_user)
+            ),
+        )
+        db.executemany(
+            SQL.INSERT_SITES,
+            (
+                (user_id, os.urandom(NAME_SIZE), os.urandom(SECRET_SIZE), 0)
+                for user_id in range(start_user, end_user)
+                for _ in range(SITES_PER_USER)
+            ),
+        )
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    quantiles = statistics.quantiles(samples, n=100)
+    return {
+        "p50_us": quantiles[49] * 1e6,
+        "p95_us": quantiles[94] * 1e6,
+        "p99_us": quantiles[98] * 1e6,
+    }
+
+
+def measure_reads(db: sqlite3.Connection, n_users: int, samples: int) -> dict:
+    timings = []
+    for _ in range(samples):
+        user_id = random.randrange(1, n_users + 1)
+        start = time.perf_counter()
+        db.execute(SQL.SELECT_SITES_PAGE, (user_id, 0, -1)).fetchall()
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def measure_writes(db: sqlite3.Connection, n_users: int, samples: int) -> dict:
+    timings = []
+    for _ in range(samples):
+        user_id = random.randrange(1, n_users + 1)
+        start = time.perf_counter()
+        with db:
+            data_version = db.execute(SQL.BUMP_DATA_VERSION, (user_id,)).fetchone()[0]
+            db.execute(
+                SQL.INSERT_SITE,
+                (user_id, os.urandom(NAME_SIZE), os.urandom(SECRET_SIZE), data_version),
+            ).fetchone()
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def run(connector, path: str, steps: list[int], samples: int) -> list[dict]:
+    db = connector(path)
+    results = []
+    n_users = 0
+    for rows in steps:
+        target_users = rows // SITES_PER_USER
+        populate(db, n_users + 1, target_users + 1)
+        n_users = target_users
+        results.append(
+            {
+                "rows": rows,
+                "read": measure_reads(db, n_users, samples),
+                "write": measure_writes(db, n_users, samples),
+            }
+        )
+    db.close()
+    return results
+
+
+def main(args: argparse.Namespace):
+    steps = []
+    rows = args.start_rows
+    while rows <= args.max_rows:
+        steps.append(rows)
+        rows *= 10
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for name, connector in (("default", connect_default), ("tuned", connect)):
+            results[name] = run(
+                connector, os.path.join(directory, f"{name}.db"), steps, args.samples
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the sites read and write paths as the table grows"
+    )
+    parser.add_argument("--start-rows", type=int, default=10_000)
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument(
+        "--directory", default=None, help="where to create the temporary databases"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import secrets
+import statistics
+import subprocess
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import ClientSession, TCPConnector, hdrs
+
+from core_utilities import EVENT_LOOP_BACKENDS, new_event_loop
+
+from .server import SERVER_DIR, running_server, subprocess_server
+
+SECRET = "JBSWY3DPEHPK3PXP"
+# Comme modules.utils.constants, qui ne peut pas être importé avant que la configuration soit définie
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PASSWORD = "password"
+
+# Poids des actions d'un appareil, la majorité du trafic réel est l'actualisation des codes
+ACTIONS = (
+    ("poll", 60),
+    ("delta", 20),
+    ("create", 8),
+    ("rename", 6),
+    ("delete", 5),
+    ("login", 1),
+    ("static", 5),
+)
+
+
+def device_address(index: int) -> str:
+    # Toute la plage 127.0.0.0/8 est locale sous Linux : chaque appareil a sa propre IP et ses propres limites de requêtes
+    index += 1 << 16
+    return f"127.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "HEAD"),
+            cwd=SERVER_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Recorder:
+    __slots__ = ("latencies", "statuses", "errors")
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    async def request(
+        self,
+        session: ClientSession,
+        endpoint: str,
+        method: str,
+        url: str,
+        **kwargs,
+    ) -> tuple[int, dict | None, dict]:
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+                headers = dict(response.headers)
+        except Exception as e:
+            self.errors[f"{endpoint}: {type(e).__name__}"] += 1
+            return 0, None, {}
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        self.statuses[endpoint][status] += 1
+        data = (
+            json.loads(body)
+            if body
+            and headers.get(hdrs.CONTENT_TYPE, "").startswith("application/json")
+            else None
+        )
+        return status, data, headers
+
+    def report(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            quantiles = (
+                statistics.quantiles(latencies, n=100, method="inclusive")
+                if len(latencies) > 1
+                else [latencies[0]] * 99
+            )
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "throughput": len(latencies) / duration,
+                "p50_ms": quantiles[49] * 1e3,
+                "p95_ms": quantiles[94] * 1e3,
+                "p99_ms": quantiles[98] * 1e3,
+                "statuses": {
+                    str(status): count
+                    for status, count in sorted(self.statuses[endpoint].items())
+                },
+            }
+        return {
+            "requests": sum(len(latencies) for latencies in self.latencies.values()),
+            "throughput": sum(len(latencies) for latencies in self.latencies.values())
+            / duration,
+            "endpoints": endpoints,
+            "errors": dict(self.errors),
+        }
+
+
+class Device:
+    __slots__ = (
+        "base_url",
+        "recorder",
+        "session",
+        "random",
+        "username",
+        "token",
+        "site_ids",
+        "etag",
+        "version",
+        "static_path",
+    )
+
+    def __init__(
+        self,
+        base_url: str,
+        recorder: Recorder,
+        index: int,
+        seed: int,
+        username: str,
+        static_path: str,
+    ):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.session = ClientSession(
+            connector=TCPConnector(limit=1, local_addr=(device_address(index), 0))
+        )
+        self.random = random.Random(seed * 1_000_003 + index)
+        self.username = username
+        self.token: str | None = None
+        self.site_ids: list[int] = []
+        self.etag: str | None = None
+        self.version = 0
+        self.static_path = static_path
+
+    async def close(self):
+        await self.session.close()
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if self.token is not None:
+            headers[hdrs.AUTHORIZATION] = self.token
+        status, data, response_headers = await self.recorder.request(
+            self.session,
+            endpoint,
+            method,
+            self.base_url + path,
+            headers=headers,
+            **kwargs,
+        )
+        if status == 401 and endpoint not in ("POST /api/login", "POST /api/register"):
+            # Session expirée : l'appareil se reconnecte comme le ferait le client
+            await self.login()
+        return status, data, response_headers
+
+    async def register(self, sites: int) -> bool:
+        status, data, _ = await self.call(
+            "POST /api/register",
+            "POST",
+            "/api/register",
+            json={"username": self.username, "password": PASSWORD},
+        )
+        if status != 201:
+            return False
+        self.token = data["token"]
+        if sites:
+            # Les sites initiaux ne font pas partie des mesures
+            async with self.session.post(
+                f"{self.base_url}/api/sites/batch",
+                json={
+                    "operations": [
+                        {"op": "create", "name": f"site-{i}", "secret": SECRET}
+                        for i in range(sites)
+                    ]
+                },
+                headers={hdrs.AUTHORIZATION: self.token},
+            ) as response:
+                response.raise_for_status()
+        return True
+
+    async def login(self):
+        status, data, _ = await self.call(
+            "POST /api/login",
+            "POST",
+            "/api/login",
+            json={"username": self.username, "password": PASSWORD},
+        )
+        if status == 200:
+            self.token = data["token"]
+
+    async def poll(self):
+        headers = {} if self.etag is None else {hdrs.IF_NONE_MATCH: self.etag}
+        status, data, response_headers = await self.call(
+            "GET /api/sites", "GET", "/api/sites", headers=headers
+        )
+        if status == 200:
+            self.etag = response_headers.get(hdrs.ETAG)
+            self.version = data["version"]
+            self.site_ids = [site["id"] for site in data["sites"]]
+
+    async def delta(self):
+        status, data, _ = await self.call(
+            "GET /api/sites?since", "GET", f"/api/sites?since={self.version}"
+        )
+        if status == 200:
+            self.version = data["version"]
+            known = set(self.site_ids).difference(data.get("deleted", ()))
+            known.update(site["id"] for site in data["sites"])
+            self.site_ids = sorted(known)
+
+    async def create(self):
+        status, data, _ = await self.call(
+            "POST /api/sites",
+            "POST",
+            "/api/sites",
+            json={"name": f"site-{self.random.randrange(1 << 30)}", "secret": SECRET},
+        )
+        if status == 201:
+            self.site_ids.append(data["id"])
+
+    async def rename(self):
+        if not self.site_ids:
+            return await self.create()
+        site_id = self.random.choice(self.site_ids)
+        await self.call(
+            "PATCH /api/sites/{id}",
+            "PATCH",
+            f"/api/sites/{site_id}",
+            json={"name": f"renamed-{self.random.randrange(1 << 30)}"},
+        )
+
+    async def delete(self):
+        if not self.site_ids:
+            return await self.create()
+        site_id = self.site_ids.pop(self.random.randrange(len(self.site_ids)))
+        await self.call("DELETE /api/sites/{id}", "DELETE", f"/api/sites/{site_id}")
+
+    async def static(self):
+        await self.call("GET {static}", "GET", self.static_path)
+
+    async def run(self, deadline: float, think_time: float):
+        actions = [getattr(self, name) for name, _ in ACTIONS]
+        weights = [weight for _, weight in ACTIONS]
+        # Les appareils ne démarrent pas tous en même temps
+        await asyncio.sleep(self.random.uniform(0, think_time))
+        while time.perf_counter() < deadline:
+            await self.random.choices(actions, weights)[0]()
+            await asyncio.sleep(self.random.expovariate(1 / think_time))
+
+
+async def run_load(base_url: str, args: argparse.Namespace) -> dict:
+    setup_recorder = Recorder()
+    recorder = Recorder()
+    devices = [
+        Device(
+            base_url,
+            setup_recorder,
+            index,
+            args.seed,
+            f"load-{args.seed}-{index % args.users}",
+            args.static_path,
+        )
+        for index in range(args.devices)
+    ]
+    try:
+        # Le premier appareil de chaque utilisateur crée le compte, les autres s'y connectent
+        semaphore = asyncio.Semaphore(args.setup_concurrency)
+
+        async def setup_device(device: Device, owner: bool):
+            async with semaphore:
+                if owner:
+                    await device.register(args.sites_per_user)
+                else:
+                    await device.login()
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                setup_device(device, True)
+                for device in devices[: min(args.users, args.devices)]
+            )
+        )
+        await asyncio.gather(
+            *(setup_device(device, False) for device in devices[args.users :])
+        )
+        setup_duration = time.perf_counter() - start
+
+        async with ClientSession(
+            headers={ADMIN_TOKEN_HEADER: os.environ["ADMIN_TOKEN"]}
+        ) as admin_session:
+            # Seul le retard de la boucle pendant la phase mesurée est rapporté
+            async with admin_session.post(
+                f"{base_url}/api/admin/loop/reset"
+            ) as response:
+                response.raise_for_status()
+
+            for device in devices:
+                device.recorder = recorder
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    device.run(start + args.duration, args.think_time)
+                    for device in devices
+                )
+            )
+            duration = time.perf_counter() - start
+
+            async with admin_session.get(f"{base_url}/api/admin/loop") as response:
+                response.raise_for_status()
+                loop = await response.json()
+    finally:
+        await asyncio.gather(*(device.close() for device in devices))
+
+    return {
+        "setup": {"seconds": setup_duration, **setup_recorder.report(setup_duration)},
+        "run": {"seconds": duration, **recorder.report(duration)},
+        "loop": {**loop["lag"], "stall_count": loop["stall_count"]},
+    }
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    comparison = {}
+    endpoints = baseline["run"]["endpoints"]
+    for endpoint, stats in results["run"]["endpoints"].items():
+        if endpoint not in endpoints:
+            continue
+        comparison[endpoint] = {
+            key: stats[key] / endpoints[endpoint][key]
+            for key in ("throughput", "p50_ms", "p95_ms", "p99_ms")
+            if endpoints[endpoint][key]
+        }
+    if "loop" in baseline:
+        comparison["loop_lag"] = {
+            key: results["loop"][key] / baseline["loop"][key]
+            for key in ("p50_ms", "p90_ms", "p99_ms", "max_ms")
+            if baseline["loop"].get(key)
+        }
+    return comparison
+
+
+async def load_with(args: argparse.Namespace, loop_backend: str) -> dict:
+    # En sous-processus seul le serveur change de boucle, les clients restent sur asyncio
+    server = (
+        subprocess_server(loop_backend=loop_backend)
+        if args.subprocess
+        else running_server()
+    )
+    async with server as base_url:
+        return await run_load(base_url, args)
+
+
+def run_with(args: argparse.Namespace, loop_backend: str) -> dict:
+    loop_factory = (
+        asyncio.new_event_loop
+        if args.subprocess
+        else functools.partial(new_event_loop, loop_backend)
+    )
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(load_with(args, loop_backend))
+
+
+def baseline_for(baseline: dict, loop_backend: str) -> dict | None:
+    # Les résultats d'une seule boucle sont à la racine, ceux de plusieurs boucles dans « runs »
+    if "runs" in baseline:
+        return baseline["runs"].get(loop_backend)
+    return baseline
+
+
+def main(args: argparse.Namespace):
+    # Jeton d'administration pour lire le retard de la boucle, hérité par le serveur lancé en sous-processus
+    os.environ.setdefault("ADMIN_TOKEN", secrets.token_urlsafe())
+    runs = {loop_backend: run_with(args, loop_backend) for loop_backend in args.loops}
+
+    output = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+    }
+    if len(runs) == 1:
+        output.update(next(iter(runs.values())))
+    else:
+        output["runs"] = runs
+        # Rapports résultat / première boucle : au-dessus de 1, le débit a augmenté ou la latence s'est dégradée
+        reference_backend, *other_backends = runs
+        output[f"compared_to_{reference_backend}"] = {
+            loop_backend: compare(runs[loop_backend], runs[reference_backend])
+            for loop_backend in other_backends
+        }
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        # Rapports résultat / référence : au-dessus de 1, le débit a augmenté ou la latence s'est dégradée
+        comparisons = {
+            loop_backend: compare(results, reference)
+            for loop_backend, results in runs.items()
+            if (reference := baseline_for(baseline, loop_backend)) is not None
+        }
+        output["compared_to_baseline"] = (
+            next(iter(comparisons.values()), {}) if len(runs) == 1 else comparisons
+        )
+
+    text = json.dumps(output, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate devices driving a realistic mix of API calls and report per-endpoint latencies. "
+        "Each device uses its own loopback address, which requires Linux."
+    )
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--sites-per-user", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=2,
+        help="mean delay in seconds between two calls of a device",
+    )
+    parser.add_argument("--setup-concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--subprocess",
+        action="store_true",
+        help="run the server in a separate process instead of the client's event loop",
+    )
+    parser.add_argument(
+        "--loops",
+        nargs="+",
+        choices=EVENT_LOOP_BACKENDS,
+        default=["asyncio"],
+        help="event loops to run the server on, one load run each (with --subprocess only the server loop changes)",
+    )
+    parser.add_argument(
+        "--static-path",
+        default="/index.html",
+        help="static file requested by the static action (served from ../front/dist)",
+    )
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument(
+        "--baseline", help="JSON results of a previous run to compare with"
+    )
+    args = parser.parse_args()
+    if len(args.loops) > 1 and not args.subprocess:
+        # La configuration (base temporaire comprise) est lue une seule fois par processus
+        parser.error("comparing several event loops requires --subprocess")
+    main(args)
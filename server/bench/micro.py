@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+import bcrypt
+from aiohttp import hdrs
+
+from modules.api.utils.a2f import generate_code
+from modules.api.utils.auth import (
+    Token,
+    TokenEncryptor,
+    TokenEncryptorManager,
+    hash_password,
+)
+from modules.api.utils.encryption import Encryptor
+
+PAYLOAD_SIZES = (16, 64, 1024, 64 * 1024)
+VAULT_SIZES = (10, 100, 1000)
+SECRET = "JBSWY3DPEHPK3PXP"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "micro_baseline.json")
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def calibrate(func: Callable[[], object], min_time: float) -> int:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time:
+            return loops
+        loops *= 2
+
+
+def measure(
+    func: Callable[[], object], values: int, min_time: float
+) -> dict[str, float | int]:
+    # Comme pyperf : boucles calibrées, une valeur d'échauffement ignorée, puis plusieurs valeurs
+    loops = calibrate(func, min_time)
+    timings = []
+    for _ in range(values + 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    timings = timings[1:]
+    return {
+        "loops": loops,
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "stdev_us": (statistics.stdev(timings) if len(timings) > 1 else 0) * 1e6,
+    }
+
+
+def make_vault(token: Token, size: int) -> list[tuple[bytes, bytes]]:
+    return [
+        (token.encrypt_string(f"site-{i}"), token.encrypt_string(SECRET))
+        for i in range(size)
+    ]
+
+
+def read_vault(token: Token, vault: list[tuple[bytes, bytes]]) -> list[tuple]:
+    # Travail d'un GET /api/sites : déchiffrer chaque site et calculer son code
+    return [
+        (
+            token.decrypt_string(encrypted_name),
+            generate_code(token.decrypt_string(encrypted_secret)),
+        )
+        for encrypted_name, encrypted_secret in vault
+    ]
+
+
+def collect_benchmarks() -> dict[str, Callable[[], object]]:
+    benchmarks = {}
+    key = hash_password(b"password")
+    encryptor = Encryptor(key)
+    for size in PAYLOAD_SIZES:
+        payload = os.urandom(size)
+        ciphertext = encryptor.encrypt(payload)
+        benchmarks[f"Encryptor.encrypt[{size}B]"] = (
+            lambda payload=payload: encryptor.encrypt(payload)
+        )
+        benchmarks[f"Encryptor.decrypt[{size}B]"] = (
+            lambda ciphertext=ciphertext: encryptor.decrypt(ciphertext)
+        )
+
+    token_encryptor = TokenEncryptor(600 * 10**9)
+    encrypted_token, token = token_encryptor.encrypt(1, key)
+    benchmarks["TokenEncryptor.encrypt"] = lambda: token_encryptor.encrypt(1, key)
+    benchmarks["TokenEncryptor.decrypt"] = lambda: token_encryptor.decrypt(
+        encrypted_token
+    )
+
+    manager = TokenEncryptorManager(600, 3, "2FA")
+    request = SimpleNamespace(
+        headers={hdrs.AUTHORIZATION: manager.generate_token(1, b"password")}
+    )
+    benchmarks["TokenEncryptorManager.get_token"] = lambda: manager.get_token(request)
+    fernet_manager = TokenEncryptorManager(600, 3, "2FA", compact=False)
+    fernet_request = SimpleNamespace(
+        headers={hdrs.AUTHORIZATION: fernet_manager.generate_token(1, b"password")}
+    )
+    benchmarks["TokenEncryptorManager.get_token[fernet]"] = (
+        lambda: fernet_manager.get_token(fernet_request)
+    )
+
+    benchmarks["generate_code"] = lambda: generate_code(SECRET)
+    benchmarks["hash_password"] = lambda: hash_password(b"password")
+
+    for size in VAULT_SIZES:
+        vault = make_vault(token, size)
+        names = [f"site-{i}".encode() for i in range(size)]
+        encrypted_names = [encrypted_name for encrypted_name, _ in vault]
+        benchmarks[f"Encryptor.encrypt_many[{size} sites]"] = (
+            lambda names=names: encryptor.encrypt_many(names)
+        )
+        benchmarks[f"Encryptor.decrypt_many[{size} sites]"] = (
+            lambda encrypted_names=encrypted_names: token.decrypt_many(encrypted_names)
+        )
+        benchmarks[f"read_vault[{size} sites]"] = lambda vault=vault: read_vault(
+            token, vault
+        )
+
+    passhash = bcrypt.hashpw(b"password", bcrypt.gensalt(12))
+    benchmarks["bcrypt.checkpw[12 rounds]"] = lambda: bcrypt.checkpw(
+        b"password", passhash
+    )
+    return benchmarks
+
+
+async def run_worker(args: argparse.Namespace) -> dict[str, dict]:
+    # TokenEncryptorManager programme l'expiration de ses clés sur la boucle d'événements
+    benchmarks = collect_benchmarks()
+    return {
+        name: measure(func, args.values, args.min_time)
+        for name, func in benchmarks.items()
+        if not args.filter or args.filter in name
+    }
+
+
+def run(args: argparse.Namespace) -> dict[str, dict]:
+    # Comme pyperf, chaque processus a son propre état (allocations, caches), le bruit entre processus est ainsi mesuré
+    runs = []
+    for _ in range(args.processes):
+        command = [
+            sys.executable,
+            "-m",
+            "bench.micro",
+            "--worker",
+            "--values",
+            str(args.values),
+            "--min-time",
+            str(args.min_time),
+        ]
+        if args.filter:
+            command += ["--filter", args.filter]
+        runs.append(
+            json.loads(
+                subprocess.run(
+                    command, cwd=SERVER_DIR, capture_output=True, check=True, text=True
+                ).stdout
+            )
+        )
+
+    results = {}
+    for name in runs[0]:
+        medians = [worker_results[name]["median_us"] for worker_results in runs]
+        results[name] = {
+            "min_us": min(worker_results[name]["min_us"] for worker_results in runs),
+            "median_us": statistics.median(medians),
+            "stdev_us": statistics.stdev(medians) if len(medians) > 1 else 0,
+        }
+        print(
+            f"{name:<40} {results[name]['median_us']:>12.2f} us +- {results[name]['stdev_us']:.2f}",
+            file=sys.stderr,
+        )
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        # Le minimum est le moins sensible aux interruptions du système
+        ratio = result["min_us"] / reference["min_us"]
+        if ratio > threshold:
+            regressions.append(
+                f"{name}: {reference['min_us']:.2f} us -> {result['min_us']:.2f} us ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.worker:
+        json.dump(asyncio.run(run_worker(args)), sys.stdout)
+        return 0
+
+    results = run(args)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved the baseline to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(
+            f"No baseline at {args.baseline}, run with --save-baseline first",
+            file=sys.stderr,
+        )
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = find_regressions(results, json.load(file), args.threshold)
+    if regressions:
+        print(
+            f"Slower than the baseline by more than {args.threshold}x:", file=sys.stderr
+        )
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    print(f"No benchmark exceeded {args.threshold}x its baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the crypto and TOTP primitives and compare them with a stored baseline. "
+        "Baselines only make sense on the machine that recorded them."
+    )
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument(
+        "--values", type=int, default=5, help="measured values per process"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="minimum duration in seconds of one measured value",
+    )
+    parser.add_argument("--filter", help="only run benchmarks containing this text")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="record the results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=float(os.getenv("BENCH_THRESHOLD", "1.25")),
+        help="maximum allowed ratio to the baseline minimum",
+    )
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import signal
+import sys
+import tempfile
+from typing import AsyncIterator
+
+from aiohttp import ClientSession, web
+
+from core_utilities import EVENT_LOOP_BACKENDS, new_event_loop
+
+__all__ = ("SERVER_DIR", "running_server", "subprocess_server", "register_user")
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.asynccontextmanager
+async def running_server(
+    host: str = "127.0.0.1", port: int = 0, unix_path: str | None = None
+) -> AsyncIterator[str]:
+    with tempfile.TemporaryDirectory() as directory:
+        # La configuration est lue à l'import des modules, la base temporaire doit être définie avant
+        os.environ["DATABASE_PATH"] = os.path.join(directory, "database.db")
+        os.chdir(SERVER_DIR)
+        logging.basicConfig(level=logging.WARNING)
+
+        import module_loader
+        from listeners import UnixListener
+        from web_server import WebApplication
+
+        modules_manager = module_loader.ModulesManager()
+        modules_manager.logger.setLevel(logging.WARNING)
+        app = WebApplication(modules_manager, asyncio.get_running_loop())
+        await modules_manager.load_modules()
+        modules_manager.ready.set()
+
+        runner = web.ServerRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = runner.addresses[0][1]
+        # Même application derrière une socket Unix, pour comparer les transports
+        unix_listener = None if unix_path is None else UnixListener(unix_path, 0o600)
+        if unix_listener is not None:
+            await unix_listener.make_site(runner).start()
+        try:
+            yield f"http://{host}:{port}"
+        finally:
+            await modules_manager.unload()
+            await runner.cleanup()
+            if unix_listener is not None:
+                unix_listener.close()
+
+
+@contextlib.asynccontextmanager
+async def subprocess_server(
+    host: str = "127.0.0.1",
+    loop_backend: str = "asyncio",
+    unix_path: str | None = None,
+) -> AsyncIterator[str]:
+    # Le serveur n'entre pas en concurrence avec les clients pour la boucle d'événements
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "bench.server",
+        "--host",
+        host,
+        "--loop",
+        loop_backend,
+        *(() if unix_path is None else ("--unix", unix_path)),
+        cwd=SERVER_DIR,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    try:
+        base_url = (await process.stdout.readline()).decode().strip()
+        if not base_url:
+            raise RuntimeError("The server process exited before listening")
+        yield base_url
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+async def register_user(
+    session: ClientSession, base_url: str, username: str, password: str = "password"
+) -> str:
+    async with session.post(
+        f"{base_url}/api/register", json={"username": username, "password": password}
+    ) as response:
+        response.raise_for_status()
+        return (await response.json())["token"]
+
+
+async def serve(host: str, port: int, unix_path: str | None):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    async with running_server(host, port, unix_path) as base_url:
+        print(base_url, flush=True)
+        await stop.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the API against a temporary database until interrupted"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--unix", help="also serve on this Unix socket path")
+    parser.add_argument("--loop", choices=EVENT_LOOP_BACKENDS, default="asyncio")
+    args = parser.parse_args()
+    with asyncio.Runner(
+        loop_factory=functools.partial(new_event_loop, args.loop)
+    ) as runner:
+        runner.run(serve(args.host, args.port, args.unix))
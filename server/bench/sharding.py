@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+
+async def run_writers(
+    path: str, shard_count: int, n_writers: int, writes_per_writer: int
+) -> dict:
+    from modules.api.utils.database import SQL, bump_data_version
+    from modules.api.utils.storage import ShardedStorage
+
+    storage = ShardedStorage(path, shard_count)
+
+    def create_user(db, user_id: int, username: str):
+        db.execute(SQL.INSERT_USER, (user_id, username, b""))
+
+    def create_site(db, user_id: int) -> int:
+        data_version = bump_data_version(db, user_id)
+        return db.execute(
+            SQL.INSERT_SITE,
+            (user_id, os.urandom(64), os.urandom(64), data_version),
+        ).fetchone()[0]
+
+    user_ids = []
+    for i in range(n_writers):
+        user_id = await storage.reserve_username(f"writer{i}")
+        await storage.shard(user_id).writes.submit(create_user, user_id, f"writer{i}")
+        user_ids.append(user_id)
+
+    async def writer(user_id: int):
+        for _ in range(writes_per_writer):
+            await storage.shard(user_id).writes.submit(create_site, user_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    await storage.close()
+
+    return {
+        "seconds": elapsed,
+        "writes_per_second": n_writers * writes_per_writer / elapsed,
+    }
+
+
+async def main(args: argparse.Namespace):
+    # La configuration est lue à l'import, le mode de synchronisation doit être défini avant
+    os.environ["DATABASE_SYNCHRONOUS"] = args.synchronous
+
+    results = {"synchronous": args.synchronous, "writers": args.writers}
+    for shard_count in args.shards:
+        with tempfile.TemporaryDirectory() as directory:
+            results[f"{shard_count}_shards"] = await run_writers(
+                os.path.join(directory, "database.db"),
+                shard_count,
+                args.writers,
+                args.writes,
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure write throughput as users are spread across more shards"
+    )
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writers", type=int, default=256)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument(
+        "--synchronous", default="FULL", choices=("OFF", "NORMAL", "FULL")
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+from aiohttp import hdrs
+
+from modules.api.utils.auth import TokenEncryptorManager
+
+FORMATS = {"compact": True, "fernet": False}
+
+
+def per_call_us(func: Callable[[], object], min_time: float) -> float:
+    loops = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < min_time:
+        func()
+        loops += 1
+    return elapsed / loops * 1e6
+
+
+async def main(args: argparse.Namespace):
+    # TokenEncryptorManager programme l'expiration de ses clés sur la boucle d'événements
+    results = {}
+    for name, compact in FORMATS.items():
+        manager = TokenEncryptorManager(600, 3, "2FA", compact)
+        token = manager.generate_token(1, b"password")
+        request = SimpleNamespace(headers={hdrs.AUTHORIZATION: token})
+        results[name] = {
+            "header_bytes": len(token),
+            "generate_us": per_call_us(
+                lambda: manager.generate_token(1, b"password"), args.min_time
+            ),
+            "verify_us": per_call_us(lambda: manager.get_token(request), args.min_time),
+        }
+    results["compact_vs_fernet"] = {
+        key: results["compact"][key] / results["fernet"][key]
+        for key in results["compact"]
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the Authorization header size and the generation and verification cost "
+        "of compact AES-GCM tokens and Fernet tokens"
+    )
+    parser.add_argument("--min-time", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import time
+from typing import Callable
+
+import pyotp
+
+from modules.api.utils.a2f import TOTP_INTERVAL, TotpKey, generate_site_codes
+
+VAULT_SIZES = (10, 100, 1000)
+WINDOWS = 5
+
+
+def pyotp_codes(secrets: list[str], windows: int | None) -> list[dict]:
+    # Implémentation d'origine : un pyotp.TOTP construit (et le secret décodé) à chaque code
+    if windows is None:
+        return [{"code": pyotp.TOTP(secret).now()} for secret in secrets]
+    timecode = int(time.time()) // TOTP_INTERVAL
+    return [
+        {
+            "codes": [
+                pyotp.TOTP(secret).at(counter * TOTP_INTERVAL)
+                for counter in range(timecode, timecode + windows)
+            ]
+        }
+        for secret in secrets
+    ]
+
+
+def per_site_us(func: Callable[[], object], sites: int, min_time: float) -> float:
+    loops = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < min_time:
+        func()
+        loops += 1
+    return elapsed / loops / sites * 1e6
+
+
+def check(secrets: list[str]):
+    # Les deux implémentations doivent donner les mêmes codes
+    timecode = int(time.time()) // TOTP_INTERVAL
+    for secret in secrets:
+        key = TotpKey.from_stored(secret)
+        totp = pyotp.TOTP(secret)
+        for counter in range(timecode, timecode + WINDOWS):
+            assert key.generate(counter) == totp.generate_otp(counter), secret
+
+
+def main(args: argparse.Namespace):
+    results = {}
+    for size in VAULT_SIZES:
+        secrets = [
+            base64.b32encode(os.urandom(20)).decode("ascii") for _ in range(size)
+        ]
+        keys = [TotpKey.from_stored(secret) for secret in secrets]
+        check(secrets)
+        results[f"{size}_sites"] = {
+            f"{label}_us_per_site": {
+                "pyotp": per_site_us(
+                    lambda: pyotp_codes(secrets, windows), size, args.min_time
+                ),
+                "batch": per_site_us(
+                    lambda: generate_site_codes(secrets, windows), size, args.min_time
+                ),
+                "decoded_keys": per_site_us(
+                    lambda: [key.site_codes(time.time(), windows) for key in keys],
+                    size,
+                    args.min_time,
+                ),
+            }
+            for label, windows in (("code", None), (f"{WINDOWS}_windows", WINDOWS))
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the per-site cost of TOTP generation: pyotp per call, batch engine from stored secrets, already decoded keys"
+    )
+    parser.add_argument("--min-time", type=float, default=0.5)
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from aiohttp import BaseConnector, ClientSession, TCPConnector, UnixConnector, hdrs
+
+from .server import register_user, subprocess_server
+
+SECRET = "JBSWY3DPEHPK3PXP"
+
+
+def make_connector(transport: str, unix_path: str, force_close: bool) -> BaseConnector:
+    if transport == "unix":
+        return UnixConnector(unix_path, force_close=force_close)
+    return TCPConnector(force_close=force_close)
+
+
+async def sequential(
+    session: ClientSession, url: str, headers: dict[str, str], requests: int
+) -> list[float]:
+    # Une requête à la fois : la latence mesurée est celle d'un aller-retour proxy -> serveur
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        async with session.get(url, headers=headers) as response:
+            await response.read()
+            if response.status >= 400:
+                response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def concurrent(
+    session: ClientSession,
+    url: str,
+    headers: dict[str, str],
+    requests: int,
+    concurrency: int,
+) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            sequential(session, url, headers, requests // concurrency)
+            for _ in range(concurrency)
+        )
+    )
+    return requests // concurrency * concurrency / (time.perf_counter() - start)
+
+
+async def prepare_user(base_url: str, sites: int) -> tuple[str, str]:
+    async with ClientSession() as session:
+        token = await register_user(session, base_url, "transport")
+        async with session.post(
+            f"{base_url}/api/sites/batch",
+            json={
+                "operations": [
+                    {"op": "create", "name": f"site-{i}", "secret": SECRET}
+                    for i in range(sites)
+                ]
+            },
+            headers={hdrs.AUTHORIZATION: token},
+        ) as response:
+            response.raise_for_status()
+        async with session.get(
+            f"{base_url}/api/sites", headers={hdrs.AUTHORIZATION: token}
+        ) as response:
+            response.raise_for_status()
+            return token, response.headers[hdrs.ETAG]
+
+
+async def main(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        unix_path = os.path.join(directory, "server.sock")
+        async with subprocess_server(unix_path=unix_path) as base_url:
+            token, etag = await prepare_user(base_url, args.sites)
+            endpoints = {
+                "GET /api/sites": {hdrs.AUTHORIZATION: token},
+                # Revalidation par ETag : presque tout le coût restant est celui du transport
+                "GET /api/sites (304)": {
+                    hdrs.AUTHORIZATION: token,
+                    hdrs.IF_NONE_MATCH: etag,
+                },
+            }
+            # Le nom d'hôte est ignoré par le connecteur Unix
+            url = f"{base_url}/api/sites"
+            results = {}
+            for transport in ("tcp", "unix"):
+                for connection, force_close in (
+                    ("keep_alive", False),
+                    ("new_connection", True),
+                ):
+                    async with ClientSession(
+                        connector=make_connector(transport, unix_path, force_close)
+                    ) as session:
+                        for endpoint, headers in endpoints.items():
+                            await sequential(session, url, headers, args.warmup)
+                            latencies = await sequential(
+                                session, url, headers, args.requests
+                            )
+                            quantiles = statistics.quantiles(
+                                latencies, n=100, method="inclusive"
+                            )
+                            results.setdefault(transport, {}).setdefault(
+                                connection, {}
+                            )[endpoint] = {
+                                "p50_ms": quantiles[49] * 1e3,
+                                "p99_ms": quantiles[98] * 1e3,
+                                "throughput": await concurrent(
+                                    session,
+                                    url,
+                                    headers,
+                                    args.requests,
+                                    args.concurrency,
+                                ),
+                            }
+
+    # Rapports Unix / TCP : en dessous de 1, la latence baisse ; au-dessus de 1, le débit augmente
+    results["unix_vs_tcp"] = {
+        connection: {
+            endpoint: {
+                key: stats[key] / results["tcp"][connection][endpoint][key]
+                for key in stats
+            }
+            for endpoint, stats in endpoints_stats.items()
+        }
+        for connection, endpoints_stats in results["unix"].items()
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the latency of the same requests over loopback TCP and a Unix socket, "
+        "as seen by a local reverse proxy"
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sites", type=int, default=20)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from typing import Callable
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from modules.api.utils.encryption import Encryptor
+
+VAULT_SIZES = (10, 100, 1000, 10000)
+FIELD_SIZE = 32
+
+
+def legacy_encrypt(key: bytes, plaintext: bytes) -> bytes:
+    # Implémentation d'origine : un Cipher construit à chaque appel et des copies de l'IV, du corps et du tag
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(key), modes.GCM(iv)).encryptor()
+    ciphertext = encryptor.update(plaintext) + encryptor.finalize()
+    return iv + ciphertext + encryptor.tag
+
+
+def legacy_decrypt(key: bytes, ciphertext: bytes) -> bytes:
+    iv = ciphertext[:16]
+    tag = ciphertext[-16:]
+    ciphertext = ciphertext[16:-16]
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(iv, tag)).decryptor()
+    return decryptor.update(ciphertext) + decryptor.finalize()
+
+
+def per_site_us(func: Callable[[], object], sites: int, min_time: float) -> float:
+    loops = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < min_time:
+        func()
+        loops += 1
+    return elapsed / loops / sites * 1e6
+
+
+def main(args: argparse.Namespace):
+    key = os.urandom(32)
+    encryptor = Encryptor(key)
+    results = {}
+    for size in VAULT_SIZES:
+        plaintexts = [os.urandom(FIELD_SIZE) for _ in range(size)]
+        ciphertexts = encryptor.encrypt_many(plaintexts)
+        results[f"{size}_sites"] = {
+            "encrypt_us_per_site": {
+                "legacy": per_site_us(
+                    lambda: [legacy_encrypt(key, p) for p in plaintexts],
+                    size,
+                    args.min_time,
+                ),
+                "per_item": per_site_us(
+                    lambda: [encryptor.encrypt(p) for p in plaintexts],
+                    size,
+                    args.min_time,
+                ),
+                "batch": per_site_us(
+                    lambda: encryptor.encrypt_many(plaintexts), size, args.min_time
+                ),
+            },
+            "decrypt_us_per_site": {
+                "legacy": per_site_us(
+                    lambda: [legacy_decrypt(key, c) for c in ciphertexts],
+                    size,
+                    args.min_time,
+                ),
+                "per_item": per_site_us(
+                    lambda: [encryptor.decrypt(c) for c in ciphertexts],
+                    size,
+                    args.min_time,
+                ),
+                "batch": per_site_us(
+                    lambda: encryptor.decrypt_many(ciphertexts),
+                    size,
+                    args.min_time,
+                ),
+            },
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the per-site cost of vault encryption: original Cipher per call, reusable AESGCM, batch API"
+    )
+    parser.add_argument("--min-time", type=float, default=0.5)
+    main(parser.parse_args())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+SITES_PER_USER = 20
+
+
+async def run_writers(
+    path: str, n_writers: int, writes_per_writer: int, max_batch: int
+) -> dict:
+    from modules.api.utils.database import SQL, WriteQueue, bump_data_version, connect
+
+    connect(path).close()
+    queue = WriteQueue(path, max_batch=max_batch)
+
+    def create_user(db, user_id: int):
+        db.execute(SQL.INSERT_USER, (user_id, f"writer{user_id}", b""))
+
+    def create_site(db, user_id: int) -> int:
+        data_version = bump_data_version(db, user_id)
+        return db.execute(
+            SQL.INSERT_SITE,
+            (user_id, os.urandom(64), os.urandom(64), data_version),
+        ).fetchone()[0]
+
+    user_ids = range(1, n_writers + 1)
+    await asyncio.gather(*(queue.submit(create_user, user_id) for user_id in user_ids))
+    commits_before = queue.commits
+
+    async def writer(user_id: int):
+        # Chaque écrivain attend la validation de son écriture avant la suivante, comme un client HTTP
+        for _ in range(writes_per_writer):
+            await queue.submit(create_site, user_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    commits = queue.commits - commits_before
+    await queue.close()
+
+    writes = n_writers * writes_per_writer
+    return {
+        "seconds": elapsed,
+        "writes_per_second": writes / elapsed,
+        "commits": commits,
+        "commits_per_second": commits / elapsed,
+        "average_batch_size": writes / commits,
+    }
+
+
+async def main(args: argparse.Namespace):
+    # La configuration est lue à l'import, le mode de synchronisation doit être défini avant
+    os.environ["DATABASE_SYNCHRONOUS"] = args.synchronous
+
+    results = {"synchronous": args.synchronous, "writers": args.writers}
+    for name, max_batch in (("one_commit_per_write", 1), ("group_commit", 256)):
+        with tempfile.TemporaryDirectory() as directory:
+            results[name] = await run_writers(
+                os.path.join(directory, "database.db"),
+                args.writers,
+                args.writes,
+                max_batch,
+            )
+    results["speedup"] = (
+        results["group_commit"]["writes_per_second"]
+        / results["one_commit_per_write"]["writes_per_second"]
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare group commit with one commit per write for concurrent writers"
+    )
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument(
+        "--synchronous",
+        default="NORMAL",
+        choices=("OFF", "NORMAL", "FULL"),
+        help="With FULL, each commit is an fsync",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -12,3 +12,58 @@ DOMAINS = os.getenv("DOMAINS").split(",")
 HTTP_PORT = int(os.getenv("HTTP_PORT"))
 HTTPS_PORT = int(os.getenv("HTTPS_PORT"))
 DEV_ENV = os.getenv("DEV_ENV") == "true"
+# Une seule socket IPv6 acceptant aussi l'IPv4 par port, si le système le permet
+DUAL_STACK = os.getenv("DUAL_STACK", "true") == "true"
+# Sockets Unix pour un reverse proxy local, séparées par des virgules
+UNIX_SOCKETS = [path for path in os.getenv("UNIX_SOCKETS", "").split(",") if path]
+UNIX_SOCKET_MODE = int(os.getenv("UNIX_SOCKET_MODE", "660"), 8)
+UNIX_SOCKET_GROUP = os.getenv("UNIX_SOCKET_GROUP")
+# "asyncio" ou "uvloop" (si installé)
+EVENT_LOOP = os.getenv("EVENT_LOOP", "asyncio")
+DATABASE_PATH = os.getenv("DATABASE_PATH", "database.db")
+DATABASE_SYNCHRONOUS = os.getenv("DATABASE_SYNCHRONOUS", "NORMAL")
+DATABASE_SHARDS = int(os.getenv("DATABASE_SHARDS", "1"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Format des jetons émis, "compact" (AES-GCM) ou "fernet" ; les deux sont acceptés
+TOKEN_FORMAT = os.getenv("TOKEN_FORMAT", "compact")
+# Limites de requêtes : table en mémoire partagée (ex. /dev/shm/secondlock-ratelimits) commune aux processus,
+# propre au processus sinon ; la même capacité doit être utilisée par tous les processus
+RATELIMIT_SHM_PATH = os.getenv("RATELIMIT_SHM_PATH")
+RATELIMIT_CAPACITY = int(os.getenv("RATELIMIT_CAPACITY", "65536"))
+# Sauvegarde restaurée au démarrage lorsque la table vient d'être créée, désactivée si vide
+RATELIMIT_SNAPSHOT_PATH = os.getenv(
+    "RATELIMIT_SNAPSHOT_PATH", f"{DATABASE_PATH}.ratelimits"
+)
+RATELIMIT_SNAPSHOT_INTERVAL = float(os.getenv("RATELIMIT_SNAPSHOT_INTERVAL", "60"))
+# Traces OTLP-JSON, désactivées sans TRACING_PATH
+TRACING_PATH = os.getenv("TRACING_PATH")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.01"))
+TRACING_SLOW_MS = float(os.getenv("TRACING_SLOW_MS", "250"))
+# Compression des réponses : taille minimale, et taille à partir de laquelle elle se fait hors de la boucle
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_EXECUTOR_SIZE = int(os.getenv("COMPRESSION_EXECUTOR_SIZE", "65536"))
+# Nombre de tâches de fond exécutées en même temps
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "16"))
+# Maintenance de la base : intervalle (0 pour la désactiver), durée d'une tranche et pause entre deux tranches,
+# nombre de requêtes en cours au-delà duquel elle attend, et durée maximale d'un passage
+DATABASE_MAINTENANCE_INTERVAL = float(
+    os.getenv("DATABASE_MAINTENANCE_INTERVAL", "3600")
+)
+DATABASE_MAINTENANCE_SLICE = float(os.getenv("DATABASE_MAINTENANCE_SLICE", "0.05"))
+DATABASE_MAINTENANCE_PAUSE = float(os.getenv("DATABASE_MAINTENANCE_PAUSE", "0.5"))
+DATABASE_MAINTENANCE_MAX_REQUESTS = int(
+    os.getenv("DATABASE_MAINTENANCE_MAX_REQUESTS", "2")
+)
+DATABASE_MAINTENANCE_MAX_DURATION = float(
+    os.getenv("DATABASE_MAINTENANCE_MAX_DURATION", "60")
+)
+# Taille maximale du corps des requêtes, sauf limite déclarée avec la route
+MAX_BODY_SIZE = int(os.getenv("MAX_BODY_SIZE", "65536"))
+# Mémoire réservée à l'ensemble des corps en cours de lecture, et délai pour les lire
+MAX_BUFFERED_BODY_SIZE = int(os.getenv("MAX_BUFFERED_BODY_SIZE", str(64 * 1024**2)))
+BODY_READ_TIMEOUT = float(os.getenv("BODY_READ_TIMEOUT", "10"))
+# Intervalle en secondes de la ligne de journal sur la mémoire, 0 pour la désactiver
+MEMORY_LOG_INTERVAL = float(os.getenv("MEMORY_LOG_INTERVAL", "600"))
+# Surveillance de la boucle d'événements
+LOOP_HEARTBEAT_MS = float(os.getenv("LOOP_HEARTBEAT_MS", "20"))
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
@@ -1,3 +1,6 @@
 from .classes import *
 from .functions import *
 from .http import *
+from .memory import *
+from .scheduler import *
+from .tracing import *
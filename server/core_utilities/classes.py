@@ -3,13 +3,9 @@ from __future__ import annotations
 import abc
 import asyncio
 import logging
-import traceback
-import weakref
-from typing import Callable, Any, Coroutine, Type
 
 __all__ = (
     "AutoLogger",
-    "TaskLoop",
     "AsyncContextManagerMixin",
     "ContextManagerMixin",
     "Counter",
@@ -26,119 +22,6 @@ class AutoLogger:
         cls.logger = logging.getLogger(cls.__name__)
 
 
-class TaskLoop(abc.ABC):
-    __slots__ = ("_delay", "_task", "_state")
-
-    def __init__(self, delay: float):
-        self._delay = delay
-
-        self._task: asyncio.Task | None = None
-        self._state = 0
-
-    async def _run(self, args, kwargs):
-        # noinspection PyBroadException
-        try:
-            while self._state:
-                self._state = 2
-                await self._func(*args, **kwargs)
-                if not self._state:
-                    break
-                self._state = 1
-                await asyncio.sleep(self._delay)
-        except Exception:
-            traceback.print_exc()
-        finally:
-            self._state = 0
-            self._task = None
-
-    def start(self, *args, **kwargs):
-        if self._state:
-            raise RuntimeError("Task is already running")
-        self._state = 1
-        self._task = asyncio.create_task(self._run(args, kwargs))
-
-    def stop(self):
-        if self._task is not None:
-            if self._state == 1:
-                self._task.cancel()
-            elif self._state == 2:
-                self._state = 0
-
-    def cancel(self):
-        if self._task is not None:
-            self._state = 0
-            self._task.cancel()
-
-    async def stop_wait(self):
-        self.stop()
-        if self._task is not None:
-            await self._task
-
-    async def __call__(self, *args, **kwargs):
-        return await self._func(*args, **kwargs)
-
-    @property
-    def running(self) -> bool:
-        return self._task is not None
-
-    @property
-    @abc.abstractmethod
-    def _func(self):
-        pass
-
-    @classmethod
-    def loop(cls, delay: float):
-        def deco(func: Callable[[Any, ...], Coroutine]) -> TaskLoop:
-            return _DescriptorTaskLoop(delay, func)
-
-        return deco
-
-
-class _InstanceTaskLoop(TaskLoop):
-    __slots__ = ("_func_ref",)
-
-    def __init__(
-        self,
-        delay: float,
-        _func_ref: weakref.WeakMethod[Callable[[Any, ...], Coroutine]],
-    ):
-        super().__init__(delay)
-        self._func_ref = _func_ref
-
-    @property
-    def _func(self):
-        return self._func_ref()
-
-
-class _DescriptorTaskLoop(TaskLoop):
-    __slots__ = (
-        "_func",
-        "_instance_refs",
-    )
-
-    def __init__(self, delay: float, func: Callable[..., Coroutine]):
-        super().__init__(delay)
-        self._func = func
-        self._instance_refs: dict[weakref.WeakMethod, TaskLoop] = {}
-
-    def __get__(self, obj: Any, objtype: Type[Any]) -> TaskLoop:
-        if obj is None:
-            return self
-
-        copy = self._instance_refs.get(obj)
-        if copy is None:
-            method = self._func.__get__(obj, objtype)
-            weak_method = weakref.WeakMethod(method, self._on_gc)
-            copy = _InstanceTaskLoop(self._delay, weak_method)
-            self._instance_refs[weak_method] = copy
-        return copy
-
-    def _on_gc(self, weak_method):
-        copy = self._instance_refs.pop(weak_method, None)
-        if copy is not None:
-            copy.stop()
-
-
 class AsyncContextManagerMixin(abc.ABC):
     __slots__ = ()
 
@@ -15,10 +15,31 @@ __all__ = (
     "frozen_partial",
     "local_now",
     "ainput",
+    "EVENT_LOOP_BACKENDS",
+    "new_event_loop",
 )
 LOCAL_TIMEZONE = pytz.timezone("Europe/Paris")
 
 
+EVENT_LOOP_BACKENDS = ("asyncio", "uvloop")
+
+
+def new_event_loop(backend: str = "asyncio") -> asyncio.AbstractEventLoop:
+    if backend == "uvloop":
+        # uvloop est optionnel (et indisponible sous Windows)
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning(
+                "uvloop is not installed, falling back to the asyncio event loop"
+            )
+        else:
+            return uvloop.new_event_loop()
+    elif backend != "asyncio":
+        raise ValueError(f"Unknown event loop backend {backend!r}")
+    return asyncio.new_event_loop()
+
+
 def cancel_tasks(to_cancel: set[asyncio.Task], loop: asyncio.AbstractEventLoop) -> None:
     if not to_cancel:
         return
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import collections
+import itertools
+import os
+import sys
+from typing import Any, Callable, Iterator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ("MemoryRegistry", "memory_registry", "approximate_size", "current_rss")
+
+# Au-delà, la taille des éléments est extrapolée depuis un échantillon
+SAMPLE_SIZE = 100
+MAX_DEPTH = 3
+
+
+def _children(obj: Any) -> tuple[int, Iterator[Any]] | None:
+    if isinstance(obj, dict):
+        return len(obj), itertools.chain.from_iterable(obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        return len(obj), iter(obj)
+    return None
+
+
+def approximate_size(obj: Any, depth: int = MAX_DEPTH) -> int:
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+    children = _children(obj)
+    if children is None:
+        # Objets à __slots__ : les attributs font partie de l'objet
+        slots = getattr(type(obj), "__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for slot in slots:
+            value = getattr(obj, slot, None)
+            if value is not None:
+                size += approximate_size(value, depth - 1)
+        return size
+    length, iterator = children
+    if not length:
+        return size
+    # Un dict a deux enfants (clé, valeur) par élément
+    per_item = 2 if isinstance(obj, dict) else 1
+    sample = list(itertools.islice(iterator, SAMPLE_SIZE * per_item))
+    sample_size = sum(approximate_size(child, depth - 1) for child in sample)
+    return size + sample_size * length * per_item // len(sample)
+
+
+def current_rss() -> int:
+    # /proc donne la mémoire résidente actuelle, getrusage seulement le pic
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryRegistry:
+    __slots__ = ("_structures",)
+
+    def __init__(self):
+        self._structures: dict[str, Callable[[], Any]] = {}
+
+    def register(self, name: str, getter: Callable[[], Any]):
+        # Un remplacement silencieux fausserait le rapport : chaque structure a son propre nom
+        if name in self._structures:
+            raise ValueError(f"A structure named {name!r} is already registered")
+        self._structures[name] = getter
+
+    def unregister(self, name: str):
+        self._structures.pop(name, None)
+
+    def clear(self):
+        self._structures.clear()
+
+    def report(self) -> dict[str, dict[str, int]]:
+        report = {}
+        for name, getter in sorted(self._structures.items()):
+            obj = getter()
+            if obj is None:
+                continue
+            report[name] = {
+                "size": len(obj) if hasattr(obj, "__len__") else 1,
+                "bytes": approximate_size(obj),
+            }
+        return report
+
+
+memory_registry = MemoryRegistry()
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import math
+import random
+import time
+from typing import Any, Callable
+
+from .classes import AutoLogger
+
+__all__ = (
+    "Scheduler",
+    "Job",
+    "JobStats",
+    "DEFAULT_MAX_CONCURRENCY",
+    "PRIORITY_HIGH",
+    "PRIORITY_NORMAL",
+    "PRIORITY_LOW",
+)
+
+DEFAULT_MAX_CONCURRENCY = 16
+# Les priorités les plus basses démarrent en premier, comme pour les événements
+PRIORITY_HIGH = -10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = 10
+CANCEL_TIMEOUT = 5
+
+
+class JobStats:
+    __slots__ = (
+        "runs",
+        "failures",
+        "cancelled",
+        "skipped",
+        "total_seconds",
+        "max_seconds",
+        "total_wait_seconds",
+        "last_finished_at",
+        "last_error",
+    )
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_wait_seconds = 0.0
+        self.last_finished_at: float | None = None
+        self.last_error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+            "mean_ms": self.total_seconds / self.runs * 1000 if self.runs else 0,
+            "max_ms": self.max_seconds * 1000,
+            # Attente entre l'échéance et le démarrage : la concurrence est saturée quand elle augmente
+            "mean_wait_ms": (
+                self.total_wait_seconds / self.runs * 1000 if self.runs else 0
+            ),
+            "last_finished_at": self.last_finished_at,
+            "last_error": self.last_error,
+        }
+
+
+class Job:
+    __slots__ = (
+        "name",
+        "priority",
+        "func",
+        "args",
+        "interval",
+        "jitter",
+        "anchor",
+        "clock",
+        "cancelled",
+        "_scheduler",
+        "_handle",
+        "_task",
+        "_due",
+        "_period",
+    )
+
+    def __init__(
+        self,
+        scheduler: Scheduler,
+        name: str,
+        priority: int,
+        func: Callable[..., Any],
+        args: tuple,
+    ):
+        self._scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.interval: float | None = None
+        self.jitter = 0.0
+        self.anchor = 0.0
+        self.clock: Callable[[], float] = time.monotonic
+        self.cancelled = False
+        self._handle: asyncio.TimerHandle | None = None
+        self._task: asyncio.Task | None = None
+        self._due = 0.0
+        self._period = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+
+class Scheduler(AutoLogger):
+    __slots__ = ("max_concurrency", "stats", "_jobs", "_queue", "_running", "_counter")
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        if max_concurrency < 1:
+            raise ValueError("The scheduler needs at least one concurrent job")
+        self.max_concurrency = max_concurrency
+        self.stats: dict[str, JobStats] = {}
+        # Toutes les tâches vivantes : en attente d'échéance, en file ou en cours
+        self._jobs: set[Job] = set()
+        self._queue: list[tuple[int, int, Job]] = []
+        self._running: set[Job] = set()
+        self._counter = itertools.count()
+
+    @property
+    def jobs(self) -> set[Job]:
+        return self._jobs
+
+    def spawn(
+        self,
+        func: Callable[..., Any],
+        *args,
+        name: str | None = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Job:
+        job = self._make_job(func, args, name, priority)
+        self._enqueue(job)
+        return job
+
+    def call_later(
+        self,
+        delay: float,
+        func: Callable[..., Any],
+        *args,
+        name: str | None = None,
+        priority: int = PRIORITY_NORMAL,
+    ) -> Job:
+        job = self._make_job(func, args, name, priority)
+        self._schedule(job, delay)
+        return job
+
+    def every(
+        self,
+        interval: float,
+        func: Callable[..., Any],
+        *args,
+        name: str | None = None,
+        priority: int = PRIORITY_NORMAL,
+        jitter: float = 0.0,
+        anchor: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> Job:
+        if interval <= 0:
+            raise ValueError("The interval of a periodic job must be positive")
+        job = self._make_job(func, args, name, priority)
+        job.interval = interval
+        job.jitter = jitter
+        job.clock = clock
+        # Échéances à anchor + k * interval : la durée des exécutions ne décale pas les suivantes
+        job.anchor = clock() if anchor is None else anchor
+        job._period = math.floor((clock() - job.anchor) / interval)
+        self._schedule_next(job)
+        return job
+
+    def cancel(self, job: Job):
+        if job.cancelled:
+            return
+        job.cancelled = True
+        if job._handle is not None:
+            job._handle.cancel()
+            job._handle = None
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            # Une tâche en file est ignorée à sa sortie du tas
+            self._jobs.discard(job)
+
+    async def cancel_all(self, timeout: float = CANCEL_TIMEOUT):
+        # Plus rien ne démarre avant l'annulation des tâches en cours
+        for job in list(self._jobs):
+            if job._task is None:
+                self.cancel(job)
+        self._queue.clear()
+        tasks = [job._task for job in self._running]
+        for job in list(self._running):
+            self.cancel(job)
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            self.logger.warning(
+                f"{len(pending)} jobs did not stop within {timeout}s : "
+                + ", ".join(task.get_name() for task in pending)
+            )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": len(self._running),
+            "queued": len(self._queue),
+            "jobs": len(self._jobs),
+            "stats": {
+                name: stats.to_dict() for name, stats in sorted(self.stats.items())
+            },
+        }
+
+    def _make_job(
+        self, func: Callable[..., Any], args: tuple, name: str | None, priority: int
+    ) -> Job:
+        job = Job(self, name or func.__qualname__, priority, func, args)
+        self._jobs.add(job)
+        return job
+
+    def _schedule(self, job: Job, delay: float):
+        loop = asyncio.get_running_loop()
+        delay = max(delay, 0)
+        job._due = loop.time() + delay
+        # Contexte vide : une tâche programmée pendant une requête ne s'attache pas à sa trace
+        job._handle = loop.call_later(
+            delay, self._enqueue, job, context=contextvars.Context()
+        )
+
+    def _schedule_next(self, job: Job):
+        now = job.clock()
+        period = math.floor((now - job.anchor) / job.interval) + 1
+        # Les échéances dépassées pendant une exécution trop longue ne sont pas rattrapées
+        skipped = period - job._period - 1
+        if skipped > 0:
+            stats = self.stats.get(job.name)
+            if stats is None:
+                stats = self.stats[job.name] = JobStats()
+            stats.skipped += skipped
+        job._period = period
+        delay = job.anchor + period * job.interval - now
+        if job.jitter:
+            delay += random.uniform(0, job.jitter)
+        self._schedule(job, delay)
+
+    def _enqueue(self, job: Job):
+        job._handle = None
+        if job.cancelled:
+            return
+        now = asyncio.get_running_loop().time()
+        if not job._due or job._due > now:
+            job._due = now
+        # À priorité égale, dans l'ordre d'arrivée
+        heapq.heappush(self._queue, (job.priority, next(self._counter), job))
+        self._dispatch()
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._queue and len(self._running) < self.max_concurrency:
+            _, _, job = heapq.heappop(self._queue)
+            if job.cancelled:
+                continue
+            self._running.add(job)
+            job._task = asyncio.create_task(
+                self._run(job), name=job.name, context=contextvars.Context()
+            )
+            # Le rappel libère la place même si la tâche est annulée avant son démarrage
+            job._task.add_done_callback(
+                functools.partial(self._on_done, job, loop.time())
+            )
+
+    async def _run(self, job: Job):
+        result = job.func(*job.args)
+        if inspect.isawaitable(result):
+            await result
+
+    def _on_done(self, job: Job, started: float, task: asyncio.Task):
+        stats = self.stats.get(job.name)
+        if stats is None:
+            stats = self.stats[job.name] = JobStats()
+        if task.cancelled():
+            # Une exécution interrompue ne compte pas dans les durées
+            stats.cancelled += 1
+        else:
+            duration = asyncio.get_running_loop().time() - started
+            stats.runs += 1
+            stats.total_seconds += duration
+            stats.max_seconds = max(stats.max_seconds, duration)
+            stats.total_wait_seconds += started - job._due
+            stats.last_finished_at = time.time()
+            error = task.exception()
+            if error is not None:
+                stats.failures += 1
+                stats.last_error = repr(error)
+                self.logger.error(f"Job {job.name} failed", exc_info=error)
+        job._task = None
+        self._running.discard(job)
+        if job.interval is not None and not job.cancelled:
+            self._schedule_next(job)
+        else:
+            self._jobs.discard(job)
+        self._dispatch()
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, TypeVar
+
+__all__ = ("Span", "Tracer", "NOOP_SPAN", "tracer", "span", "traced")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_CODE_ERROR = 2
+
+_FUNC = TypeVar("_FUNC", bound=Callable[..., Any])
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def update_name(self, name: str):
+        pass
+
+    def end(self, *_):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    __slots__ = ("tracer", "trace_id", "sampled", "spans")
+
+    def __init__(self, tracer: Tracer, sampled: bool):
+        self.tracer = tracer
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans: list[Span] = []
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+        "_token",
+    )
+
+    def __init__(
+        self,
+        trace: Trace,
+        parent_id: str | None,
+        name: str,
+        attributes: dict[str, Any] | None,
+        kind: int = SPAN_KIND_INTERNAL,
+    ):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = {} if attributes is None else attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+        self._token = None
+        trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def end(self, *_):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.parent_id is None:
+            self.trace.tracer.finish(self.trace, self)
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+
+def span(name: str, attributes: dict[str, Any] | None = None) -> Span | _NoopSpan:
+    # Hors d'une trace (traçage désactivé, tâches de fond), le coût se limite à la lecture du contextvar
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, parent.span_id, name, attributes)
+
+
+def traced(name: str | None = None) -> Callable[[_FUNC], _FUNC]:
+    def deco(func: _FUNC) -> _FUNC:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return func(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+def _otlp_span(trace_id: str, span: Span) -> dict[str, Any]:
+    data = {
+        "traceId": trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        # Un span jamais terminé (futur abandonné) est borné à la fin de la trace
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": _otlp_attributes(span.attributes),
+    }
+    if span.parent_id is not None:
+        data["parentSpanId"] = span.parent_id
+    if span.error is not None:
+        data["status"] = {"code": STATUS_CODE_ERROR, "message": span.error}
+    return data
+
+
+class OTLPFileExporter:
+    __slots__ = ("path", "resource", "_queue", "_thread")
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        self._queue: queue.SimpleQueue[Trace | None] = queue.SimpleQueue()
+        # La sérialisation et l'écriture se font hors de la boucle d'événements
+        self._thread = threading.Thread(
+            target=self._run, name="OTLPFileExporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        self._queue.put(trace)
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            while (trace := self._queue.get()) is not None:
+                try:
+                    file.write(json.dumps(self._make_request(trace)) + "\n")
+                    if self._queue.empty():
+                        file.flush()
+                except Exception:
+                    logging.exception("Could not export trace")
+
+    def _make_request(self, trace: Trace) -> dict[str, Any]:
+        # Une ligne par trace au format ExportTraceServiceRequest (exportateur « file » du collecteur OpenTelemetry)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": self.resource,
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [
+                                _otlp_span(trace.trace_id, span) for span in trace.spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class Tracer:
+    __slots__ = ("sample_rate", "slow_threshold_ns", "exporter", "kept", "dropped")
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.slow_threshold_ns: int | None = None
+        self.exporter: OTLPFileExporter | None = None
+        self.kept = 0
+        self.dropped = 0
+
+    def configure(
+        self,
+        path: str,
+        sample_rate: float,
+        slow_threshold_ms: float | None,
+        service_name: str,
+    ):
+        self.close()
+        self.sample_rate = sample_rate
+        self.slow_threshold_ns = (
+            None if slow_threshold_ms is None else int(slow_threshold_ms * 1_000_000)
+        )
+        self.exporter = OTLPFileExporter(path, service_name)
+
+    def start_trace(
+        self, name: str, attributes: dict[str, Any] | None = None
+    ) -> Span | _NoopSpan:
+        if self.exporter is None:
+            return NOOP_SPAN
+        # Échantillonnage en tête, mais les spans sont toujours collectés pour garder les requêtes lentes
+        trace = Trace(self, random.random() < self.sample_rate)
+        return Span(trace, None, name, attributes, SPAN_KIND_SERVER)
+
+    def finish(self, trace: Trace, root: Span):
+        if trace.sampled or (
+            self.slow_threshold_ns is not None
+            and root.end_ns - root.start_ns >= self.slow_threshold_ns
+        ):
+            self.kept += 1
+            if self.exporter is not None:
+                self.exporter.export(trace)
+        else:
+            self.dropped += 1
+
+    def close(self):
+        if self.exporter is not None:
+            exporter, self.exporter = self.exporter, None
+            exporter.close()
+
+
+tracer = Tracer()
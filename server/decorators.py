@@ -9,15 +9,15 @@ __all__ = ("route", "event")
 _REQUEST_HANDLER: TypeAlias = Callable[[web_request.Request], web_response.Response]
 
 
-def route(methods: str | Sequence[str], path: str):
+def route(methods: str | Sequence[str], path: str, max_body_size: int | None = None):
     if isinstance(methods, str):
         methods = (methods,)
 
     def deco(func: _REQUEST_HANDLER) -> _REQUEST_HANDLER:
         if hasattr(func, "__routes__"):
-            func.__routes__.append((methods, path))
+            func.__routes__.append((methods, path, max_body_size))
         else:
-            func.__routes__ = [(methods, path)]
+            func.__routes__ = [(methods, path, max_body_size)]
         return func
 
     return deco
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import abc
+import os
+import shutil
+import socket
+import ssl
+import stat
+from typing import Callable
+
+from aiohttp import web
+
+__all__ = (
+    "Listener",
+    "TCPListener",
+    "DualStackListener",
+    "UnixListener",
+    "InheritedListener",
+    "tcp_listeners",
+    "inherited_listeners",
+)
+
+SD_LISTEN_FDS_START = 3
+
+
+class Listener(abc.ABC):
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def make_site(self, runner: web.BaseRunner) -> web.BaseSite:
+        pass
+
+    def close(self):
+        pass
+
+
+class TCPListener(Listener):
+    __slots__ = ("host", "port", "ssl_context")
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext | None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+
+    def make_site(self, runner: web.BaseRunner) -> web.BaseSite:
+        return web.TCPSite(runner, self.host, self.port, ssl_context=self.ssl_context)
+
+
+class DualStackListener(Listener):
+    __slots__ = ("port", "ssl_context")
+
+    def __init__(self, port: int, ssl_context: ssl.SSLContext | None):
+        self.port = port
+        self.ssl_context = ssl_context
+
+    def make_site(self, runner: web.BaseRunner) -> web.BaseSite:
+        # Une seule socket IPv6 sans IPV6_V6ONLY accepte aussi l'IPv4 (adresses ::ffff:a.b.c.d)
+        sock = socket.create_server(
+            ("::", self.port), family=socket.AF_INET6, dualstack_ipv6=True
+        )
+        return web.SockSite(runner, sock, ssl_context=self.ssl_context)
+
+
+class UnixListener(Listener):
+    __slots__ = ("path", "mode", "group", "_bound")
+
+    def __init__(self, path: str, mode: int, group: str | None = None):
+        self.path = path
+        self.mode = mode
+        self.group = group
+        # Identité de la socket créée par ce listener
+        self._bound: tuple[int, int, int] | None = None
+
+    def _remove_stale_socket(self):
+        try:
+            if not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                return
+        except FileNotFoundError:
+            return
+        # Seule une socket sans serveur est laissée par une exécution précédente
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except ConnectionRefusedError:
+                os.remove(self.path)
+                return
+        raise RuntimeError(f"Another process is already listening on {self.path}")
+
+    def make_site(self, runner: web.BaseRunner) -> web.BaseSite:
+        self._remove_stale_socket()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            # Les droits sont appliqués avant listen() : aucune connexion n'est acceptée avec ceux de l'umask
+            os.chmod(self.path, self.mode)
+            if self.group is not None:
+                shutil.chown(self.path, group=self.group)
+            self._bound = self._identity()
+            sock.listen(128)
+        except BaseException:
+            sock.close()
+            raise
+        return web.SockSite(runner, sock)
+
+    def close(self):
+        if self._bound is None:
+            return
+        bound, self._bound = self._bound, None
+        try:
+            # La socket a pu être remplacée depuis par une autre instance
+            if self._identity() == bound:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _identity(self) -> tuple[int, int, int]:
+        # Un inode libéré peut être réattribué : la date de changement distingue les fichiers successifs
+        path_stat = os.stat(self.path)
+        return path_stat.st_dev, path_stat.st_ino, path_stat.st_ctime_ns
+
+
+class InheritedListener(Listener):
+    __slots__ = ("fd", "ssl_context")
+
+    def __init__(self, fd: int, ssl_context: ssl.SSLContext | None):
+        self.fd = fd
+        self.ssl_context = ssl_context
+
+    def make_site(self, runner: web.BaseRunner) -> web.BaseSite:
+        # La famille (TCP, IPv6, Unix) est lue depuis la socket elle-même
+        sock = socket.socket(fileno=self.fd)
+        if sock.type != socket.SOCK_STREAM:
+            raise RuntimeError(
+                f"Inherited file descriptor {self.fd} is not a stream socket"
+            )
+        return web.SockSite(runner, sock, ssl_context=self.ssl_context)
+
+
+def tcp_listeners(
+    port: int, ssl_context: ssl.SSLContext | None, dual_stack: bool
+) -> list[Listener]:
+    if dual_stack and socket.has_dualstack_ipv6():
+        return [DualStackListener(port, ssl_context)]
+    return [
+        TCPListener("0.0.0.0", port, ssl_context),
+        TCPListener("::", port, ssl_context),
+    ]
+
+
+def inherited_listeners(
+    make_ssl_context: Callable[[], ssl.SSLContext],
+) -> list[Listener]:
+    # Activation par socket de systemd (sd_listen_fds) : les sockets sont transmises à partir du descripteur 3
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return []
+    count = int(os.environ.get("LISTEN_FDS", "0"))
+    names = os.environ.get("LISTEN_FDNAMES", "").split(":")
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+
+    listeners = []
+    for index, fd in enumerate(range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count)):
+        os.set_inheritable(fd, False)
+        # FileDescriptorName=https dans l'unité .socket active TLS sur cette socket
+        https = index < len(names) and names[index] == "https"
+        listeners.append(InheritedListener(fd, make_ssl_context() if https else None))
+    return listeners
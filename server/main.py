@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 import ssl
 import sys
@@ -6,9 +7,23 @@ import sys
 from aiohttp import web_runner
 
 import module_loader
-from config import SSL_PRIVKEY, SSL_PUBKEY, HTTP_PORT, HTTPS_PORT
-from core_utilities import cancel_tasks
+from config import (
+    SSL_PRIVKEY,
+    SSL_PUBKEY,
+    HTTP_PORT,
+    HTTPS_PORT,
+    DUAL_STACK,
+    UNIX_SOCKETS,
+    UNIX_SOCKET_MODE,
+    UNIX_SOCKET_GROUP,
+    EVENT_LOOP,
+    TRACING_PATH,
+    TRACING_SAMPLE_RATE,
+    TRACING_SLOW_MS,
+)
+from core_utilities import cancel_tasks, new_event_loop, tracer
 from core_utilities.functions import ainput
+from listeners import UnixListener, inherited_listeners, tcp_listeners
 from logger import DayFileHandler
 from web_server import WebApplication
 
@@ -21,25 +36,36 @@ if __name__ == "__main__":
             DayFileHandler("logs", logging.INFO),
         ),
     )
-    loop = asyncio.new_event_loop()
+    if TRACING_PATH:
+        tracer.configure(
+            TRACING_PATH, TRACING_SAMPLE_RATE, TRACING_SLOW_MS, "secondlock"
+        )
+    loop = new_event_loop(EVENT_LOOP)
+    logging.info(f"Using event loop {type(loop).__module__}.{type(loop).__name__}")
 
     modules_manager = module_loader.ModulesManager()
 
     app = WebApplication(modules_manager, loop)
 
-    servers = []
-    if HTTP_PORT:
-        servers.append(app.run("0.0.0.0", HTTP_PORT, None))
-        servers.append(app.run("::", HTTP_PORT, None))
-    if HTTPS_PORT:
+    @functools.cache
+    def make_ssl_context() -> ssl.SSLContext:
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         ssl_context.load_cert_chain(SSL_PUBKEY, SSL_PRIVKEY)
-        servers.append(app.run("0.0.0.0", HTTPS_PORT, ssl_context))
-        servers.append(app.run("::", HTTPS_PORT, ssl_context))
+        return ssl_context
 
-    app_run_tasks: tuple[asyncio.Task[None], ...] = tuple(
-        loop.create_task(x) for x in servers
-    )
+    # Avec l'activation par socket, seules les sockets transmises sont écoutées
+    listeners = inherited_listeners(make_ssl_context)
+    if not listeners:
+        if HTTP_PORT:
+            listeners += tcp_listeners(HTTP_PORT, None, DUAL_STACK)
+        if HTTPS_PORT:
+            listeners += tcp_listeners(HTTPS_PORT, make_ssl_context(), DUAL_STACK)
+        listeners += [
+            UnixListener(path, UNIX_SOCKET_MODE, UNIX_SOCKET_GROUP)
+            for path in UNIX_SOCKETS
+        ]
+
+    app_run_task = loop.create_task(app.run(listeners))
 
     async def runner():
         try:
@@ -57,7 +83,7 @@ if __name__ == "__main__":
                     raise GracefulExit from None
                 logging.critical("Unknown option. Choose Yes (Y) or No (N)")
         modules_manager.ready.set()
-        await asyncio.gather(*app_run_tasks)
+        await app_run_task
 
         try:
             while True:
@@ -77,3 +103,6 @@ if __name__ == "__main__":
         cancel_tasks(asyncio.all_tasks(loop), loop)
         loop.run_until_complete(loop.shutdown_asyncgens())
         loop.close()
+        for listener in listeners:
+            listener.close()
+        tracer.close()
@@ -24,7 +24,15 @@ from typing import (
 
 from aiohttp import web
 
-from core_utilities import AutoLogger, Counter, SiteHost, frozen_partial
+from config import SCHEDULER_MAX_CONCURRENCY
+from core_utilities import (
+    AutoLogger,
+    Counter,
+    Scheduler,
+    SiteHost,
+    frozen_partial,
+    memory_registry,
+)
 from core_utilities.functions import ainput
 
 MODULES_DIR = "modules"
@@ -105,6 +113,8 @@ class ModulesManager(AutoLogger):
     __slots__ = (
         "ready",
         "requests_counter",
+        "http_requests_counter",
+        "scheduler",
         "libs",
         "events",
         "pre_handlers",
@@ -118,12 +128,17 @@ class ModulesManager(AutoLogger):
     def __init__(self):
         self.ready = asyncio.Event()
         self.requests_counter = Counter()
+        # Requêtes HTTP courtes seulement, pour les tâches qui attendent un serveur calme
+        self.http_requests_counter = Counter()
+        self.scheduler = Scheduler(SCHEDULER_MAX_CONCURRENCY)
+        self._register_structures()
         self.events: dict[str, dict[int, list[Callable[..., Coroutine]]]] = {}
         self.pre_handlers: list[PreHandlerModule] = []
         self.modules: list[BaseModule] = []
         self._special_module: SpecialModule | None = None
 
         ModuleStorage.modules_manager = self
+        ModuleStorage.scheduler = self.scheduler
         self.logger.setLevel(logging.DEBUG)
 
     def _import_libs(self):
@@ -147,18 +162,24 @@ class ModulesManager(AutoLogger):
         if self._special_module is None:
             raise RuntimeError("No special module loaded")
 
+    def _register_structures(self):
+        memory_registry.register("scheduler.jobs", lambda: self.scheduler.jobs)
+
     def _clear_data(self):
         self.modules.clear()
         self.pre_handlers.clear()
         self.events.clear()
         self._special_module = None
+        # Les modules rechargés enregistrent de nouveau leurs structures
+        memory_registry.clear()
+        self._register_structures()
 
     async def load_modules(self):
         self._import_libs()
         await self._initialise_modules()
 
     def _try_add_routes(self, extras: dict[str, Any], attr: str, value):
-        routes: list[tuple[Sequence[str], str]] | None = getattr(
+        routes: list[tuple[Sequence[str], str, int | None]] | None = getattr(
             value, "__routes__", None
         )
         if routes is None:
@@ -209,6 +230,8 @@ class ModulesManager(AutoLogger):
         self.ready.clear()
         await self.dispatch_event("disconnect_websocket")
         await self.requests_counter.wait()
+        # Les tâches de fond s'arrêtent avant que les modules ne libèrent leurs ressources
+        await self.scheduler.cancel_all()
         await self._call_unload(self.modules)
 
     async def _reload(self):
@@ -221,6 +244,7 @@ class ModulesManager(AutoLogger):
         old_libs = self.libs
 
         self.logger.debug("Unloading old modules")
+        await self.scheduler.cancel_all()
         await self._call_unload(self.modules)
 
         self.logger.debug("Removing modules data...")
@@ -243,6 +267,7 @@ class ModulesManager(AutoLogger):
                 f"Error occured, unloading partially loaded modules and restoring saved data...",
                 exc_info=e,
             )
+            await self.scheduler.cancel_all()
             await self._call_unload(self.modules)
             self._clear_data()
             remove = []
@@ -333,15 +358,7 @@ class ModuleStorage(AutoLogger):
     __slots__ = ()
 
     modules_manager: ModulesManager
-    tasks = set()
-
-    @classmethod
-    @functools.wraps(asyncio.create_task)
-    def create_task(cls, *args, **kwargs):
-        task = asyncio.create_task(*args, **kwargs)
-        cls.tasks.add(task)
-        task.add_done_callback(cls.tasks.discard)
-        return task
+    scheduler: Scheduler
 
 
 class BaseModule(ModuleStorage):
@@ -375,7 +392,7 @@ class SpecialModule(BaseModule, abc.ABC):
         self,
         attr: str,
         value: Callable[[CustomRequest], Awaitable[web.StreamResponse]],
-        routes: list[tuple[Sequence[str], str]],
+        routes: list[tuple[Sequence[str], str, int | None]],
         extras: dict[str, Any],
     ):
         pass
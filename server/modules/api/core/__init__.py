@@ -1,47 +1,66 @@
-import sqlite3
-
-from core_utilities import CustomRequest
+from config import DATABASE_PATH, DATABASE_SHARDS, TOKEN_FORMAT
+from core_utilities import CustomRequest, memory_registry
 from module_loader import HTTPModule, ModulesManager
+from ..utils.a2f import totp_key_cache
 from ..utils.auth import Token, TokenEncryptorManager, raise_invalid_token
+from ..utils.database import SQL
+from ..utils.storage import Shard, ShardedStorage
 
 
 class APICoreModule(HTTPModule):
-    __slots__ = ("db", "token_encryptor_manager")
+    __slots__ = ("storage", "token_encryptor_manager")
 
     def __init__(self):
         super().__init__()
 
-        self.db = sqlite3.connect("database.db")
-        with self.db:
-            self.db.execute(
-                "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, passhash BLOB)"
-            )
-            self.db.execute(
-                "CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY AUTOINCREMENT, user INT, name BLOB, secret BLOB, FOREIGN KEY(user) REFERENCES users(id))"
-            )
-            self.db.execute("CREATE INDEX IF NOT EXISTS idx_sites_user ON sites (user)")
-
-        self.token_encryptor_manager = TokenEncryptorManager(10 * 60, 3, "2FA")
+        self.storage = ShardedStorage(DATABASE_PATH, DATABASE_SHARDS)
+        self.token_encryptor_manager = TokenEncryptorManager(
+            10 * 60, 3, "2FA", TOKEN_FORMAT == "compact", self.scheduler
+        )
+        memory_registry.register(
+            f"token_expirations[{self.token_encryptor_manager.token_prefix}]",
+            lambda: self.token_encryptor_manager.user_token_expirations,
+        )
+        memory_registry.register("totp.keys", lambda: totp_key_cache)
 
     async def on_unload(self):
-        self.db.close()
+        await self.storage.close()
+
+    def shard(self, user_id: int) -> Shard:
+        return self.storage.shard(user_id)
+
+    def get_data_version(self, user_id: int) -> int:
+        res = (
+            self.shard(user_id)
+            .db.execute(SQL.SELECT_DATA_VERSION, (user_id,))
+            .fetchone()
+        )
+        if res is None:
+            raise_invalid_token()
+        return res[0]
 
     def check_authorization_advanced(
         self, request: CustomRequest
     ) -> tuple[Token, tuple[str, bytes]]:
         token = self.token_encryptor_manager.get_token(request)
-        res = self.db.execute(
-            "SELECT username, passhash FROM users WHERE id=?", (token.user_id,)
-        ).fetchone()
+        res = (
+            self.shard(token.user_id)
+            .db.execute(SQL.SELECT_USER, (token.user_id,))
+            .fetchone()
+        )
         if res is None:
             raise_invalid_token()
         return token, res
 
     def check_authorization(self, request: CustomRequest) -> Token:
-        token = self.token_encryptor_manager.get_token(request)
-        if not self.db.execute(
-            "SELECT ? IN (SELECT id FROM users)", (token.user_id,)
-        ).fetchone()[0]:
+        return self.check_token(self.token_encryptor_manager.get_token(request))
+
+    def check_token(self, token: Token) -> Token:
+        if (
+            not self.shard(token.user_id)
+            .db.execute(SQL.USER_EXISTS, (token.user_id,))
+            .fetchone()[0]
+        ):
             raise_invalid_token()
         return token
 
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+
+from aiohttp import WSCloseCode, WSMsgType, hdrs, web
+
+from core_utilities import (
+    PRIORITY_HIGH,
+    CustomHTTPException,
+    CustomRequest,
+    memory_registry,
+)
+from decorators import event, route
+from module_loader import HTTPModule, ModulesManager
+from ..utils.a2f import (
+    TOTP_INTERVAL,
+    current_timecode,
+    generate_site_codes,
+    next_timecode_in,
+)
+from ..utils.auth import Token
+from ..utils.database import SQL
+from ...utils import json_compact_dumps
+
+HEARTBEAT_INTERVAL = 25
+AUTH_TIMEOUT = 10
+SEND_TIMEOUT = 10
+CLOSE_TIMEOUT = 5
+WINDOW_MARGIN = 0.05
+MAX_PENDING_MESSAGES = 32
+MAX_MESSAGE_SIZE = 4096
+
+WS_CLOSE_INVALID_TOKEN = 4001
+WS_CLOSE_TOO_SLOW = 4008
+
+
+class LiveConnection:
+    __slots__ = ("ws", "token", "_pending", "_codes", "_wakeup", "_overflowed")
+
+    def __init__(self, ws: web.WebSocketResponse, token: Token):
+        self.ws = ws
+        self.token = token
+        self._pending: deque[str] = deque()
+        self._codes: str | None = None
+        self._wakeup = asyncio.Event()
+        self._overflowed = False
+
+    def push(self, message: str):
+        if len(self._pending) >= MAX_PENDING_MESSAGES:
+            self._overflowed = True
+        else:
+            self._pending.append(message)
+        self._wakeup.set()
+
+    def push_codes(self, message: str):
+        # Les codes d'une nouvelle fenêtre remplacent ceux qui n'ont pas encore été envoyés
+        self._codes = message
+        self._wakeup.set()
+
+    async def run_sender(self):
+        while not self.ws.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._overflowed:
+                await self.ws.close(code=WS_CLOSE_TOO_SLOW, message=b"Too slow")
+                return
+            while self._pending or self._codes is not None:
+                if self._pending:
+                    message = self._pending.popleft()
+                else:
+                    message, self._codes = self._codes, None
+                try:
+                    await asyncio.wait_for(self.ws.send_str(message), SEND_TIMEOUT)
+                except (TimeoutError, ConnectionError):
+                    await self.ws.close(code=WS_CLOSE_TOO_SLOW, message=b"Too slow")
+                    return
+
+    async def close(self, code: int, message: bytes):
+        await self.ws.close(code=code, message=message)
+
+
+class LiveAPIModule(HTTPModule):
+    __slots__ = ("core", "_connections", "_codes_cache")
+
+    def __init__(self):
+        super().__init__()
+        from ..core import APICoreModule
+
+        self.core = self.modules_manager.get_module(APICoreModule)
+        self._connections: dict[int, set[LiveConnection]] = {}
+        self._codes_cache: dict[int, tuple[tuple[int, int], str]] = {}
+        memory_registry.register("live.connections", lambda: self._connections)
+        memory_registry.register("live.codes_cache", lambda: self._codes_cache)
+        # Échéances alignées sur les fenêtres TOTP de l'horloge murale
+        self.scheduler.every(
+            TOTP_INTERVAL,
+            self._broadcast_window,
+            name="live.window",
+            priority=PRIORITY_HIGH,
+            anchor=WINDOW_MARGIN,
+            clock=time.time,
+        )
+
+    def _is_valid_token(self, token: Token) -> bool:
+        if token.expiry_timestamp < time.time_ns():
+            return False
+        if self.core.token_encryptor_manager.is_revoked(token):
+            return False
+        try:
+            self.core.check_token(token)
+        except CustomHTTPException:
+            return False
+        return True
+
+    def _get_codes_message(self, token: Token) -> str:
+        # Les codes ne sont calculés qu'une fois par utilisateur et par fenêtre
+        cache_key = (current_timecode(), self.core.get_data_version(token.user_id))
+        cached = self._codes_cache.get(token.user_id)
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+
+        rows = (
+            self.core.shard(token.user_id)
+            .db.execute(SQL.SELECT_SITE_SECRETS, (token.user_id,))
+            .fetchall()
+        )
+        codes = {
+            site_id: site_codes["code"]
+            for (site_id, _), site_codes in zip(
+                rows,
+                generate_site_codes(
+                    token.decrypt_strings(row[1] for row in rows), None
+                ),
+            )
+        }
+        message = json_compact_dumps(
+            {
+                "type": "codes",
+                "version": cache_key[1],
+                "codes": codes,
+                "next_update": next_timecode_in(),
+            }
+        )
+        self._codes_cache[token.user_id] = (cache_key, message)
+        return message
+
+    async def _broadcast_window(self):
+        self._codes_cache.clear()
+        for user_id, connections in list(self._connections.items()):
+            # noinspection PyBroadException
+            try:
+                await self._broadcast_codes(connections)
+            except Exception as e:
+                self.logger.error(
+                    f"Error while sending codes to user {user_id}", exc_info=e
+                )
+
+    async def _broadcast_codes(self, connections: set[LiveConnection]):
+        valid = []
+        for connection in connections.copy():
+            if self._is_valid_token(connection.token):
+                valid.append(connection)
+            else:
+                await connection.close(WS_CLOSE_INVALID_TOKEN, b"Invalid token")
+
+        if valid:
+            message = self._get_codes_message(valid[0].token)
+            for connection in valid:
+                connection.push_codes(message)
+
+    async def _authenticate(self, ws: web.WebSocketResponse) -> Token | None:
+        try:
+            msg = await ws.receive(timeout=AUTH_TIMEOUT)
+        except TimeoutError:
+            await ws.close(code=WS_CLOSE_INVALID_TOKEN, message=b"Invalid token")
+            return None
+
+        if msg.type != WSMsgType.TEXT:
+            await ws.close(code=WS_CLOSE_INVALID_TOKEN, message=b"Invalid token")
+            return None
+
+        try:
+            token_string = json.loads(msg.data).get("token")
+            return self.core.check_token(
+                self.core.token_encryptor_manager.decode_token(token_string)
+            )
+        except (json.JSONDecodeError, AttributeError, CustomHTTPException):
+            await ws.close(code=WS_CLOSE_INVALID_TOKEN, message=b"Invalid token")
+            return None
+
+    @route("GET", "/api/live")
+    async def get_live(self, request: CustomRequest) -> web.StreamResponse:
+        token = None
+        # Les navigateurs ne peuvent pas envoyer d'en-tête Authorization, le jeton est alors attendu dans le premier message
+        if hdrs.AUTHORIZATION in request.headers:
+            token = self.core.check_authorization(request)
+
+        ws = web.WebSocketResponse(
+            heartbeat=HEARTBEAT_INTERVAL, max_msg_size=MAX_MESSAGE_SIZE
+        )
+        await ws.prepare(request)
+
+        if token is None:
+            token = await self._authenticate(ws)
+            if token is None:
+                return ws
+
+        connection = LiveConnection(ws, token)
+        self._connections.setdefault(token.user_id, set()).add(connection)
+        sender = asyncio.create_task(connection.run_sender())
+        try:
+            connection.push_codes(self._get_codes_message(token))
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+            connections = self._connections.get(token.user_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self._connections[token.user_id]
+                    self._codes_cache.pop(token.user_id, None)
+
+        return ws
+
+    @event("sites_changed")
+    async def on_sites_changed(
+        self, user_id: int, data_version: int, sites: list[dict], deleted: list[int]
+    ):
+        connections = self._connections.get(user_id)
+        if not connections:
+            return
+
+        self._codes_cache.pop(user_id, None)
+        message = json_compact_dumps(
+            {
+                "type": "sites",
+                "version": data_version,
+                "sites": sites,
+                "deleted": deleted,
+                "next_update": next_timecode_in(),
+            }
+        )
+        for connection in connections:
+            connection.push(message)
+
+    @event("tokens_revoked")
+    async def on_tokens_revoked(self, user_id: int):
+        self._codes_cache.pop(user_id, None)
+        for connection in self._connections.get(user_id, set()).copy():
+            if not self._is_valid_token(connection.token):
+                await connection.close(WS_CLOSE_INVALID_TOKEN, b"Invalid token")
+
+    @event("disconnect_websocket")
+    async def on_disconnect_websocket(self):
+        closing = [
+            asyncio.create_task(
+                connection.close(WSCloseCode.SERVICE_RESTART, b"Server restarting")
+            )
+            for connections in self._connections.values()
+            for connection in connections
+        ]
+        if closing:
+            await asyncio.wait(closing, timeout=CLOSE_TIMEOUT)
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_http_module(LiveAPIModule())
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import time
+from typing import Any, Callable
+
+from aiohttp.web import StreamResponse
+
+from config import (
+    DATABASE_MAINTENANCE_INTERVAL,
+    DATABASE_MAINTENANCE_MAX_DURATION,
+    DATABASE_MAINTENANCE_MAX_REQUESTS,
+    DATABASE_MAINTENANCE_PAUSE,
+    DATABASE_MAINTENANCE_SLICE,
+)
+from core_utilities import PRIORITY_LOW, CustomRequest, HTTPStatus, Job
+from decorators import route
+from module_loader import HTTPModule, ModulesManager
+from ..core import APICoreModule
+from ..utils.storage import Shard
+from ...utils import check_admin, make_json_response
+
+AUTO_VACUUM_INCREMENTAL = 2
+# Pages libérées par instruction, la durée d'une tranche est vérifiée entre deux instructions
+INCREMENTAL_VACUUM_STEP = 64
+# Lignes lues par index au plus par ANALYZE
+ANALYSIS_LIMIT = 1000
+
+
+def _vacuum_state(db: sqlite3.Connection) -> tuple[bool, int]:
+    return (
+        db.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL,
+        db.execute("PRAGMA freelist_count").fetchone()[0],
+    )
+
+
+def _enable_incremental_vacuum(db: sqlite3.Connection) -> bool:
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return False
+    # Reconstruction complète qui bloque les écritures : uniquement sur demande d'un administrateur
+    db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    db.execute("VACUUM")
+    return True
+
+
+def _incremental_vacuum(db: sqlite3.Connection, budget: float) -> tuple[int, int]:
+    deadline = time.perf_counter() + budget
+    free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+    reclaimed = 0
+    while free_pages and time.perf_counter() < deadline:
+        # Une page est libérée à chaque pas de l'instruction : le résultat doit être lu en entier
+        db.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_STEP})").fetchall()
+        remaining = db.execute("PRAGMA freelist_count").fetchone()[0]
+        reclaimed += free_pages - remaining
+        free_pages = remaining
+    return reclaimed, free_pages
+
+
+def _optimize(db: sqlite3.Connection) -> bool:
+    db.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+    # PRAGMA optimize ne fait rien sur une base qui n'a jamais été analysée
+    never_analyzed = (
+        db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+        ).fetchone()
+        is None
+    )
+    db.execute("ANALYZE" if never_analyzed else "PRAGMA optimize")
+    return never_analyzed
+
+
+def _checkpoint(db: sqlite3.Connection) -> tuple[int, int]:
+    # PASSIVE n'attend ni les lecteurs ni les écrivains
+    _, wal_frames, checkpointed = db.execute(
+        "PRAGMA wal_checkpoint(PASSIVE)"
+    ).fetchone()
+    return wal_frames, checkpointed
+
+
+class DatabaseMaintenanceModule(HTTPModule):
+    __slots__ = ("core", "reports", "job")
+
+    def __init__(self):
+        super().__init__()
+        self.core = self.modules_manager.get_module(APICoreModule)
+        self.reports: dict[str, dict[str, Any]] = {}
+        # Une tranche en cours à l'annulation se termine dans le thread d'écriture avant sa fermeture
+        self.job: Job | None = (
+            self.scheduler.every(
+                DATABASE_MAINTENANCE_INTERVAL,
+                self.maintenance,
+                name="database.maintenance",
+                priority=PRIORITY_LOW,
+            )
+            if DATABASE_MAINTENANCE_INTERVAL
+            else None
+        )
+
+    async def maintenance(self):
+        deadline = time.monotonic() + DATABASE_MAINTENANCE_MAX_DURATION
+        storage = self.core.storage
+        for shard in dict.fromkeys((storage.index, *storage.shards)):
+            try:
+                report = await self.maintain(shard, deadline)
+            except sqlite3.Error as e:
+                self.logger.warning(f"Maintenance of {shard.path} failed: {e}")
+                continue
+            self.reports[shard.path] = report
+            self.logger.info(
+                f"Maintenance of {shard.path}: {report['reclaimed_pages']} pages reclaimed, "
+                f"{report['free_pages']} left, {report['checkpointed_frames']}/{report['wal_frames']} "
+                f"WAL frames checkpointed, {report['work_ms']:.1f}ms of work in {report['slices']} slices "
+                f"over {report['duration_ms']:.1f}ms"
+                + (", deferred" if report["deferred"] else "")
+            )
+
+    async def wait_quiet(self, shard: Shard, deadline: float) -> bool:
+        # Pause entre deux tranches, prolongée tant que le serveur est occupé
+        while True:
+            await asyncio.sleep(DATABASE_MAINTENANCE_PAUSE)
+            if (
+                self.modules_manager.http_requests_counter.counter
+                <= DATABASE_MAINTENANCE_MAX_REQUESTS
+                and not shard.writes.pending
+            ):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    async def run_slice(
+        self, shard: Shard, report: dict[str, Any], func: Callable[..., Any], *args
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await shard.writes.run_exclusive(func, *args)
+        finally:
+            report["slices"] += 1
+            report["work_ms"] += (time.perf_counter() - started) * 1000
+
+    async def maintain(self, shard: Shard, deadline: float) -> dict[str, Any]:
+        started = time.perf_counter()
+        report = {
+            "path": shard.path,
+            "finished_at": None,
+            "incremental": False,
+            "reclaimed_pages": 0,
+            "free_pages": 0,
+            "analyzed": False,
+            "wal_frames": 0,
+            "checkpointed_frames": 0,
+            "slices": 0,
+            "work_ms": 0.0,
+            "duration_ms": 0.0,
+            "deferred": False,
+        }
+        try:
+            if not await self.wait_quiet(shard, deadline):
+                report["deferred"] = True
+                return report
+            report["incremental"], report["free_pages"] = await self.run_slice(
+                shard, report, _vacuum_state
+            )
+
+            # Sans le mode incrémental, les pages libres restent jusqu'à la conversion de la base
+            while report["incremental"] and report["free_pages"]:
+                if not await self.wait_quiet(shard, deadline):
+                    # Le reste sera libéré au prochain passage
+                    report["deferred"] = True
+                    return report
+                reclaimed, report["free_pages"] = await self.run_slice(
+                    shard, report, _incremental_vacuum, DATABASE_MAINTENANCE_SLICE
+                )
+                report["reclaimed_pages"] += reclaimed
+
+            if not await self.wait_quiet(shard, deadline):
+                report["deferred"] = True
+                return report
+            report["analyzed"] = await self.run_slice(shard, report, _optimize)
+            # En dernier, le WAL contient alors aussi les pages écrites par la maintenance
+            report["wal_frames"], report["checkpointed_frames"] = await self.run_slice(
+                shard, report, _checkpoint
+            )
+            return report
+        finally:
+            report["finished_at"] = time.time()
+            report["duration_ms"] = (time.perf_counter() - started) * 1000
+
+    @route("GET", "/api/admin/database/maintenance")
+    async def get_maintenance(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                "interval": DATABASE_MAINTENANCE_INTERVAL,
+                "running": self.job is not None and self.job.running,
+                "shards": list(self.reports.values()),
+            },
+        )
+
+    @route("POST", "/api/admin/database/vacuum")
+    async def post_vacuum(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        storage = self.core.storage
+        shards = []
+        for shard in dict.fromkeys((storage.index, *storage.shards)):
+            started = time.perf_counter()
+            converted = await shard.writes.run_exclusive(_enable_incremental_vacuum)
+            shards.append(
+                {
+                    "path": shard.path,
+                    "converted": converted,
+                    "duration_ms": (time.perf_counter() - started) * 1000,
+                }
+            )
+        return make_json_response(HTTPStatus.OK, {"shards": shards})
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_http_module(DatabaseMaintenanceModule())
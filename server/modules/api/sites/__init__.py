@@ -1,12 +1,159 @@
+import json
+import sqlite3
+import time
+
+from typing import Iterable, Iterator
+
+from aiohttp import hdrs
 from aiohttp.web import StreamResponse
-from aiohttp.web_exceptions import HTTPNoContent
+from aiohttp.web_exceptions import HTTPNoContent, HTTPNotModified
+from pydantic import ValidationError
 
 from core_utilities import CustomHTTPException, CustomRequest, HTTPStatus
 from decorators import route
 from module_loader import HTTPModule, ModulesManager
-from ..utils.a2f import generate_code, next_timecode_in
-from ..utils.models import CreateSiteModel, UpdateSiteModel
-from ...utils import make_json_response, parse_json_content
+from ..utils.a2f import (
+    MAX_CODE_WINDOWS,
+    TotpKey,
+    current_timecode,
+    generate_site_codes,
+    get_totp_key,
+    next_timecode_in,
+    parse_otpauth_uri,
+)
+from ..utils.auth import Token
+from ..utils.database import SQL, bump_data_version
+from ..utils.models import (
+    BatchOperationModel,
+    BatchSitesModel,
+    CreateSiteModel,
+    UpdateSiteModel,
+)
+from ...utils import (
+    JsonHttpException,
+    etag_matches,
+    get_query_int,
+    iter_lines,
+    json_compact_dumps,
+    make_json_response,
+    parse_json_content,
+)
+
+STREAM_CHUNK_SIZE = 256
+MAX_PAGE_SIZE = 1000
+IMPORT_BATCH_SIZE = 200
+MAX_IMPORT_LINE_SIZE = 64 * 1024
+MAX_IMPORT_BODY_SIZE = 8 * 1024**2
+MAX_SITE_BODY_SIZE = 4096
+MAX_BATCH_BODY_SIZE = 1024**2
+MAX_IMPORT_ERRORS = 100
+NOT_FOUND_RESULT = {
+    "status": HTTPStatus.NOT_FOUND,
+    "explain": HTTPStatus.NOT_FOUND.description,
+}
+
+
+class MissingSitesError(Exception):
+    def __init__(self, outcomes: list[bytes | bool | None]):
+        super().__init__("Some sites do not exist")
+        self.outcomes = outcomes
+
+
+def make_batch_exception(results: list[dict | None]) -> JsonHttpException:
+    return JsonHttpException(
+        HTTPStatus.UNPROCESSABLE_ENTITY,
+        explain="Some operations are invalid",
+        headers={},
+    ).add_property(
+        "results",
+        [result or {"status": HTTPStatus.FAILED_DEPENDENCY} for result in results],
+    )
+
+
+def make_etag(data_version: int, *parameters: int | None) -> str:
+    # Les codes changent à chaque fenêtre TOTP, l'ETag doit donc en dépendre,
+    # ainsi que des paramètres normalisés qui changent la forme de la réponse
+    shape = ".".join(
+        "" if parameter is None else str(parameter) for parameter in parameters
+    )
+    return f'"{data_version}-{current_timecode()}-{shape}"'
+
+
+def get_windows(request: CustomRequest) -> int | None:
+    return get_query_int(request, "windows", minimum=1, maximum=MAX_CODE_WINDOWS)
+
+
+def parse_import_line(line: bytes) -> list[dict]:
+    text = line.decode("utf-8")
+    if text.startswith("otpauth"):
+        return parse_otpauth_uri(text)
+    return [json.loads(text)]
+
+
+def make_totp_key(site_payload: CreateSiteModel) -> TotpKey:
+    # Le secret est validé à la création, la forme normalisée est ensuite stockée chiffrée
+    return TotpKey(
+        site_payload.secret,
+        site_payload.algorithm,
+        site_payload.digits,
+        site_payload.period,
+    )
+
+
+def encrypt_sites(
+    token: Token, sites: Iterable[tuple[str, str]]
+) -> list[tuple[bytes, bytes]]:
+    encrypted = token.encrypt_strings(value for site in sites for value in site)
+    return list(zip(encrypted[::2], encrypted[1::2]))
+
+
+def iter_site_pages(
+    db: sqlite3.Connection, user_id: int, after_id: int = 0, limit: int | None = None
+) -> Iterator[list[tuple[int, bytes, bytes]]]:
+    # Une requête entièrement lue par lot : aucun instantané de lecture ne reste ouvert pendant
+    # l'envoi d'un lot à un client lent, ce qui bloquerait les checkpoints du WAL
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = (
+            STREAM_CHUNK_SIZE
+            if remaining is None
+            else min(remaining, STREAM_CHUNK_SIZE)
+        )
+        rows = db.execute(SQL.SELECT_SITES_PAGE, (user_id, after_id, size)).fetchall()
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def iter_decrypted_sites(
+    token: Token, pages: Iterable[list[tuple[int, bytes, bytes]]]
+) -> Iterator[tuple[int, str, str]]:
+    # Les sites sont déchiffrés par lots, avec un seul appel par colonne
+    for rows in pages:
+        site_ids, encrypted_names, encrypted_secrets = zip(*rows)
+        yield from zip(
+            site_ids,
+            token.decrypt_strings(encrypted_names),
+            token.decrypt_strings(encrypted_secrets),
+        )
+
+
+def iter_site_entries(
+    token: Token, pages: Iterable[list[tuple[int, bytes, bytes]]], windows: int | None
+) -> Iterator[dict]:
+    # Les codes sont aussi calculés par lots
+    for rows in pages:
+        site_ids, encrypted_names, encrypted_secrets = zip(*rows)
+        for site_id, name, site_codes in zip(
+            site_ids,
+            token.decrypt_strings(encrypted_names),
+            generate_site_codes(token.decrypt_strings(encrypted_secrets), windows),
+        ):
+            yield {"id": site_id, "name": name, **site_codes}
 
 
 class SitesAPIModule(HTTPModule):
@@ -18,74 +165,484 @@ class SitesAPIModule(HTTPModule):
 
         self.core = self.modules_manager.get_module(APICoreModule)
 
-    @route("POST", "/api/sites")
+    @staticmethod
+    def _insert_sites(
+        db: sqlite3.Connection,
+        user_id: int,
+        data_version: int,
+        encrypted_sites: list[tuple[bytes, bytes]],
+    ) -> int:
+        # Doit être appelé dans une transaction, AUTOINCREMENT y attribue des identifiants consécutifs
+        db.executemany(
+            SQL.INSERT_SITES,
+            (
+                (user_id, encrypted_name, encrypted_secret, data_version)
+                for encrypted_name, encrypted_secret in encrypted_sites
+            ),
+        )
+        return db.execute(SQL.LAST_INSERT_ID).fetchone()[0] - len(encrypted_sites) + 1
+
+    @staticmethod
+    def _write_site(
+        db: sqlite3.Connection,
+        user_id: int,
+        encrypted_name: bytes,
+        encrypted_secret: bytes,
+    ) -> tuple[int, int]:
+        data_version = bump_data_version(db, user_id)
+        site_id = db.execute(
+            SQL.INSERT_SITE,
+            (user_id, encrypted_name, encrypted_secret, data_version),
+        ).fetchone()[0]
+        return data_version, site_id
+
+    @classmethod
+    def _write_sites(
+        cls,
+        db: sqlite3.Connection,
+        user_id: int,
+        encrypted_creates: list[tuple[bytes, bytes]],
+        encrypted_updates: list[tuple[int, bytes | None]],
+        atomic: bool = False,
+    ) -> tuple[int, int, list[bytes | bool | None]]:
+        data_version = bump_data_version(db, user_id)
+        first_id = cls._insert_sites(db, user_id, data_version, encrypted_creates)
+        # Les opérations sont appliquées dans l'ordre, un site supprimé ne peut plus être renommé
+        outcomes: list[bytes | bool | None] = []
+        for site_id, encrypted_name in encrypted_updates:
+            if encrypted_name is None:
+                deleted = db.execute(SQL.DELETE_SITE, (site_id, user_id)).rowcount > 0
+                if deleted:
+                    db.execute(SQL.INSERT_TOMBSTONE, (site_id, user_id, data_version))
+                outcomes.append(deleted or None)
+            else:
+                res = db.execute(
+                    SQL.RENAME_SITE,
+                    (encrypted_name, data_version, site_id, user_id),
+                ).fetchone()
+                outcomes.append(None if res is None else res[0])
+        if atomic and None in outcomes:
+            # Annule toute l'écriture, y compris les créations
+            raise MissingSitesError(outcomes)
+        return data_version, first_id, outcomes
+
+    @staticmethod
+    def _write_rename(
+        db: sqlite3.Connection, user_id: int, site_id: int, encrypted_name: bytes
+    ) -> tuple[int, bytes]:
+        data_version = bump_data_version(db, user_id)
+        res = db.execute(
+            SQL.RENAME_SITE,
+            (encrypted_name, data_version, site_id, user_id),
+        ).fetchone()
+        if res is None:
+            raise CustomHTTPException(HTTPStatus.NOT_FOUND)
+        return data_version, res[0]
+
+    @staticmethod
+    def _write_delete(db: sqlite3.Connection, user_id: int, site_id: int) -> int:
+        if db.execute(SQL.DELETE_SITE, (site_id, user_id)).rowcount == 0:
+            raise CustomHTTPException(HTTPStatus.NOT_FOUND)
+        data_version = bump_data_version(db, user_id)
+        db.execute(SQL.INSERT_TOMBSTONE, (site_id, user_id, data_version))
+        return data_version
+
+    @route("POST", "/api/sites", MAX_SITE_BODY_SIZE)
     async def post_site(self, request: CustomRequest) -> StreamResponse:
         token = self.core.check_authorization(request)
         site_payload = await parse_json_content(request, CreateSiteModel)
+        windows = get_windows(request)
 
-        code = generate_code(site_payload.secret)
-        encrypted_name = token.encrypt_string(site_payload.name)
-        encrypted_secret = token.encrypt_string(site_payload.secret)
-        with self.core.db:
-            site_id = self.core.db.execute(
-                "INSERT INTO sites (user, name, secret) VALUES (?, ?, ?) RETURNING id",
-                (token.user_id, encrypted_name, encrypted_secret),
-            ).fetchone()[0]
+        key = make_totp_key(site_payload)
+        codes = key.site_codes(time.time(), windows)
+        ((encrypted_name, encrypted_secret),) = encrypt_sites(
+            token, ((site_payload.name, key.to_stored()),)
+        )
+        data_version, site_id = await self.core.shard(token.user_id).writes.submit(
+            self._write_site, token.user_id, encrypted_name, encrypted_secret
+        )
+
+        site = {"id": site_id, "name": site_payload.name, **codes}
+        await self.modules_manager.dispatch_event(
+            "sites_changed", token.user_id, data_version, [site], []
+        )
         return make_json_response(
             HTTPStatus.CREATED,
-            {
+            {**site, "next_update": next_timecode_in(), "version": data_version},
+        )
+
+    @route("POST", "/api/sites/batch", MAX_BATCH_BODY_SIZE)
+    async def post_sites_batch(self, request: CustomRequest) -> StreamResponse:
+        token = self.core.check_authorization(request)
+        batch_payload = await parse_json_content(request, BatchSitesModel)
+        windows = get_windows(request)
+
+        results: list[dict | None] = [None] * len(batch_payload.operations)
+        creates: list[tuple[int, CreateSiteModel, TotpKey]] = []
+        updates: list[tuple[int, int, UpdateSiteModel | None]] = []
+        for index, item in enumerate(batch_payload.operations):
+            try:
+                operation = BatchOperationModel.model_validate(item)
+                if operation.op == "create":
+                    site_payload = CreateSiteModel.model_validate(item)
+                    creates.append((index, site_payload, make_totp_key(site_payload)))
+                elif operation.op == "rename":
+                    updates.append(
+                        (index, operation.id, UpdateSiteModel.model_validate(item))
+                    )
+                else:
+                    updates.append((index, operation.id, None))
+            except ValidationError as e:
+                results[index] = {
+                    "status": HTTPStatus.BAD_REQUEST,
+                    "explain": e.errors(include_url=False, include_context=False),
+                }
+            except CustomHTTPException as e:
+                results[index] = {"status": e.status, "explain": e.explain}
+
+        if batch_payload.atomic and any(result is not None for result in results):
+            raise make_batch_exception(results)
+
+        encrypted_creates = encrypt_sites(
+            token,
+            ((site_payload.name, key.to_stored()) for _, site_payload, key in creates),
+        )
+        encrypted_names = iter(
+            token.encrypt_strings(
+                site_payload.name
+                for _, _, site_payload in updates
+                if site_payload is not None
+            )
+        )
+        encrypted_updates = [
+            (site_id, None if site_payload is None else next(encrypted_names))
+            for _, site_id, site_payload in updates
+        ]
+
+        if not (creates or updates):
+            data_version = self.core.get_data_version(token.user_id)
+            first_id = 0
+            outcomes = []
+        else:
+            try:
+                data_version, first_id, outcomes = await self.core.shard(
+                    token.user_id
+                ).writes.submit(
+                    self._write_sites,
+                    token.user_id,
+                    encrypted_creates,
+                    encrypted_updates,
+                    batch_payload.atomic,
+                )
+            except MissingSitesError as e:
+                for (index, _, _), outcome in zip(updates, e.outcomes):
+                    if outcome is None:
+                        results[index] = NOT_FOUND_RESULT
+                raise make_batch_exception(results)
+
+        changed_sites = []
+        timestamp = time.time()
+        for site_id, (index, site_payload, key) in enumerate(creates, first_id):
+            site = {
                 "id": site_id,
                 "name": site_payload.name,
-                "code": code,
+                **key.site_codes(timestamp, windows),
+            }
+            changed_sites.append(site)
+            results[index] = {"status": HTTPStatus.CREATED, **site}
+
+        renames: list[tuple[int, int, UpdateSiteModel, bytes]] = []
+        deleted_ids: list[int] = []
+        for (index, site_id, site_payload), outcome in zip(updates, outcomes):
+            if outcome is None:
+                results[index] = NOT_FOUND_RESULT
+            elif site_payload is None:
+                deleted_ids.append(site_id)
+                results[index] = {"status": HTTPStatus.NO_CONTENT, "id": site_id}
+            else:
+                renames.append((index, site_id, site_payload, outcome))
+        for (index, site_id, site_payload, _), site_codes in zip(
+            renames,
+            generate_site_codes(
+                token.decrypt_strings(secret for _, _, _, secret in renames),
+                windows,
+            ),
+        ):
+            site = {"id": site_id, "name": site_payload.name, **site_codes}
+            changed_sites.append(site)
+            results[index] = {"status": HTTPStatus.OK, **site}
+
+        if changed_sites or deleted_ids:
+            await self.modules_manager.dispatch_event(
+                "sites_changed", token.user_id, data_version, changed_sites, deleted_ids
+            )
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                "results": results,
                 "next_update": next_timecode_in(),
+                "version": data_version,
             },
         )
 
-    @route("GET", "/api/sites")
-    async def get_sites(self, request: CustomRequest) -> StreamResponse:
+    @route("GET", "/api/sites/export")
+    async def get_sites_export(self, request: CustomRequest) -> StreamResponse:
         token = self.core.check_authorization(request)
-        sites = []
 
-        for site_id, encrypted_name, encrypted_secret in self.core.db.execute(
-            "SELECT id, name, secret FROM sites WHERE user=?", (token.user_id,)
-        ):
-            sites.append(
+        response = StreamResponse(
+            headers={
+                hdrs.CONTENT_TYPE: "application/x-ndjson; charset=utf-8",
+                hdrs.CONTENT_DISPOSITION: 'attachment; filename="secondlock.ndjson"',
+                hdrs.CACHE_CONTROL: "no-store",
+            }
+        )
+        await response.prepare(request)
+
+        pages = iter_site_pages(self.core.shard(token.user_id).db, token.user_id)
+        chunk = []
+        for _, name, secret in iter_decrypted_sites(token, pages):
+            key = TotpKey.from_stored(secret)
+            chunk.append(
+                json_compact_dumps(
+                    {"name": name, "secret": key.secret, **key.parameters()}
+                )
+                + "\n"
+            )
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                await response.write("".join(chunk).encode("utf-8"))
+                chunk.clear()
+        if chunk:
+            await response.write("".join(chunk).encode("utf-8"))
+
+        await response.write_eof()
+        return response
+
+    async def _import_sites(
+        self, token: Token, sites: list[tuple[CreateSiteModel, TotpKey]]
+    ) -> int:
+        encrypted_sites = encrypt_sites(
+            token, ((site_payload.name, key.to_stored()) for site_payload, key in sites)
+        )
+        data_version, first_id, _ = await self.core.shard(token.user_id).writes.submit(
+            self._write_sites, token.user_id, encrypted_sites, []
+        )
+
+        timestamp = time.time()
+        await self.modules_manager.dispatch_event(
+            "sites_changed",
+            token.user_id,
+            data_version,
+            [
                 {
                     "id": site_id,
-                    "name": token.decrypt_string(encrypted_name),
-                    "code": generate_code(token.decrypt_string(encrypted_secret)),
+                    "name": site_payload.name,
+                    **key.site_codes(timestamp, None),
                 }
+                for site_id, (site_payload, key) in enumerate(sites, first_id)
+            ],
+            [],
+        )
+        return data_version
+
+    @route("POST", "/api/sites/import", MAX_IMPORT_BODY_SIZE)
+    async def post_sites_import(self, request: CustomRequest) -> StreamResponse:
+        token = self.core.check_authorization(request)
+
+        imported = 0
+        failed = 0
+        errors = []
+        pending: list[tuple[CreateSiteModel, TotpKey]] = []
+        line_number = 0
+        async for line in iter_lines(request, MAX_IMPORT_LINE_SIZE):
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                sites = []
+                for entry in parse_import_line(line):
+                    site_payload = CreateSiteModel.model_validate(entry)
+                    sites.append((site_payload, make_totp_key(site_payload)))
+            except ValidationError as e:
+                explain = e.errors(include_url=False, include_context=False)
+            except CustomHTTPException as e:
+                explain = e.explain
+            except ValueError as e:
+                explain = str(e)
+            else:
+                pending.extend(sites)
+                if len(pending) >= IMPORT_BATCH_SIZE:
+                    await self._import_sites(token, pending)
+                    imported += len(pending)
+                    pending = []
+                continue
+
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_number, "explain": explain})
+
+        if pending:
+            await self._import_sites(token, pending)
+            imported += len(pending)
+
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                "imported": imported,
+                "failed": failed,
+                "errors": errors,
+                "version": self.core.get_data_version(token.user_id),
+            },
+        )
+
+    async def _stream_sites(
+        self,
+        request: CustomRequest,
+        site_entries: Iterator[dict],
+        limit: int | None,
+        data_version: int,
+        etag: str,
+    ) -> StreamResponse:
+        response = StreamResponse(
+            headers={
+                hdrs.CONTENT_TYPE: "application/json; charset=utf-8",
+                hdrs.ETAG: etag,
+            }
+        )
+        await response.prepare(request)
+        await response.write(f'{{"version":{data_version},"sites":['.encode("utf-8"))
+
+        written = 0
+        last_id = None
+        chunk = []
+        for site in site_entries:
+            chunk.append(json_compact_dumps(site))
+            last_id = site["id"]
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                await response.write(
+                    (("," if written else "") + ",".join(chunk)).encode("utf-8")
+                )
+                written += len(chunk)
+                chunk.clear()
+        if chunk:
+            await response.write(
+                (("," if written else "") + ",".join(chunk)).encode("utf-8")
+            )
+            written += len(chunk)
+
+        tail = {"next_update": next_timecode_in()}
+        if limit is not None:
+            tail["next_after_id"] = last_id if written == limit else None
+        # L'objet final est fusionné dans l'objet déjà ouvert, sans son accolade ouvrante
+        await response.write(b"]," + json_compact_dumps(tail)[1:].encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    @route("GET", "/api/sites")
+    async def get_sites(self, request: CustomRequest) -> StreamResponse:
+        token = self.core.check_authorization(request)
+        since = get_query_int(request, "since", minimum=0)
+        windows = get_windows(request)
+        limit = get_query_int(request, "limit", minimum=1, maximum=MAX_PAGE_SIZE)
+        after_id = get_query_int(request, "after_id", 0, minimum=0)
+        stream = get_query_int(request, "stream", 0, minimum=0, maximum=1)
+        if since is not None and (limit is not None or after_id or stream):
+            raise CustomHTTPException.only_explain(
+                HTTPStatus.BAD_REQUEST,
+                "'since' cannot be combined with 'limit', 'after_id' or 'stream'",
+            )
+
+        db = self.core.shard(token.user_id).db
+        data_version = self.core.get_data_version(token.user_id)
+        etag = make_etag(data_version, windows, since, limit, after_id, stream)
+        if etag_matches(request, etag):
+            return HTTPNotModified(headers={hdrs.ETAG: etag})
+
+        if since is None or since > data_version:
+            site_entries = iter_site_entries(
+                token, iter_site_pages(db, token.user_id, after_id, limit), windows
+            )
+            if stream:
+                return await self._stream_sites(
+                    request, site_entries, limit, data_version, etag
+                )
+
+            sites = list(site_entries)
+            data = {
+                "sites": sites,
+                "next_update": next_timecode_in(),
+                "version": data_version,
+            }
+            if limit is not None:
+                data["next_after_id"] = sites[-1]["id"] if len(sites) == limit else None
+            return make_json_response(HTTPStatus.OK, data, {hdrs.ETAG: etag})
+
+        rows = db.execute(SQL.SELECT_SITES_WITH_VERSION, (token.user_id,)).fetchall()
+        # Seuls les noms des sites modifiés sont déchiffrés
+        changed_names = iter(
+            token.decrypt_strings(
+                encrypted_name
+                for _, encrypted_name, _, site_version in rows
+                if site_version > since
+            )
+        )
+        sites = []
+        codes = {}
+        for (site_id, _, _, site_version), site_codes in zip(
+            rows,
+            generate_site_codes(token.decrypt_strings(row[2] for row in rows), windows),
+        ):
+            if site_version > since:
+                sites.append({"id": site_id, "name": next(changed_names), **site_codes})
+            else:
+                codes[site_id] = site_codes.get("codes", site_codes["code"])
+
+        deleted = [
+            site_id
+            for site_id, in db.execute(
+                SQL.SELECT_TOMBSTONES_SINCE,
+                (token.user_id, since),
             )
+        ]
 
         return make_json_response(
-            HTTPStatus.OK, {"sites": sites, "next_update": next_timecode_in()}
+            HTTPStatus.OK,
+            {
+                "sites": sites,
+                "deleted": deleted,
+                "codes": codes,
+                "next_update": next_timecode_in(),
+                "since": since,
+                "version": data_version,
+            },
+            {hdrs.ETAG: etag},
         )
 
-    @route("PATCH", "/api/sites/{id:\\d+}")
+    @route("PATCH", "/api/sites/{id:\\d+}", MAX_SITE_BODY_SIZE)
     async def patch_site(self, request) -> StreamResponse:
         token = self.core.check_authorization(request)
         site_payload = await parse_json_content(request, UpdateSiteModel)
         site_id = int(request.match_info["id"])
+        windows = get_windows(request)
 
         encrypted_name = token.encrypt_string(site_payload.name)
-        with self.core.db:
-            res = self.core.db.execute(
-                "UPDATE sites SET name=? WHERE id=? AND user=? RETURNING secret",
-                (encrypted_name, site_id, token.user_id),
-            ).fetchone()
-            if res is None:
-                raise CustomHTTPException(HTTPStatus.NOT_FOUND)
-            encrypted_secret = res[0]
-
-        code = generate_code(token.decrypt_string(encrypted_secret))
+        data_version, encrypted_secret = await self.core.shard(
+            token.user_id
+        ).writes.submit(self._write_rename, token.user_id, site_id, encrypted_name)
+
+        key = get_totp_key(token.decrypt_string(encrypted_secret))
+        site = {
+            "id": site_id,
+            "name": site_payload.name,
+            **key.site_codes(time.time(), windows),
+        }
+        await self.modules_manager.dispatch_event(
+            "sites_changed", token.user_id, data_version, [site], []
+        )
         return make_json_response(
             HTTPStatus.OK,
-            {
-                "id": site_id,
-                "name": site_payload.name,
-                "code": code,
-                "next_update": next_timecode_in(),
-            },
+            {**site, "next_update": next_timecode_in(), "version": data_version},
         )
 
     @route("DELETE", "/api/sites/{id:\\d+}")
@@ -93,12 +650,13 @@ class SitesAPIModule(HTTPModule):
         token = self.core.check_authorization(request)
         site_id = int(request.match_info["id"])
 
-        with self.core.db:
-            rowcount = self.core.db.execute(
-                "DELETE FROM sites WHERE id=? AND user=?", (site_id, token.user_id)
-            ).rowcount
-        if rowcount == 0:
-            raise CustomHTTPException(HTTPStatus.NOT_FOUND)
+        data_version = await self.core.shard(token.user_id).writes.submit(
+            self._write_delete, token.user_id, site_id
+        )
+
+        await self.modules_manager.dispatch_event(
+            "sites_changed", token.user_id, data_version, [], [site_id]
+        )
         return HTTPNoContent()
 
 
@@ -1,20 +1,74 @@
+import asyncio
 import sqlite3
+from typing import NoReturn
 
 from aiohttp.web_exceptions import HTTPNoContent
 from aiohttp.web_response import StreamResponse
 
-from core_utilities import CustomHTTPException, CustomRequest, HTTPStatus
+from core_utilities import (
+    CustomHTTPException,
+    CustomRequest,
+    HTTPStatus,
+    memory_registry,
+)
 from decorators import route
 from module_loader import HTTPModule, ModulesManager
-from ..utils.auth import check_bcrypt, gen_bcrypt
+from ..utils.auth import Token, check_bcrypt, gen_bcrypt
+from ..utils.database import SQL
 from ..utils.models import DangerousActionModel, LoginRegisterModel, UpdateUserModel
 from ...utils import (
     RateLimitChecker,
-    basic_ip_ratelimit,
     ip_lock,
     make_json_response,
     parse_json_content,
+    shared_ip_ratelimit,
 )
+from ...ratelimits import RateLimitStoreModule
+
+# Identifiants et mots de passe : bien moins d'un kilo-octet
+MAX_USER_BODY_SIZE = 1024
+
+
+def _raise_username_used() -> NoReturn:
+    raise CustomHTTPException.only_explain(
+        HTTPStatus.CONFLICT, "The 'username' is already used"
+    )
+
+
+def _write_user(
+    db: sqlite3.Connection, user_id: int, username: str, passhash_db: bytes
+):
+    db.execute(SQL.INSERT_USER, (user_id, username, passhash_db))
+
+
+def _write_user_update(
+    db: sqlite3.Connection,
+    old_token: Token,
+    new_token: Token | None,
+    username: str,
+    passhash_db: bytes,
+):
+    # L'unicité du nom d'utilisateur est garantie par l'index global
+    db.execute(SQL.UPDATE_USER, (username, passhash_db, old_token.user_id))
+    if new_token is not None:
+        # Les sites sont lus sur la connexion d'écriture pour ne pas manquer une modification du même lot
+        rows = db.execute(SQL.SELECT_SITES_PAGE, (old_token.user_id, 0, -1)).fetchall()
+        encrypted_names = new_token.encrypt_many(
+            old_token.decrypt_many(row[1] for row in rows)
+        )
+        encrypted_secrets = new_token.encrypt_many(
+            old_token.decrypt_many(row[2] for row in rows)
+        )
+        db.executemany(
+            SQL.REENCRYPT_SITES,
+            zip(encrypted_names, encrypted_secrets, (row[0] for row in rows)),
+        )
+
+
+def _write_user_deletion(db: sqlite3.Connection, user_id: int):
+    db.execute(SQL.DELETE_USER_SITES, (user_id,))
+    db.execute(SQL.DELETE_USER_TOMBSTONES, (user_id,))
+    db.execute(SQL.DELETE_USER, (user_id,))
 
 
 class APIAuthenticationModule(HTTPModule):
@@ -26,19 +80,80 @@ class APIAuthenticationModule(HTTPModule):
 
         self.core = self.modules_manager.get_module(APICoreModule)
 
-        self.login_ratelimit = RateLimitChecker(basic_ip_ratelimit(5, 1800))
-        self.register_ratelimit = RateLimitChecker(basic_ip_ratelimit(1, 1800))
+        table = self.modules_manager.get_module(RateLimitStoreModule).table
+        self.login_ratelimit = RateLimitChecker(
+            shared_ip_ratelimit(table, "login", 5, 1800)
+        )
+        self.register_ratelimit = RateLimitChecker(
+            shared_ip_ratelimit(table, "register", 1, 1800)
+        )
+        for handler in (self.post_login, self.post_register):
+            memory_registry.register(
+                f"ip_lock[{handler.__qualname__}]", lambda locks=handler.locks: locks
+            )
 
-    @route("POST", "/api/login")
+    # Les écritures dans l'index et dans le shard forment une seule opération : elle est protégée
+    # de l'annulation de la requête et n'est compensée que si une écriture échoue réellement
+    async def _create_user(self, username: str, passhash_db: bytes) -> int:
+        try:
+            user_id = await self.core.storage.reserve_username(username)
+        except sqlite3.IntegrityError:
+            _raise_username_used()
+        try:
+            await self.core.shard(user_id).writes.submit(
+                _write_user, user_id, username, passhash_db
+            )
+        except Exception:
+            await self.core.storage.release_username(user_id)
+            raise
+        return user_id
+
+    async def _update_user(
+        self,
+        old_token: Token,
+        new_token: Token | None,
+        old_username: str,
+        new_username: str,
+        passhash_db: bytes,
+    ):
+        if new_username != old_username:
+            try:
+                await self.core.storage.rename_username(old_token.user_id, new_username)
+            except sqlite3.IntegrityError:
+                _raise_username_used()
+        try:
+            await self.core.shard(old_token.user_id).writes.submit(
+                _write_user_update, old_token, new_token, new_username, passhash_db
+            )
+        except Exception:
+            if new_username != old_username:
+                await self.core.storage.rename_username(old_token.user_id, old_username)
+            raise
+
+    async def _delete_user(self, user_id: int, username: str):
+        # Dans l'ordre inverse de l'inscription : un nom encore indexé pointe toujours vers un utilisateur
+        await self.core.storage.release_username(user_id)
+        try:
+            await self.core.shard(user_id).writes.submit(_write_user_deletion, user_id)
+        except Exception:
+            await self.core.storage.restore_username(user_id, username)
+            raise
+
+    @route("POST", "/api/login", MAX_USER_BODY_SIZE)
     @ip_lock
     async def post_login(self, request: CustomRequest) -> StreamResponse:
         await self.login_ratelimit.check_ratelimit(self, request)
         login_payload = await parse_json_content(request, LoginRegisterModel)
         await self.login_ratelimit.count_request(self, request)
 
-        res = self.core.db.execute(
-            "SELECT id, passhash FROM users WHERE username=?", (login_payload.username,)
-        ).fetchone()
+        user_id = self.core.storage.find_user_id(login_payload.username)
+        res = (
+            None
+            if user_id is None
+            else self.core.shard(user_id)
+            .db.execute(SQL.SELECT_USER, (user_id,))
+            .fetchone()
+        )
         if res is None:
             # Ajouter du temps suplémentaire pour éviter de savoir facilement si le nom d'utilisateur existe ou pas en vérifiant contre un hash factice
             await check_bcrypt(
@@ -48,7 +163,7 @@ class APIAuthenticationModule(HTTPModule):
             raise CustomHTTPException.only_explain(
                 HTTPStatus.UNAUTHORIZED, "Incorrect username or password"
             )
-        user_id, db_passhash = res
+        _, db_passhash = res
 
         if not await check_bcrypt(login_payload.password, db_passhash):
             raise CustomHTTPException.only_explain(
@@ -65,34 +180,20 @@ class APIAuthenticationModule(HTTPModule):
             },
         )
 
-    @route("POST", "/api/register")
+    @route("POST", "/api/register", MAX_USER_BODY_SIZE)
     @ip_lock
     async def post_register(self, request: CustomRequest) -> StreamResponse:
         await self.register_ratelimit.check_ratelimit(self, request)
         register_payload = await parse_json_content(request, LoginRegisterModel)
 
-        if (
-            self.core.db.execute(
-                "SELECT id FROM users WHERE username=?", (register_payload.username,)
-            ).fetchone()
-            is not None
-        ):
-            raise CustomHTTPException.only_explain(
-                HTTPStatus.CONFLICT, "The 'username' is already used"
-            )
+        if self.core.storage.find_user_id(register_payload.username) is not None:
+            _raise_username_used()
 
         passhash_db = await gen_bcrypt(register_payload.password)
-        with self.core.db:
-            try:
-                user_id = self.core.db.execute(
-                    "INSERT INTO users (username, passhash) VALUES (?, ?) RETURNING id",
-                    (register_payload.username, passhash_db),
-                ).fetchone()[0]
-            except sqlite3.IntegrityError:
-                raise CustomHTTPException.only_explain(
-                    HTTPStatus.CONFLICT, "The 'username' is already used"
-                )
-            await self.register_ratelimit.count_request(self, request)
+        user_id = await asyncio.shield(
+            self._create_user(register_payload.username, passhash_db)
+        )
+        await self.register_ratelimit.count_request(self, request)
 
         return make_json_response(
             HTTPStatus.CREATED,
@@ -104,7 +205,7 @@ class APIAuthenticationModule(HTTPModule):
             },
         )
 
-    @route("PATCH", "/api/user")
+    @route("PATCH", "/api/user", MAX_USER_BODY_SIZE)
     async def patch_user(self, request: CustomRequest) -> StreamResponse:
         old_token, (old_username, old_passhash_db) = (
             self.core.check_authorization_advanced(request)
@@ -125,45 +226,25 @@ class APIAuthenticationModule(HTTPModule):
             old_token, update_user_payload.new_password
         )
 
-        with self.core.db:
-            try:
-                self.core.db.execute(
-                    "UPDATE users SET username=?, passhash=? WHERE id=?",
-                    (new_username, new_passhash_db, old_token.user_id),
-                )
-            except sqlite3.IntegrityError:
-                raise CustomHTTPException.only_explain(
-                    HTTPStatus.CONFLICT, "The 'username' is already used"
-                )
-            if update_user_payload.new_password is not None:
-                self.core.db.executemany(
-                    "UPDATE sites SET name=?, secret=? WHERE id=?",
-                    (
-                        (
-                            new_token.encrypt_string(
-                                old_token.decrypt_string(encrypted_name)
-                            ),
-                            new_token.encrypt_string(
-                                old_token.decrypt_string(encrypted_secret)
-                            ),
-                            site_id,
-                        )
-                        for site_id, encrypted_name, encrypted_secret in self.core.db.execute(
-                            "SELECT id, name, secret FROM sites WHERE user=?",
-                            (old_token.user_id,),
-                        )
-                    ),
-                )
-
-            self.core.token_encryptor_manager.invalidate_tokens_before(new_token)
+        await asyncio.shield(
+            self._update_user(
+                old_token,
+                None if update_user_payload.new_password is None else new_token,
+                old_username,
+                new_username,
+                new_passhash_db,
+            )
+        )
+        self.core.token_encryptor_manager.invalidate_tokens_before(new_token)
 
+        await self.modules_manager.dispatch_event("tokens_revoked", old_token.user_id)
         return make_json_response(
             HTTPStatus.OK, {"username": new_username, "token": token_string}
         )
 
-    @route("DELETE", "/api/user")
+    @route("DELETE", "/api/user", MAX_USER_BODY_SIZE)
     async def delete_user(self, request: CustomRequest) -> StreamResponse:
-        token = self.core.check_authorization(request)
+        token, (username, _) = self.core.check_authorization_advanced(request)
         delete_user_payload = await parse_json_content(request, DangerousActionModel)
 
         if not token.is_correct_password(delete_user_payload.password):
@@ -171,11 +252,10 @@ class APIAuthenticationModule(HTTPModule):
                 HTTPStatus.FORBIDDEN, "Incorrect password"
             )
 
-        with self.core.db:
-            self.core.db.execute("DELETE FROM sites WHERE user=?", (token.user_id,))
-            self.core.db.execute("DELETE FROM users WHERE id=?", (token.user_id,))
-            self.core.token_encryptor_manager.cancel_tokens_expiration(token.user_id)
+        await asyncio.shield(self._delete_user(token.user_id, username))
+        self.core.token_encryptor_manager.cancel_tokens_expiration(token.user_id)
 
+        await self.modules_manager.dispatch_event("tokens_revoked", token.user_id)
         return HTTPNoContent()
 
 
@@ -1,19 +1,331 @@
+from __future__ import annotations
+
+import base64
 import binascii
+import hmac
 import time
+import urllib.parse
+from typing import Iterable, Iterator, NoReturn
 
-import pyotp
+from core_utilities import HTTPStatus, CustomHTTPException, traced
+from modules.utils import fix_base64_padding
 
-from core_utilities import HTTPStatus, CustomHTTPException
+TOTP_INTERVAL = 30
+MAX_TOTP_PERIOD = 300
+DEFAULT_TOTP_ALGORITHM = "SHA1"
+DEFAULT_TOTP_DIGITS = 6
+MIN_TOTP_DIGITS = 6
+MAX_TOTP_DIGITS = 8
+TOTP_ALGORITHMS = {"SHA1": "sha1", "SHA256": "sha256", "SHA512": "sha512"}
+MAX_CODE_WINDOWS = 20
+MAX_SITE_NAME_LENGTH = 64
+TOTP_KEY_CACHE_SIZE = 4096
 
+# Valeurs des énumérations du format d'export de Google Authenticator
+_MIGRATION_ALGORITHMS = {0: "SHA1", 1: "SHA1", 2: "SHA256", 3: "SHA512"}
+_MIGRATION_DIGITS = {0: 6, 1: 6, 2: 8}
+_MIGRATION_TYPE_TOTP = 2
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+# secret, name, issuer, algorithm, digits, type
+_MIGRATION_PARAMETERS_WIRE_TYPES = {
+    1: _WIRE_LENGTH_DELIMITED,
+    2: _WIRE_LENGTH_DELIMITED,
+    3: _WIRE_LENGTH_DELIMITED,
+    4: _WIRE_VARINT,
+    5: _WIRE_VARINT,
+    6: _WIRE_VARINT,
+}
 
-def generate_code(secret: str) -> str:
-    try:
-        return pyotp.TOTP(secret).now()
-    except binascii.Error:
-        raise CustomHTTPException.only_explain(
-            HTTPStatus.UNPROCESSABLE_ENTITY, "Invalid 'secret'"
+
+_BASE32_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_BASE32_CHARACTERS = frozenset(_BASE32_ALPHABET)
+_BASE32_TO_INT_DIGITS = str.maketrans(
+    _BASE32_ALPHABET, "0123456789ABCDEFGHIJKLMNOPQRSTUV"
+)
+# Nombres de caractères valides dans le dernier bloc de 8 (RFC 4648)
+_BASE32_REMAINDERS = frozenset((0, 2, 4, 5, 7))
+
+
+def _decode_base32(secret: str) -> bytes:
+    # base64.b32decode est écrit en Python : la conversion en entier est bien plus rapide
+    if not secret or len(secret) % 8 not in _BASE32_REMAINDERS:
+        raise ValueError("Invalid base32 length")
+    if not _BASE32_CHARACTERS.issuperset(secret):
+        raise ValueError("Invalid base32 character")
+    bits = len(secret) * 5
+    size = bits // 8
+    return (
+        int(secret.translate(_BASE32_TO_INT_DIGITS), 32) >> (bits - size * 8)
+    ).to_bytes(size, "big")
+
+
+def _raise_invalid(field: str) -> NoReturn:
+    raise CustomHTTPException.only_explain(
+        HTTPStatus.UNPROCESSABLE_ENTITY, f"Invalid '{field}'"
+    )
+
+
+class TotpKey:
+    __slots__ = (
+        "secret",
+        "algorithm",
+        "digits",
+        "period",
+        "_key",
+        "_digest",
+        "_modulo",
+        "_format",
+    )
+
+    def __init__(
+        self,
+        secret: str,
+        algorithm: str = DEFAULT_TOTP_ALGORITHM,
+        digits: int = DEFAULT_TOTP_DIGITS,
+        period: int = TOTP_INTERVAL,
+    ):
+        # Le secret est normalisé et décodé une seule fois, la clé est ensuite réutilisée pour chaque compteur
+        self.secret = secret.replace(" ", "").upper().rstrip("=")
+        try:
+            self._key = _decode_base32(self.secret)
+        except ValueError:
+            _raise_invalid("secret")
+        if algorithm not in TOTP_ALGORITHMS:
+            _raise_invalid("algorithm")
+        if not MIN_TOTP_DIGITS <= digits <= MAX_TOTP_DIGITS:
+            _raise_invalid("digits")
+        # Les codes doivent changer en même temps que les fenêtres de 30 secondes utilisées pour l'actualisation
+        if not 0 < period <= MAX_TOTP_PERIOD or period % TOTP_INTERVAL:
+            _raise_invalid("period")
+
+        self.algorithm = algorithm
+        self.digits = digits
+        self.period = period
+        self._digest = TOTP_ALGORITHMS[algorithm]
+        self._modulo = 10**digits
+        self._format = f"%0{digits}d"
+
+    @classmethod
+    def from_stored(cls, stored: str) -> TotpKey:
+        # Forme stockée : le secret seul pour les paramètres par défaut, sinon suivi des paramètres au format otpauth
+        secret, _, query = stored.partition("?")
+        if not query:
+            return cls(secret)
+        parameters = dict(urllib.parse.parse_qsl(query))
+        try:
+            return cls(
+                secret,
+                parameters.get("algorithm", DEFAULT_TOTP_ALGORITHM),
+                int(parameters.get("digits", DEFAULT_TOTP_DIGITS)),
+                int(parameters.get("period", TOTP_INTERVAL)),
+            )
+        except ValueError:
+            _raise_invalid("secret")
+
+    def parameters(self) -> dict[str, str | int]:
+        parameters = {}
+        if self.algorithm != DEFAULT_TOTP_ALGORITHM:
+            parameters["algorithm"] = self.algorithm
+        if self.digits != DEFAULT_TOTP_DIGITS:
+            parameters["digits"] = self.digits
+        if self.period != TOTP_INTERVAL:
+            parameters["period"] = self.period
+        return parameters
+
+    def to_stored(self) -> str:
+        parameters = self.parameters()
+        if not parameters:
+            return self.secret
+        return f"{self.secret}?{urllib.parse.urlencode(parameters)}"
+
+    def generate(self, counter: int) -> str:
+        # HOTP (RFC 4226) : troncature dynamique du HMAC du compteur
+        mac = hmac.digest(self._key, counter.to_bytes(8, "big"), self._digest)
+        offset = mac[-1] & 0x0F
+        return self._format % (
+            (int.from_bytes(mac[offset : offset + 4], "big") & 0x7FFFFFFF)
+            % self._modulo
         )
 
+    def site_codes(self, timestamp: float, windows: int | None) -> dict:
+        timecode = int(timestamp // self.period)
+        if windows is None:
+            return {"code": self.generate(timecode)}
+        codes = [
+            {
+                "code": self.generate(counter),
+                "valid_from": counter * self.period,
+                "valid_until": (counter + 1) * self.period,
+            }
+            for counter in range(timecode, timecode + windows)
+        ]
+        return {"code": codes[0]["code"], "codes": codes}
+
+
+# Ordre d'insertion du dict : du moins au plus récemment utilisé
+totp_key_cache: dict[str, TotpKey] = {}
+
+
+def get_totp_key(stored: str) -> TotpKey:
+    # Les codes de tous les sites sont recalculés à chaque liste et à chaque actualisation en direct :
+    # les clés décodées sont gardées par forme stockée plutôt qu'à côté des sites, que chaque requête
+    # relit et déchiffre. Le cache est borné, les secrets les moins utilisés en sortent en premier.
+    key = totp_key_cache.pop(stored, None)
+    if key is None:
+        key = TotpKey.from_stored(stored)
+        if len(totp_key_cache) >= TOTP_KEY_CACHE_SIZE:
+            del totp_key_cache[next(iter(totp_key_cache))]
+    totp_key_cache[stored] = key
+    return key
+
+
+def generate_code(secret: str) -> str:
+    return get_totp_key(secret).site_codes(time.time(), None)["code"]
+
+
+@traced("totp.generate_site_codes")
+def generate_site_codes(secrets: Iterable[str], windows: int | None) -> list[dict]:
+    # Tous les codes d'un appel sont calculés pour le même instant
+    timestamp = time.time()
+    return [get_totp_key(secret).site_codes(timestamp, windows) for secret in secrets]
+
+
+def current_timecode() -> int:
+    return int(time.time() // TOTP_INTERVAL)
+
 
 def next_timecode_in() -> float:
-    return 30 - (time.time() % 30)
+    return TOTP_INTERVAL - (time.time() % TOTP_INTERVAL)
+
+
+def _make_site_name(issuer: str, name: str) -> str:
+    if issuer and not name.startswith(f"{issuer}:"):
+        name = f"{issuer}:{name}" if name else issuer
+    return name[:MAX_SITE_NAME_LENGTH]
+
+
+def _read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        if shift >= 64:
+            raise ValueError("Varint too long")
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+
+def _read_bytes(data: bytes, offset: int, length: int) -> tuple[bytes, int]:
+    if offset + length > len(data):
+        raise ValueError("Truncated field")
+    return data[offset : offset + length], offset + length
+
+
+def _iter_protobuf_fields(data: bytes) -> Iterator[tuple[int, int, int | bytes]]:
+    offset = 0
+    while offset < len(data):
+        key, offset = _read_varint(data, offset)
+        field_number, wire_type = key >> 3, key & 0x07
+        if not field_number:
+            raise ValueError("Invalid field number")
+        if wire_type == _WIRE_VARINT:
+            value, offset = _read_varint(data, offset)
+        elif wire_type == _WIRE_LENGTH_DELIMITED:
+            length, offset = _read_varint(data, offset)
+            value, offset = _read_bytes(data, offset, length)
+        elif wire_type == _WIRE_FIXED64:
+            value, offset = _read_bytes(data, offset, 8)
+        elif wire_type == _WIRE_FIXED32:
+            value, offset = _read_bytes(data, offset, 4)
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type}")
+        yield field_number, wire_type, value
+
+
+def _read_message(
+    data: bytes, wire_types: dict[int, int], defaults: dict[int, int | bytes]
+) -> dict[int, int | bytes]:
+    fields = dict(defaults)
+    for field_number, wire_type, value in _iter_protobuf_fields(data):
+        # Les champs inconnus sont ignorés, les champs connus doivent avoir le type attendu
+        expected = wire_types.get(field_number)
+        if expected is None:
+            continue
+        if wire_type != expected:
+            raise ValueError(f"Invalid wire type for field {field_number}")
+        fields[field_number] = value
+    return fields
+
+
+def _parse_migration_parameters(data: bytes) -> dict[str, str | int]:
+    fields = _read_message(
+        data,
+        _MIGRATION_PARAMETERS_WIRE_TYPES,
+        {1: b"", 2: b"", 3: b"", 4: 0, 5: 0, 6: _MIGRATION_TYPE_TOTP},
+    )
+    if fields[6] != _MIGRATION_TYPE_TOTP:
+        raise ValueError("Only TOTP entries are supported")
+    if fields[4] not in _MIGRATION_ALGORITHMS:
+        raise ValueError("Unsupported algorithm")
+    if fields[5] not in _MIGRATION_DIGITS:
+        raise ValueError("Unsupported number of digits")
+    if not fields[1]:
+        raise ValueError("Missing secret")
+    return {
+        "name": _make_site_name(fields[3].decode("utf-8"), fields[2].decode("utf-8")),
+        "secret": base64.b32encode(fields[1]).decode("ascii").rstrip("="),
+        "algorithm": _MIGRATION_ALGORITHMS[fields[4]],
+        "digits": _MIGRATION_DIGITS[fields[5]],
+    }
+
+
+def parse_otpauth_uri(uri: str) -> list[dict[str, str | int]]:
+    parsed = urllib.parse.urlsplit(uri)
+    query = urllib.parse.parse_qs(parsed.query)
+
+    if parsed.scheme == "otpauth-migration":
+        try:
+            data = base64.b64decode(fix_base64_padding(query["data"][0]))
+        except (KeyError, binascii.Error):
+            raise ValueError("Invalid migration data")
+        entries = []
+        for field_number, wire_type, value in _iter_protobuf_fields(data):
+            if field_number != 1:
+                continue
+            if wire_type != _WIRE_LENGTH_DELIMITED:
+                raise ValueError("Invalid wire type for field 1")
+            entries.append(_parse_migration_parameters(value))
+        return entries
+
+    if parsed.scheme == "otpauth":
+        if parsed.netloc != "totp":
+            raise ValueError("Only TOTP entries are supported")
+        try:
+            secret = query["secret"][0]
+        except KeyError:
+            raise ValueError("Missing secret")
+        # Les paramètres sont validés avec le reste du site
+        return [
+            {
+                "name": _make_site_name(
+                    query.get("issuer", [""])[0],
+                    urllib.parse.unquote(parsed.path.lstrip("/")),
+                ),
+                "secret": secret,
+                "algorithm": query.get("algorithm", [DEFAULT_TOTP_ALGORITHM])[
+                    0
+                ].upper(),
+                "digits": query.get("digits", [DEFAULT_TOTP_DIGITS])[0],
+                "period": query.get("period", [TOTP_INTERVAL])[0],
+            }
+        ]
+
+    raise ValueError("Unsupported URI scheme")
@@ -2,17 +2,28 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import binascii
 import hashlib
 import math
+import os
 import struct
 import time
 from typing import NoReturn
 
 import bcrypt
 from aiohttp import hdrs
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet, InvalidToken
-
-from core_utilities import CustomHTTPException, HTTPStatus, CustomRequest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from core_utilities import (
+    CustomHTTPException,
+    HTTPStatus,
+    CustomRequest,
+    Job,
+    Scheduler,
+    traced,
+)
 from modules.utils import fix_base64_padding, NS_MULTIPLIER
 from ..utils.encryption import Encryptor
 
@@ -28,7 +39,21 @@ __all__ = (
 
 DUMMY_HASH = bcrypt.hashpw(b"", bcrypt.gensalt())
 
+# Jeton compact : version (1 octet) + id de clé (1 octet) + nonce + champs chiffrés en AES-GCM + tag
+COMPACT_TOKEN_VERSION = 1
+COMPACT_HEADER_SIZE = 2
+COMPACT_NONCE_SIZE = 12
+COMPACT_TAG_SIZE = 16
+# Champs de TokenEncryptor.TOKEN_STRUCT_FORMAT
+COMPACT_TOKEN_SIZE = (
+    COMPACT_HEADER_SIZE
+    + COMPACT_NONCE_SIZE
+    + struct.calcsize(">QI32s")
+    + COMPACT_TAG_SIZE
+)
+
 
+@traced("bcrypt.hashpw")
 async def gen_bcrypt(passhash: bytes, rounds: int = 12, prefix: bytes = b"2b") -> bytes:
     run_in_executor = asyncio.get_running_loop().run_in_executor
     return await run_in_executor(
@@ -39,6 +64,7 @@ async def gen_bcrypt(passhash: bytes, rounds: int = 12, prefix: bytes = b"2b") -
     )
 
 
+@traced("bcrypt.checkpw")
 async def check_bcrypt(passhash: bytes, passhash_db: bytes) -> bool:
     return await asyncio.get_running_loop().run_in_executor(
         None, bcrypt.checkpw, passhash, passhash_db
@@ -64,27 +90,41 @@ class TokenEncryptorManager:
         "_expire_tasks",
         "_current_index",
         "_user_token_expirations",
+        "_compact",
+        "_scheduler",
     )
 
-    def __init__(self, token_validity_time: int, n_encryptors: int, token_prefix: str):
+    def __init__(
+        self,
+        token_validity_time: int,
+        n_encryptors: int,
+        token_prefix: str,
+        compact: bool = True,
+        scheduler: Scheduler | None = None,
+    ):
+        if n_encryptors > 256:
+            raise ValueError("The key id of compact tokens is a single byte")
         self._token_validity_time_ns = token_validity_time * NS_MULTIPLIER
         self._token_prefix = token_prefix
         self._last_rotate = 0
         self._rotate_delay = token_validity_time / (n_encryptors - 1)
         self._expiry_delay = token_validity_time + self._rotate_delay
 
-        self._encryptors: list[tuple[TokenEncryptor, asyncio.Task] | None] = [
+        self._encryptors: list[tuple[TokenEncryptor, Job] | None] = [
             None
         ] * n_encryptors
         self._current_index = -1
 
-        self._user_token_expirations: dict[int, tuple[int, asyncio.Task]] = {}
+        self._user_token_expirations: dict[int, tuple[int, Job]] = {}
+        # Les jetons Fernet restent acceptés tant qu'une de leurs clés est valide
+        self._compact = compact
+        # Sans ordonnanceur fourni (outils, mesures), les expirations ont le leur
+        self._scheduler = Scheduler() if scheduler is None else scheduler
 
-    async def _expire_encryptor(self, index: int):
-        await asyncio.sleep(self._expiry_delay)
+    def _expire_encryptor(self, index: int, encryptor: TokenEncryptor):
         if (encryptor_group := self._encryptors[index]) is not None and encryptor_group[
-            1
-        ] is asyncio.current_task():
+            0
+        ] is encryptor:
             self._encryptors[index] = None
 
     def _generate_token(self, user_id: int, passhash: bytes) -> tuple[str, Token]:
@@ -96,12 +136,27 @@ class TokenEncryptorManager:
                 prev[1].cancel()
             self._encryptors[self._current_index] = (
                 encryptor,
-                asyncio.create_task(self._expire_encryptor(self._current_index)),
+                self._scheduler.call_later(
+                    self._expiry_delay,
+                    self._expire_encryptor,
+                    self._current_index,
+                    encryptor,
+                    name=f"token_encryptor_expiration[{self._token_prefix}]",
+                ),
             )
             self._last_rotate = t
         else:
             encryptor = self._encryptors[self._current_index][0]
 
+        if self._compact:
+            encrypted, token = encryptor.encrypt_compact(
+                user_id,
+                passhash,
+                bytes((COMPACT_TOKEN_VERSION, self._current_index)),
+            )
+            b64_token = base64.urlsafe_b64encode(encrypted).rstrip(b"=").decode("ascii")
+            return f"{self._token_prefix}.{b64_token}", token
+
         index_bytes = self._current_index.to_bytes(
             math.ceil((len(self._encryptors) - 1).bit_length() / 8), "big", signed=False
         )
@@ -121,35 +176,64 @@ class TokenEncryptorManager:
         return self._generate_token(old_token.user_id, hash_password(password))
 
     def get_token(self, request: CustomRequest) -> Token:
-        token: str = request.headers.get(hdrs.AUTHORIZATION)
+        return self.decode_token(request.headers.get(hdrs.AUTHORIZATION))
+
+    def decode_token(self, token: str | None) -> Token:
         prefix_part = f"{self._token_prefix}."
         if token is None or not token.startswith(prefix_part):
             raise_invalid_token()
 
         token = token[len(prefix_part) :]
         parts = token.split(".")
-        if len(parts) != 2:
+        if len(parts) == 1:
+            decrypted_token = self._decode_compact_token(token)
+        elif len(parts) == 2:
+            b64_index, encrypted = parts
+            index = int.from_bytes(
+                base64.b64decode(fix_base64_padding(b64_index)), "big", signed=False
+            )
+            decrypted_token = self._get_encryptor(index).decrypt(encrypted)
+        else:
             raise_invalid_token()
 
-        b64_index, encrypted = parts
-        index = int.from_bytes(
-            base64.b64decode(fix_base64_padding(b64_index)), "big", signed=False
-        )
+        if self.is_revoked(decrypted_token):
+            raise_invalid_token()
+
+        return decrypted_token
+
+    def _get_encryptor(self, index: int) -> TokenEncryptor:
         if index >= len(self._encryptors):
             raise_invalid_token()
 
         encryptor_group = self._encryptors[index]
         if encryptor_group is None:
             raise_invalid_token()
+        return encryptor_group[0]
 
-        decrypted_token = encryptor_group[0].decrypt(encrypted)
-
+    def _decode_compact_token(self, token: str) -> Token:
+        try:
+            encrypted = base64.urlsafe_b64decode(fix_base64_padding(token))
+        except (binascii.Error, ValueError):
+            raise_invalid_token()
         if (
-            user_expiration := self._user_token_expirations.get(decrypted_token.user_id)
-        ) is not None and user_expiration[0] > decrypted_token.creation_timestamp:
+            len(encrypted) != COMPACT_TOKEN_SIZE
+            or encrypted[0] != COMPACT_TOKEN_VERSION
+        ):
             raise_invalid_token()
+        return self._get_encryptor(encrypted[1]).decrypt_compact(encrypted)
 
-        return decrypted_token
+    @property
+    def token_prefix(self) -> str:
+        return self._token_prefix
+
+    @property
+    def user_token_expirations(self) -> dict[int, tuple[int, Job]]:
+        return self._user_token_expirations
+
+    def is_revoked(self, token: Token) -> bool:
+        return (
+            user_expiration := self._user_token_expirations.get(token.user_id)
+        ) is not None and user_expiration[0] > token.creation_timestamp
 
     def invalidate_tokens_before(self, token: Token):
         user_id = token.user_id
@@ -157,42 +241,45 @@ class TokenEncryptorManager:
         expiry_timestamp = token.expiry_timestamp
 
         try:
-            old_timestamp, old_task = self._user_token_expirations[user_id]
+            old_timestamp, old_job = self._user_token_expirations[user_id]
         except KeyError:
             pass
         else:
             if old_timestamp > creation_timestamp:
                 return
-            old_task.cancel()
-
-        async def expire():
-            await asyncio.sleep((expiry_timestamp - time.time_ns()) / NS_MULTIPLIER)
-            del self._user_token_expirations[user_id]
+            old_job.cancel()
 
         self._user_token_expirations[user_id] = (
             creation_timestamp,
-            asyncio.create_task(expire()),
+            self._scheduler.call_later(
+                (expiry_timestamp - time.time_ns()) / NS_MULTIPLIER,
+                self._user_token_expirations.pop,
+                user_id,
+                None,
+                name=f"token_expiration[{self._token_prefix}]",
+            ),
         )
 
     def cancel_tokens_expiration(self, user_id: int):
         try:
-            _, task = self._user_token_expirations.pop(user_id)
+            _, job = self._user_token_expirations.pop(user_id)
         except KeyError:
             pass
         else:
-            task.cancel()
+            job.cancel()
 
 
 class TokenEncryptor:
     TOKEN_STRUCT_FORMAT = ">QI32s"  # 32 octets dans le hash pour sha256
 
-    __slots__ = ("_token_validity_time_ns", "_fernet")
+    __slots__ = ("_token_validity_time_ns", "_fernet", "_aead")
 
     def __init__(self, token_validity_time_ns: int):
         self._token_validity_time_ns = token_validity_time_ns
         self._fernet = Fernet(Fernet.generate_key())
+        self._aead = AESGCM(AESGCM.generate_key(256))
 
-    def encrypt(self, user_id: int, passhash: bytes) -> tuple[str, Token]:
+    def _pack(self, user_id: int, passhash: bytes) -> tuple[bytes, Token]:
         token_creation_timestamp = time.time_ns()
         token = Token(
             user_id,
@@ -203,14 +290,45 @@ class TokenEncryptor:
         packed = struct.pack(
             self.TOKEN_STRUCT_FORMAT, token_creation_timestamp, user_id, passhash
         )
+        return packed, token
+
+    @traced("fernet.encrypt")
+    def encrypt(self, user_id: int, passhash: bytes) -> tuple[str, Token]:
+        packed, token = self._pack(user_id, passhash)
         return self._fernet.encrypt(packed).rstrip(b"=").decode("ascii"), token
 
+    @traced("aesgcm.encrypt_token")
+    def encrypt_compact(
+        self, user_id: int, passhash: bytes, header: bytes
+    ) -> tuple[bytes, Token]:
+        packed, token = self._pack(user_id, passhash)
+        nonce = os.urandom(COMPACT_NONCE_SIZE)
+        # L'en-tête (version et id de clé) est authentifié sans être chiffré
+        return header + nonce + self._aead.encrypt(nonce, packed, header), token
+
+    @traced("fernet.decrypt")
     def decrypt(self, encrypted: str) -> Token:
         try:
             decrypted = self._fernet.decrypt(encrypted)
         except (InvalidToken, UnicodeDecodeError):
             raise_invalid_token()
+        return self._unpack(decrypted)
+
+    @traced("aesgcm.decrypt_token")
+    def decrypt_compact(self, encrypted: bytes) -> Token:
+        view = memoryview(encrypted)
+        nonce_end = COMPACT_HEADER_SIZE + COMPACT_NONCE_SIZE
+        try:
+            decrypted = self._aead.decrypt(
+                view[COMPACT_HEADER_SIZE:nonce_end],
+                view[nonce_end:],
+                view[:COMPACT_HEADER_SIZE],
+            )
+        except InvalidTag:
+            raise_invalid_token()
+        return self._unpack(decrypted)
 
+    def _unpack(self, decrypted: bytes) -> Token:
         token_creation_timestamp, user_id, key = struct.unpack(
             self.TOKEN_STRUCT_FORMAT, decrypted
         )
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from config import DATABASE_SYNCHRONOUS
+from core_utilities import span
+
+__all__ = (
+    "SQL",
+    "MIGRATIONS",
+    "WriteQueue",
+    "TracedConnection",
+    "connect",
+    "apply_migrations",
+    "configure_connection",
+    "bump_data_version",
+)
+
+PRAGMAS = (
+    # Sans effet sur une base existante tant qu'elle n'a pas été convertie par POST /api/admin/database/vacuum
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    # En mode WAL, NORMAL ne synchronise qu'aux checkpoints et reste sûr en cas de crash de l'application
+    f"PRAGMA synchronous={DATABASE_SYNCHRONOUS}",
+    "PRAGMA cache_size=-32768",  # 32 Mio
+    "PRAGMA mmap_size=268435456",  # 256 Mio
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+CACHED_STATEMENTS = 256
+WRITE_COALESCE_DELAY = 0.002
+MAX_WRITE_BATCH = 256
+
+_RESULT = TypeVar("_RESULT")
+
+
+class SQL:
+    USER_EXISTS = "SELECT EXISTS(SELECT 1 FROM users WHERE id=?)"
+    SELECT_USER = "SELECT username, passhash FROM users WHERE id=?"
+    INSERT_USER = "INSERT INTO users (id, username, passhash) VALUES (?, ?, ?)"
+    UPDATE_USER = "UPDATE users SET username=?, passhash=? WHERE id=?"
+    DELETE_USER = "DELETE FROM users WHERE id=?"
+    SELECT_DATA_VERSION = "SELECT data_version FROM users WHERE id=?"
+    BUMP_DATA_VERSION = (
+        "UPDATE users SET data_version=data_version+1 WHERE id=? RETURNING data_version"
+    )
+
+    SELECT_SITES_PAGE = (
+        "SELECT id, name, secret FROM sites WHERE user=? AND id>? ORDER BY id LIMIT ?"
+    )
+    SELECT_SITES_WITH_VERSION = (
+        "SELECT id, name, secret, version FROM sites WHERE user=? ORDER BY id"
+    )
+    SELECT_SITE_SECRETS = "SELECT id, secret FROM sites WHERE user=? ORDER BY id"
+    INSERT_SITE = "INSERT INTO sites (user, name, secret, version) VALUES (?, ?, ?, ?) RETURNING id"
+    INSERT_SITES = "INSERT INTO sites (user, name, secret, version) VALUES (?, ?, ?, ?)"
+    LAST_INSERT_ID = "SELECT last_insert_rowid()"
+    RENAME_SITE = (
+        "UPDATE sites SET name=?, version=? WHERE id=? AND user=? RETURNING secret"
+    )
+    REENCRYPT_SITES = "UPDATE sites SET name=?, secret=? WHERE id=?"
+    DELETE_SITE = "DELETE FROM sites WHERE id=? AND user=?"
+    DELETE_USER_SITES = "DELETE FROM sites WHERE user=?"
+
+    INSERT_TOMBSTONE = (
+        "INSERT OR REPLACE INTO deleted_sites (id, user, version) VALUES (?, ?, ?)"
+    )
+    SELECT_TOMBSTONES_SINCE = "SELECT id FROM deleted_sites WHERE user=? AND version>?"
+    DELETE_USER_TOMBSTONES = "DELETE FROM deleted_sites WHERE user=?"
+
+    SELECT_USERNAME_ID = "SELECT user_id FROM usernames WHERE username=?"
+    INSERT_USERNAME = "INSERT INTO usernames (username) VALUES (?) RETURNING user_id"
+    RESTORE_USERNAME = "INSERT INTO usernames (user_id, username) VALUES (?, ?)"
+    RENAME_USERNAME = "UPDATE usernames SET username=? WHERE user_id=?"
+    DELETE_USERNAME = "DELETE FROM usernames WHERE user_id=?"
+    COUNT_USERNAMES = "SELECT COUNT(*) FROM usernames"
+    SELECT_SHARD_COUNT = "SELECT shards FROM storage_info"
+    UPDATE_SHARD_COUNT = "UPDATE storage_info SET shards=?"
+
+
+def _add_column_if_missing(
+    db: sqlite3.Connection, table: str, column: str, definition: str
+):
+    if not any(
+        row[1] == column for row in db.execute(f"PRAGMA table_info({table})").fetchall()
+    ):
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migration_initial_schema(db: sqlite3.Connection):
+    # Les bases antérieures au système de migrations peuvent déjà contenir une partie du schéma
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, passhash BLOB)"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS sites (id INTEGER PRIMARY KEY AUTOINCREMENT, user INT, name BLOB, secret BLOB, FOREIGN KEY(user) REFERENCES users(id))"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_sites_user ON sites (user)")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS deleted_sites (id INTEGER PRIMARY KEY, user INT, version INT, FOREIGN KEY(user) REFERENCES users(id))"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_deleted_sites_user ON deleted_sites (user, version)"
+    )
+    _add_column_if_missing(db, "users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(db, "sites", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _migration_covering_sites_index(db: sqlite3.Connection):
+    # Toutes les lectures de sites d'un utilisateur sont servies par l'index, sans accès à la table
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sites_user_id ON sites (user, id, name, secret, version)"
+    )
+    db.execute("DROP INDEX IF EXISTS idx_sites_user")
+
+
+def _migration_username_index(db: sqlite3.Connection):
+    # Index global des noms d'utilisateur, seul celui de la base d'index est utilisé quand les utilisateurs sont répartis
+    db.execute(
+        "CREATE TABLE usernames (user_id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL)"
+    )
+    db.execute(
+        "INSERT INTO usernames (user_id, username) SELECT id, username FROM users"
+    )
+    # Les identifiants d'utilisateurs supprimés ne doivent pas être réattribués
+    db.execute("DELETE FROM sqlite_sequence WHERE name='usernames'")
+    db.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'usernames', seq FROM sqlite_sequence WHERE name='users'"
+    )
+    db.execute(
+        "CREATE TABLE storage_info (id INTEGER PRIMARY KEY CHECK (id=0), shards INTEGER NOT NULL)"
+    )
+    db.execute("INSERT INTO storage_info (id, shards) VALUES (0, 1)")
+
+
+MIGRATIONS: tuple[Callable[[sqlite3.Connection], None], ...] = (
+    _migration_initial_schema,
+    _migration_covering_sites_index,
+    _migration_username_index,
+)
+
+
+def apply_migrations(db: sqlite3.Connection):
+    current_version = db.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in enumerate(
+        MIGRATIONS[current_version:], current_version + 1
+    ):
+        with db:
+            # Le module sqlite3 n'ouvre pas de transaction implicite pour les requêtes DDL
+            db.execute("BEGIN")
+            migration(db)
+            db.execute(f"PRAGMA user_version={version}")
+        logging.info(f"Applied database migration {version} ({migration.__name__})")
+
+
+class TracedConnection(sqlite3.Connection):
+    # Les paramètres ne sont jamais ajoutés aux spans, ils contiennent des données chiffrées
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        with span("sqlite.execute", {"db.statement": sql}):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters) -> sqlite3.Cursor:
+        with span("sqlite.executemany", {"db.statement": sql}):
+            return super().executemany(sql, parameters)
+
+
+def configure_connection(db: sqlite3.Connection):
+    for pragma in PRAGMAS:
+        db.execute(pragma)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(
+        path, cached_statements=CACHED_STATEMENTS, factory=TracedConnection
+    )
+    configure_connection(db)
+    apply_migrations(db)
+    return db
+
+
+def bump_data_version(db: sqlite3.Connection, user_id: int) -> int:
+    # Doit être appelé dans la transaction qui modifie les sites de l'utilisateur
+    return db.execute(SQL.BUMP_DATA_VERSION, (user_id,)).fetchone()[0]
+
+
+class WriteQueue:
+    __slots__ = (
+        "_db",
+        "_executor",
+        "_coalesce_delay",
+        "_max_batch",
+        "_pending",
+        "_flush_handle",
+        "_flush_task",
+        "commits",
+        "writes",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        coalesce_delay: float = WRITE_COALESCE_DELAY,
+        max_batch: int = MAX_WRITE_BATCH,
+    ):
+        # Connexion dédiée à l'écriture, utilisée uniquement depuis le thread de l'exécuteur
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, cached_statements=CACHED_STATEMENTS
+        )
+        configure_connection(self._db)
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="sqlite-writer")
+        self._coalesce_delay = coalesce_delay
+        self._max_batch = max_batch
+        self._pending: list[tuple[Callable[..., Any], tuple, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self.commits = 0
+        self.writes = 0
+
+    def submit(self, func: Callable[..., _RESULT], *args) -> asyncio.Future[_RESULT]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((func, args, future))
+        # Le span couvre l'attente du lot et la transaction
+        future.add_done_callback(
+            span("sqlite.write", {"db.operation": func.__name__}).end
+        )
+
+        if self._flush_task is None:
+            if len(self._pending) >= self._max_batch:
+                self._start_flush()
+            elif self._flush_handle is None:
+                # Le lot regroupe plusieurs requêtes : il ne s'attache à la trace d'aucune
+                self._flush_handle = loop.call_later(
+                    self._coalesce_delay,
+                    self._start_flush,
+                    context=contextvars.Context(),
+                )
+        return future
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def run_exclusive(
+        self, func: Callable[..., _RESULT], *args
+    ) -> asyncio.Future[_RESULT]:
+        # Hors transaction, sur le thread d'écriture : s'exécute entre deux lots
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, func, self._db, *args
+        )
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(
+                self._flush(), context=contextvars.Context()
+            )
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # Les écritures arrivées pendant une transaction forment le lot suivant
+            while self._pending:
+                # Une écriture abandonnée par son appelant n'est pas validée
+                batch = [
+                    entry
+                    for entry in self._pending[: self._max_batch]
+                    if not entry[2].cancelled()
+                ]
+                del self._pending[: self._max_batch]
+                if not batch:
+                    continue
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self._run_batch, batch
+                    )
+                except BaseException as e:
+                    # Exécuteur arrêté ou erreur hors des savepoints : aucun appelant ne doit rester en attente
+                    for _, _, future in batch:
+                        if future.done():
+                            continue
+                        if isinstance(e, Exception):
+                            future.set_exception(e)
+                        else:
+                            future.cancel()
+                    if not isinstance(e, Exception):
+                        raise
+                    continue
+                for (_, _, future), (success, value) in zip(batch, results):
+                    if future.done():
+                        continue
+                    if success:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+        finally:
+            self._flush_task = None
+
+    def _run_batch(
+        self, batch: list[tuple[Callable[..., Any], tuple, asyncio.Future]]
+    ) -> list[tuple[bool, Any]]:
+        db = self._db
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for func, args, _ in batch:
+                # Chaque écriture a son propre savepoint pour que ses erreurs n'affectent pas les autres
+                db.execute("SAVEPOINT write")
+                try:
+                    value = func(db, *args)
+                except Exception as e:
+                    db.execute("ROLLBACK TO write")
+                    db.execute("RELEASE write")
+                    results.append((False, e))
+                else:
+                    db.execute("RELEASE write")
+                    results.append((True, value))
+            db.commit()
+        except Exception as e:
+            if db.in_transaction:
+                db.rollback()
+            return [(False, e)] * len(batch)
+
+        self.commits += 1
+        self.writes += len(batch)
+        return results
+
+    async def close(self):
+        if self._pending:
+            self._start_flush()
+        if self._flush_task is not None:
+            await self._flush_task
+        self._executor.shutdown()
+        self._db.close()
@@ -1,39 +1,61 @@
 import os
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from typing import Iterable
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from core_utilities import traced
+
+IV_SIZE = 16
 
 
 class Encryptor:
-    __slots__ = ("_key",)
+    __slots__ = ("_key", "_aead")
 
     def __init__(self, key: bytes):
         self._key = key
+        # Le contexte AES (expansion de clé) est préparé une seule fois par clé
+        self._aead = AESGCM(key)
 
-    def encrypt(self, plaintext: bytes):
-        iv = os.urandom(16)
-
-        cipher = Cipher(
-            algorithms.AES(self._key), modes.GCM(iv), backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-
-        ciphertext = encryptor.update(plaintext) + encryptor.finalize()
-        return iv + ciphertext + encryptor.tag
+    def encrypt(self, plaintext: bytes) -> bytes:
+        # Format : IV (16 octets) + texte chiffré + tag (16 derniers octets en AES-GCM)
+        iv = os.urandom(IV_SIZE)
+        return iv + self._aead.encrypt(iv, plaintext, None)
 
     def decrypt(self, ciphertext: bytes) -> bytes:
-        iv = ciphertext[:16]
-        tag = ciphertext[-16:]  # 16 derniers bytes en AES-GCM
-        ciphertext = ciphertext[16:-16]
-
-        cipher = Cipher(
-            algorithms.AES(self._key), modes.GCM(iv, tag), backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
-
-        return decryptor.update(ciphertext) + decryptor.finalize()
+        view = memoryview(ciphertext)
+        return self._aead.decrypt(view[:IV_SIZE], view[IV_SIZE:], None)
+
+    @traced("aesgcm.encrypt_many")
+    def encrypt_many(self, plaintexts: Iterable[bytes]) -> list[bytes]:
+        plaintexts = list(plaintexts)
+        ivs = memoryview(os.urandom(IV_SIZE * len(plaintexts)))
+        encrypt = self._aead.encrypt
+        return [
+            b"".join((iv, encrypt(iv, plaintext, None)))
+            for iv, plaintext in zip(
+                (ivs[i : i + IV_SIZE] for i in range(0, len(ivs), IV_SIZE)),
+                plaintexts,
+            )
+        ]
+
+    @traced("aesgcm.decrypt_many")
+    def decrypt_many(self, ciphertexts: Iterable[bytes]) -> list[bytes]:
+        decrypt = self._aead.decrypt
+        return [
+            decrypt(view[:IV_SIZE], view[IV_SIZE:], None)
+            for view in map(memoryview, ciphertexts)
+        ]
 
     def encrypt_string(self, plaintext: str) -> bytes:
         return self.encrypt(plaintext.encode("utf-8"))
 
     def decrypt_string(self, ciphertext: bytes) -> str:
         return self.decrypt(ciphertext).decode("utf-8")
+
+    def encrypt_strings(self, plaintexts: Iterable[str]) -> list[bytes]:
+        return self.encrypt_many(plaintext.encode("utf-8") for plaintext in plaintexts)
+
+    def decrypt_strings(self, ciphertexts: Iterable[bytes]) -> list[str]:
+        return [
+            plaintext.decode("utf-8") for plaintext in self.decrypt_many(ciphertexts)
+        ]
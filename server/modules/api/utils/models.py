@@ -1,15 +1,30 @@
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
 from pydantic import BaseModel, Field, BeforeValidator
 
+from modules.utils import FieldValidation, specific_field_validator
+from .a2f import (
+    DEFAULT_TOTP_ALGORITHM,
+    DEFAULT_TOTP_DIGITS,
+    MAX_TOTP_DIGITS,
+    MAX_TOTP_PERIOD,
+    MIN_TOTP_DIGITS,
+    TOTP_INTERVAL,
+)
+
 __all__ = (
     "LoginRegisterModel",
     "UpdateSiteModel",
     "CreateSiteModel",
     "DangerousActionModel",
     "UpdateUserModel",
+    "BatchOperationModel",
+    "BatchSitesModel",
+    "MAX_BATCH_OPERATIONS",
 )
 
+MAX_BATCH_OPERATIONS = 1000
+
 
 def _convert_password(s: str) -> bytes:
     assert isinstance(s, str), "Input should be a valid string"
@@ -32,6 +47,12 @@ class UpdateSiteModel(BaseModel):
 
 class CreateSiteModel(UpdateSiteModel):
     secret: str
+    algorithm: Literal["SHA1", "SHA256", "SHA512"] = DEFAULT_TOTP_ALGORITHM
+    digits: int = Field(DEFAULT_TOTP_DIGITS, ge=MIN_TOTP_DIGITS, le=MAX_TOTP_DIGITS)
+    # Les codes doivent changer en même temps que les fenêtres de 30 secondes
+    period: int = Field(
+        TOTP_INTERVAL, gt=0, le=MAX_TOTP_PERIOD, multiple_of=TOTP_INTERVAL
+    )
 
 
 class DangerousActionModel(BaseModel):
@@ -41,3 +62,18 @@ class DangerousActionModel(BaseModel):
 class UpdateUserModel(DangerousActionModel):
     new_username: Username = None
     new_password: Password = None
+
+
+class BatchOperationModel(BaseModel):
+    op: Literal["create", "rename", "delete"]
+    id: int = None
+
+    _check_id = specific_field_validator(
+        (FieldValidation(("id",), "op", ("rename", "delete")),)
+    )
+
+
+class BatchSitesModel(BaseModel):
+    # Chaque opération est validée séparément pour renvoyer un résultat par élément
+    operations: list[dict[str, Any]] = Field(max_length=MAX_BATCH_OPERATIONS)
+    atomic: bool = False
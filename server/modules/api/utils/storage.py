@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+from .database import SQL, WriteQueue, connect
+
+__all__ = (
+    "SITE_ID_RANGE",
+    "Shard",
+    "ShardedStorage",
+    "max_site_id",
+    "reserve_site_ids",
+    "shard_index",
+    "shard_paths",
+)
+
+# Chaque shard attribue ses identifiants de sites dans sa propre plage, ils restent ainsi uniques entre les shards
+# et sous 2**53 pour les clients JavaScript
+SITE_ID_RANGE = 1 << 32
+
+
+def shard_paths(path: str, shard_count: int) -> list[str]:
+    if shard_count == 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f"{root}.shard{i}{ext}" for i in range(shard_count)]
+
+
+def shard_index(user_id: int, shard_count: int) -> int:
+    return user_id % shard_count
+
+
+def max_site_id(db: sqlite3.Connection) -> int:
+    return db.execute(
+        "SELECT MAX("
+        "COALESCE((SELECT seq FROM sqlite_sequence WHERE name='sites'), 0), "
+        "COALESCE((SELECT MAX(id) FROM sites), 0), "
+        "COALESCE((SELECT MAX(id) FROM deleted_sites), 0))"
+    ).fetchone()[0]
+
+
+def reserve_site_ids(db: sqlite3.Connection, start: int):
+    # AUTOINCREMENT reprend après le plus grand de sqlite_sequence et des identifiants existants
+    if (
+        db.execute(
+            "UPDATE sqlite_sequence SET seq=? WHERE name='sites'", (start,)
+        ).rowcount
+        == 0
+    ):
+        db.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('sites', ?)", (start,)
+        )
+
+
+def _insert_username(db: sqlite3.Connection, username: str) -> int:
+    return db.execute(SQL.INSERT_USERNAME, (username,)).fetchone()[0]
+
+
+def _restore_username(db: sqlite3.Connection, user_id: int, username: str):
+    db.execute(SQL.RESTORE_USERNAME, (user_id, username))
+
+
+def _rename_username(db: sqlite3.Connection, user_id: int, username: str):
+    db.execute(SQL.RENAME_USERNAME, (username, user_id))
+
+
+def _delete_username(db: sqlite3.Connection, user_id: int):
+    db.execute(SQL.DELETE_USERNAME, (user_id,))
+
+
+class Shard:
+    __slots__ = ("path", "db", "writes")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = connect(path)
+        self.writes = WriteQueue(path)
+
+    async def close(self):
+        await self.writes.close()
+        self.db.close()
+
+
+class ShardedStorage:
+    __slots__ = ("index", "shards")
+
+    def __init__(self, path: str, shard_count: int):
+        if shard_count < 1:
+            raise ValueError("The number of shards must be at least 1")
+
+        self.shards = tuple(
+            Shard(shard_path) for shard_path in shard_paths(path, shard_count)
+        )
+        # Sans répartition, l'index et les données partagent le même fichier et la même file d'écriture
+        self.index = self.shards[0] if shard_count == 1 else Shard(path)
+        self._check_shard_count(shard_count)
+
+    def _check_shard_count(self, shard_count: int):
+        db = self.index.db
+        stored_count = db.execute(SQL.SELECT_SHARD_COUNT).fetchone()[0]
+        if stored_count == shard_count:
+            return
+        if db.execute(SQL.COUNT_USERNAMES).fetchone()[0]:
+            raise RuntimeError(
+                f"The database is split into {stored_count} shards but {shard_count} are configured, run reshard.py first"
+            )
+
+        # Une base sans utilisateur peut adopter directement la nouvelle répartition
+        for i, shard in enumerate(self.shards):
+            with shard.db:
+                reserve_site_ids(shard.db, i * SITE_ID_RANGE)
+        with db:
+            db.execute(SQL.UPDATE_SHARD_COUNT, (shard_count,))
+
+    def shard(self, user_id: int) -> Shard:
+        return self.shards[shard_index(user_id, len(self.shards))]
+
+    def find_user_id(self, username: str) -> int | None:
+        res = self.index.db.execute(SQL.SELECT_USERNAME_ID, (username,)).fetchone()
+        return None if res is None else res[0]
+
+    async def reserve_username(self, username: str) -> int:
+        # Lève sqlite3.IntegrityError si le nom d'utilisateur est déjà pris
+        return await self.index.writes.submit(_insert_username, username)
+
+    async def restore_username(self, user_id: int, username: str):
+        # Lève sqlite3.IntegrityError si le nom d'utilisateur a été repris entre-temps
+        await self.index.writes.submit(_restore_username, user_id, username)
+
+    async def rename_username(self, user_id: int, username: str):
+        # Lève sqlite3.IntegrityError si le nom d'utilisateur est déjà pris
+        await self.index.writes.submit(_rename_username, user_id, username)
+
+    async def release_username(self, user_id: int):
+        await self.index.writes.submit(_delete_username, user_id)
+
+    async def close(self):
+        for shard in self.shards:
+            await shard.close()
+        if self.index not in self.shards:
+            await self.index.close()
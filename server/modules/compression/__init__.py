@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+
+from aiohttp import hdrs, web
+from aiohttp.web import StreamResponse
+
+from config import COMPRESSION_EXECUTOR_SIZE, COMPRESSION_MIN_SIZE
+from core_utilities import CustomRequest, HTTPStatus, span
+from decorators import route
+from module_loader import HTTPModule, ModulesManager, PreHandlerModule
+from ..utils import check_admin, make_json_response
+from ..utils.compression import (
+    COMPRESSORS,
+    CompressionStats,
+    is_compressible,
+    negotiate_encoding,
+    timed_compress,
+)
+
+
+def add_vary(response: web.Response, header: str):
+    vary = response.headers.get(hdrs.VARY)
+    if vary is None:
+        response.headers[hdrs.VARY] = header
+    elif header.lower() not in vary.lower():
+        response.headers[hdrs.VARY] = f"{vary}, {header}"
+
+
+class CompressionModule(PreHandlerModule):
+    __slots__ = ("stats", "skipped")
+
+    def __init__(self):
+        self.stats = {encoding: CompressionStats() for encoding in COMPRESSORS}
+        self.skipped: collections.Counter[str] = collections.Counter()
+
+    def status(self) -> dict:
+        return {
+            "min_size": COMPRESSION_MIN_SIZE,
+            "executor_size": COMPRESSION_EXECUTOR_SIZE,
+            "encodings": {
+                encoding: stats.to_dict() for encoding, stats in self.stats.items()
+            },
+            "skipped": dict(self.skipped),
+        }
+
+    def reset(self):
+        self.stats = {encoding: CompressionStats() for encoding in COMPRESSORS}
+        self.skipped.clear()
+
+    async def handle_response(
+        self, request: CustomRequest, response: StreamResponse
+    ) -> None:
+        # Les réponses diffusées (export, flux, WebSocket, fichiers) sont déjà en cours d'envoi
+        if not isinstance(response, web.Response) or response.prepared:
+            self.skipped["streamed"] += 1
+            return
+        body = response.body
+        if not isinstance(body, (bytes, bytearray)) or len(body) < COMPRESSION_MIN_SIZE:
+            self.skipped["small"] += 1
+            return
+        if hdrs.CONTENT_ENCODING in response.headers:
+            self.skipped["already_encoded"] += 1
+            return
+        if not is_compressible(response.content_type):
+            self.skipped["binary_type"] += 1
+            return
+
+        # La réponse dépend d'Accept-Encoding même si elle part non compressée
+        add_vary(response, hdrs.ACCEPT_ENCODING)
+        encoding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+        if encoding is None:
+            self.skipped["not_accepted"] += 1
+            return
+
+        compress = COMPRESSORS[encoding]
+        offloaded = len(body) >= COMPRESSION_EXECUTOR_SIZE
+        with span(
+            "compression",
+            {"compression.encoding": encoding, "compression.bytes_in": len(body)},
+        ):
+            if offloaded:
+                compressed, seconds = await asyncio.get_running_loop().run_in_executor(
+                    None, timed_compress, compress, body
+                )
+            else:
+                compressed, seconds = timed_compress(compress, body)
+        if len(compressed) >= len(body):
+            self.skipped["incompressible"] += 1
+            return
+
+        self.stats[encoding].add(len(body), len(compressed), seconds, offloaded)
+        response.body = compressed
+        response.headers[hdrs.CONTENT_ENCODING] = encoding
+        etag = response.headers.get(hdrs.ETAG)
+        if etag is not None and not etag.startswith("W/"):
+            # Un ETag fort désigne les octets exacts de la représentation non compressée
+            response.headers[hdrs.ETAG] = f"W/{etag}"
+
+
+class CompressionHTTPModule(HTTPModule):
+    __slots__ = ("compression",)
+
+    def __init__(self):
+        super().__init__()
+        self.compression = self.modules_manager.get_module(CompressionModule)
+
+    @route("GET", "/api/admin/compression")
+    async def get_compression(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(HTTPStatus.OK, self.compression.status())
+
+    @route("POST", "/api/admin/compression/reset")
+    async def post_compression_reset(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        self.compression.reset()
+        return make_json_response(HTTPStatus.OK, self.compression.status())
+
+
+async def setup(modules_manager: ModulesManager):
+    # Ajouté après les autres : compresse la réponse avant tout autre handle_response
+    modules_manager.add_prehandler_module(CompressionModule())
+    modules_manager.add_http_module(CompressionHTTPModule())
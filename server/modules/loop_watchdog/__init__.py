@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from aiohttp.web import StreamResponse
+
+from config import LOOP_HEARTBEAT_MS, LOOP_STALL_THRESHOLD_MS
+from core_utilities import CustomRequest, HTTPStatus
+from decorators import route
+from module_loader import HTTPModule, ModulesManager
+from ..utils import check_admin, make_json_response
+from ..utils.loop_watchdog import LoopWatchdog
+
+
+class LoopWatchdogModule(HTTPModule):
+    __slots__ = ("watchdog",)
+
+    def __init__(self):
+        super().__init__()
+        self.watchdog = LoopWatchdog(
+            LOOP_HEARTBEAT_MS / 1000, LOOP_STALL_THRESHOLD_MS / 1000
+        )
+        self.watchdog.start()
+
+    async def on_unload(self):
+        self.watchdog.stop()
+
+    @route("GET", "/api/admin/loop")
+    async def get_loop(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                "lag": self.watchdog.lag_percentiles(),
+                "threshold_ms": self.watchdog.threshold * 1000,
+                "stall_count": self.watchdog.stall_count,
+                "stalls": [stall.to_dict() for stall in self.watchdog.stalls],
+            },
+        )
+
+    @route("POST", "/api/admin/loop/reset")
+    async def post_loop_reset(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        self.watchdog.reset()
+        return make_json_response(HTTPStatus.OK, self.watchdog.lag_percentiles())
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_http_module(LoopWatchdogModule())
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import tracemalloc
+
+from aiohttp.web import StreamResponse
+
+from config import MEMORY_LOG_INTERVAL
+from core_utilities import (
+    CustomHTTPException,
+    CustomRequest,
+    HTTPStatus,
+    PRIORITY_LOW,
+    current_rss,
+    memory_registry,
+)
+from decorators import route
+from module_loader import HTTPModule, ModulesManager
+from ..utils import check_admin, get_query_int, make_json_response
+
+MAX_TRACEMALLOC_FRAMES = 25
+MAX_TRACEMALLOC_LIMIT = 200
+# Les allocations de tracemalloc et des imports ne sont pas celles de l'application
+TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GiB"
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+
+
+def compare_snapshots(
+    baseline: tracemalloc.Snapshot, limit: int
+) -> list[dict[str, int | str]]:
+    stats = take_snapshot().compare_to(baseline, "traceback")
+    return [
+        {
+            "location": [
+                f"{frame.filename}:{frame.lineno}" for frame in stat.traceback
+            ],
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+            "count": stat.count,
+        }
+        for stat in stats[:limit]
+    ]
+
+
+class MemoryModule(HTTPModule):
+    __slots__ = ("_baseline",)
+
+    def __init__(self):
+        super().__init__()
+        self._baseline: tracemalloc.Snapshot | None = None
+        if MEMORY_LOG_INTERVAL:
+            self.scheduler.every(
+                MEMORY_LOG_INTERVAL,
+                self.log_memory,
+                name="memory.log",
+                priority=PRIORITY_LOW,
+            )
+
+    async def on_unload(self):
+        if self._baseline is not None:
+            self._baseline = None
+            tracemalloc.stop()
+
+    def log_memory(self):
+        # Une seule ligne, pour suivre la croissance dans les journaux
+        self.logger.info(
+            f"rss={format_bytes(current_rss())} tasks={len(asyncio.all_tasks())} "
+            + " ".join(
+                f"{name}={entry['size']}/{format_bytes(entry['bytes'])}"
+                for name, entry in memory_registry.report().items()
+            )
+        )
+
+    def tracemalloc_status(self) -> dict:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        }
+
+    @route("GET", "/api/admin/memory")
+    async def get_memory(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                "rss_bytes": current_rss(),
+                "asyncio_tasks": len(asyncio.all_tasks()),
+                "gc_counts": gc.get_count(),
+                "structures": memory_registry.report(),
+                "tracemalloc": self.tracemalloc_status(),
+            },
+        )
+
+    @route("PUT", "/api/admin/memory/tracemalloc")
+    async def put_tracemalloc(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        frames = get_query_int(
+            request, "frames", 1, minimum=1, maximum=MAX_TRACEMALLOC_FRAMES
+        )
+        # Le suivi ralentit toutes les allocations : il n'est actif que sur demande
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+        self._baseline = await asyncio.to_thread(take_snapshot)
+        return make_json_response(HTTPStatus.OK, self.tracemalloc_status())
+
+    @route("GET", "/api/admin/memory/tracemalloc")
+    async def get_tracemalloc(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        limit = get_query_int(
+            request, "limit", 20, minimum=1, maximum=MAX_TRACEMALLOC_LIMIT
+        )
+        if self._baseline is None or not tracemalloc.is_tracing():
+            raise CustomHTTPException.only_explain(
+                HTTPStatus.CONFLICT, "tracemalloc is not started"
+            )
+        return make_json_response(
+            HTTPStatus.OK,
+            {
+                **self.tracemalloc_status(),
+                "top": await asyncio.to_thread(
+                    compare_snapshots, self._baseline, limit
+                ),
+            },
+        )
+
+    @route("DELETE", "/api/admin/memory/tracemalloc")
+    async def delete_tracemalloc(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        self._baseline = None
+        tracemalloc.stop()
+        return make_json_response(HTTPStatus.OK, self.tracemalloc_status())
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_http_module(MemoryModule())
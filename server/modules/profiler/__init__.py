@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import sys
+from typing import Literal
+
+from aiohttp import hdrs
+from aiohttp.web import StreamResponse
+from aiohttp.web_urldispatcher import UrlMappingMatchInfo
+from pydantic import BaseModel, Field
+
+from config import ADMIN_TOKEN
+from core_utilities import CustomRequest, HTTPStatus, memory_registry
+from decorators import route
+from module_loader import HTTPModule, ModulesManager, PreHandlerModule
+from ..utils import (
+    check_admin,
+    is_admin_request,
+    make_json_response,
+    parse_json_content,
+)
+from ..utils.profiling import (
+    PROFILES_DIR,
+    ProfileAggregator,
+    StackSampler,
+    StackSession,
+)
+
+PROFILE_HEADER = "X-Profile"
+MAX_SETTINGS_BODY_SIZE = 1024
+
+
+def get_route_key(method: str, match_info: UrlMappingMatchInfo | None) -> str:
+    resource = None if match_info is None else match_info.route.resource
+    return f"{method} {'<unmatched>' if resource is None else resource.canonical}"
+
+
+class ProfilerSettingsModel(BaseModel):
+    mode: Literal["cprofile", "stack"] = "stack"
+    # Une requête sur sample_rate est profilée
+    sample_rate: int = Field(100, ge=1)
+    # Clés de route telles que rapportées par GET /api/admin/profiler, toutes si vide
+    routes: list[str] = Field(default_factory=list)
+    interval_ms: float = Field(5, gt=0, le=1000)
+
+
+class ProfilerModule(PreHandlerModule):
+    __slots__ = (
+        "enabled",
+        "settings",
+        "aggregator",
+        "sampler",
+        "_countdown",
+        "_cprofile_busy",
+    )
+
+    def __init__(self):
+        self.enabled = False
+        self.settings = ProfilerSettingsModel()
+        self.aggregator = ProfileAggregator()
+        memory_registry.register("profiler.routes", lambda: self.aggregator.routes)
+        self.sampler = StackSampler(self.settings.interval_ms / 1000)
+        self._countdown = self.settings.sample_rate
+        self._cprofile_busy = False
+
+    def configure(self, settings: ProfilerSettingsModel):
+        self.settings = settings
+        self.sampler.interval = settings.interval_ms / 1000
+        self._countdown = settings.sample_rate
+        self.enabled = True
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "settings": self.settings.model_dump(),
+            "routes": self.aggregator.summary(),
+        }
+
+    async def _resolve_route_key(self, request: CustomRequest) -> str | None:
+        try:
+            router = self.modules_manager.special_module.get_router(request)
+        except KeyError:
+            return None
+        return get_route_key(request.method, await router.resolve(request))
+
+    async def _should_profile(self, request: CustomRequest) -> bool:
+        # Une connexion WebSocket garderait le profileur actif pendant toute sa durée
+        if hdrs.UPGRADE in request.headers:
+            return False
+        if PROFILE_HEADER in request.headers and is_admin_request(request):
+            return True
+        if not self.enabled:
+            return False
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        if (
+            self.settings.routes
+            and await self._resolve_route_key(request) not in self.settings.routes
+        ):
+            # Le compteur reste à zéro : la prochaine requête de la bonne route sera profilée
+            return False
+        self._countdown = self.settings.sample_rate
+        return True
+
+    async def handle_request(self, request: CustomRequest) -> StreamResponse | None:
+        # Coût quasi nul lorsque le profilage est désactivé
+        if not self.enabled and PROFILE_HEADER not in request.headers:
+            return None
+        if not await self._should_profile(request):
+            return None
+
+        if self.settings.mode == "cprofile":
+            # cProfile observe tout le thread : une seule requête profilée à la fois
+            if self._cprofile_busy:
+                return None
+            self._cprofile_busy = True
+            profiler = cProfile.Profile()
+            request.attached["profiler"] = profiler
+            profiler.enable()
+        else:
+            # La frame de WebApplication._handle de cette requête sert de racine aux piles échantillonnées
+            request.attached["profiler"] = self.sampler.start(sys._getframe(1))
+        # handle_response n'est pas appelée si la requête est annulée, le profileur doit tout de même s'arrêter
+        asyncio.current_task().add_done_callback(
+            functools.partial(self._on_request_done, request)
+        )
+        return None
+
+    def _stop(self, request: CustomRequest) -> cProfile.Profile | StackSession | None:
+        profiler: cProfile.Profile | StackSession | None = request.attached.pop(
+            "profiler", None
+        )
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            self._cprofile_busy = False
+        elif profiler is not None:
+            self.sampler.stop(profiler)
+        return profiler
+
+    def _on_request_done(self, request: CustomRequest, _task: asyncio.Task):
+        # Le profil d'une requête interrompue est incomplet, il n'est pas agrégé
+        self._stop(request)
+
+    async def handle_response(
+        self, request: CustomRequest, response: StreamResponse
+    ) -> None:
+        profiler = self._stop(request)
+        if profiler is None:
+            return
+        route_key = get_route_key(request.method, request._match_info)
+        if isinstance(profiler, cProfile.Profile):
+            self.aggregator.add_profile(route_key, profiler)
+        else:
+            self.aggregator.add_stacks(route_key, profiler.stacks)
+
+    async def dump(self) -> list[str]:
+        aggregator, self.aggregator = self.aggregator, ProfileAggregator()
+        return await asyncio.to_thread(aggregator.dump, PROFILES_DIR)
+
+    async def on_unload(self):
+        self.enabled = False
+        if self.aggregator.routes:
+            await self.dump()
+
+
+class ProfilerHTTPModule(HTTPModule):
+    __slots__ = ("profiler",)
+
+    def __init__(self):
+        super().__init__()
+        self.profiler = self.modules_manager.get_module(ProfilerModule)
+
+    @route("GET", "/api/admin/profiler")
+    async def get_profiler(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(HTTPStatus.OK, self.profiler.status())
+
+    @route("PUT", "/api/admin/profiler", MAX_SETTINGS_BODY_SIZE)
+    async def put_profiler(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        self.profiler.configure(
+            await parse_json_content(request, ProfilerSettingsModel)
+        )
+        return make_json_response(HTTPStatus.OK, self.profiler.status())
+
+    @route("DELETE", "/api/admin/profiler")
+    async def delete_profiler(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        self.profiler.enabled = False
+        return make_json_response(HTTPStatus.OK, self.profiler.status())
+
+    @route("POST", "/api/admin/profiler/dump")
+    async def post_profiler_dump(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(HTTPStatus.OK, {"files": await self.profiler.dump()})
+
+
+async def setup(modules_manager: ModulesManager):
+    # Sans jeton d'administration, le profilage ne peut pas être activé
+    if ADMIN_TOKEN is None:
+        return
+    modules_manager.add_prehandler_module(
+        ProfilerModule(), before="SpecialPreHandlerModule"
+    )
+    modules_manager.add_http_module(ProfilerHTTPModule())
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from config import (
+    RATELIMIT_CAPACITY,
+    RATELIMIT_SHM_PATH,
+    RATELIMIT_SNAPSHOT_INTERVAL,
+    RATELIMIT_SNAPSHOT_PATH,
+)
+from core_utilities import PRIORITY_LOW
+from module_loader import BaseModule, ModulesManager
+from ..utils.ratelimit_table import RateLimitTable
+
+
+class RateLimitStoreModule(BaseModule):
+    __slots__ = ("table",)
+
+    def __init__(self):
+        self.table = RateLimitTable(RATELIMIT_SHM_PATH, RATELIMIT_CAPACITY)
+        # Une table partagée déjà remplie par un autre processus est plus récente que la sauvegarde
+        if self.table.fresh and RATELIMIT_SNAPSHOT_PATH:
+            restored = self.table.restore(RATELIMIT_SNAPSHOT_PATH, time.time())
+            if restored:
+                self.logger.info(f"Restored {restored} rate-limit entries")
+        if RATELIMIT_SNAPSHOT_PATH:
+            self.scheduler.every(
+                RATELIMIT_SNAPSHOT_INTERVAL,
+                self.snapshot,
+                name="ratelimits.snapshot",
+                priority=PRIORITY_LOW,
+            )
+
+    async def snapshot(self):
+        try:
+            await asyncio.to_thread(
+                RateLimitTable.write_snapshot,
+                self.table.dump(),
+                RATELIMIT_SNAPSHOT_PATH,
+                time.time(),
+            )
+        except OSError as e:
+            self.logger.warning(f"Could not save the rate-limit snapshot: {e}")
+
+    async def on_unload(self):
+        if RATELIMIT_SNAPSHOT_PATH:
+            await self.snapshot()
+        self.table.close()
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_module_base(RateLimitStoreModule())
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from aiohttp.web import StreamResponse
+
+from core_utilities import CustomRequest, HTTPStatus
+from decorators import route
+from module_loader import HTTPModule, ModulesManager
+from ..utils import check_admin, make_json_response
+
+
+class SchedulerModule(HTTPModule):
+    __slots__ = ()
+
+    @route("GET", "/api/admin/scheduler")
+    async def get_scheduler(self, request: CustomRequest) -> StreamResponse:
+        check_admin(request)
+        return make_json_response(HTTPStatus.OK, self.scheduler.to_dict())
+
+
+async def setup(modules_manager: ModulesManager):
+    modules_manager.add_http_module(SchedulerModule())
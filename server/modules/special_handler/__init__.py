@@ -4,7 +4,7 @@ from typing import Callable, Sequence, Awaitable, Any
 from aiofiles import open as aopen
 from aiohttp import web, web_urldispatcher, hdrs
 
-from config import DOMAINS, DEV_ENV
+from config import DOMAINS, DEV_ENV, MAX_BODY_SIZE
 from decorators import route
 from core_utilities import (
     SiteHost,
@@ -12,9 +12,11 @@ from core_utilities import (
     CustomHTTPException,
     silent_delitem,
     HTTPStatus,
+    span,
 )
 from module_loader import ModulesManager, SpecialModule, HTTPModule, PreHandlerModule
 from ..utils import (
+    check_content_length,
     is_api_path,
     JsonHttpException,
     json_compact_dumps,
@@ -24,16 +26,17 @@ SITEHOST_MAIN = SiteHost(*DOMAINS)
 
 
 class SpecialHandlerModule(SpecialModule):
-    __slots__ = ("routers",)
+    __slots__ = ("routers", "body_limits")
 
     def __init__(self):
         self.routers: dict[SiteHost, web_urldispatcher.UrlDispatcher] = {}
+        self.body_limits: dict[web_urldispatcher.AbstractRoute, int] = {}
 
     def on_add_http_routes(
         self,
         attr: str,
         value: Callable[[CustomRequest], Awaitable[web.StreamResponse]],
-        routes: list[tuple[Sequence[str], str]],
+        routes: list[tuple[Sequence[str], str, int | None]],
         extras: dict[str, Any],
     ):
         site_host: SiteHost = extras.get("site_host", SITEHOST_MAIN)
@@ -41,11 +44,12 @@ class SpecialHandlerModule(SpecialModule):
         if router is None:
             router = self.routers[site_host] = web_urldispatcher.UrlDispatcher()
 
-        for route_key in routes:
-            methods, path = route_key
+        for methods, path, max_body_size in routes:
             for method in methods:
                 # noinspection PyTypeChecker
-                router.add_route(method, path, value)
+                resource_route = router.add_route(method, path, value)
+                if max_body_size is not None:
+                    self.body_limits[resource_route] = max_body_size
 
     def get_sitehost(self, request: CustomRequest) -> SiteHost | None:
         host = request.host_without_port.lower()
@@ -102,18 +106,27 @@ class SpecialHandlerModule(SpecialModule):
         except KeyError:
             raise CustomHTTPException(HTTPStatus.NOT_FOUND) from None
 
-        match_info = await router.resolve(request)
+        with span("routing"):
+            match_info = await router.resolve(request)
         match_info.freeze()
 
         resp = None
         request._match_info = match_info
+        request._client_max_size = self.body_limits.get(match_info.route, MAX_BODY_SIZE)
+        # Avant la réponse à Expect: 100-continue, le client n'envoie alors pas le corps
+        check_content_length(request)
         expect = request.headers.get(hdrs.EXPECT)
         if expect:
             resp = await match_info.expect_handler(request)
             await request.writer.drain()
 
         if resp is None:
-            resp = await match_info.handler(request)
+            resource = match_info.route.resource
+            with span(
+                "handler",
+                None if resource is None else {"http.route": resource.canonical},
+            ):
+                resp = await match_info.handler(request)
 
         return resp
 
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import time
+import zlib
+from typing import Callable
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = (
+    "COMPRESSORS",
+    "CompressionStats",
+    "is_compressible",
+    "negotiate_encoding",
+    "timed_compress",
+)
+
+GZIP_LEVEL = 6
+# Réglages adaptés à un contenu dynamique : les niveaux maximaux coûtent bien plus qu'ils ne gagnent
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+}
+
+
+def gzip_compress(data: bytes) -> bytes:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def brotli_compress(data: bytes) -> bytes:
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def zstd_compress(data: bytes) -> bytes:
+    # ZstdCompressor n'est pas utilisable par plusieurs threads à la fois
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+# Par ordre de préférence à qualité égale dans Accept-Encoding
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = zstd_compress
+if brotli is not None:
+    COMPRESSORS["br"] = brotli_compress
+COMPRESSORS["gzip"] = gzip_compress
+
+
+class CompressionStats:
+    __slots__ = ("responses", "bytes_in", "bytes_out", "seconds", "offloaded")
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.offloaded = 0
+
+    def add(self, bytes_in: int, bytes_out: int, seconds: float, offloaded: bool):
+        self.responses += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.seconds += seconds
+        self.offloaded += offloaded
+
+    def to_dict(self) -> dict:
+        return {
+            "responses": self.responses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else None,
+            "mean_ms": (
+                self.seconds / self.responses * 1000 if self.responses else None
+            ),
+            "us_per_kib": (
+                self.seconds / self.bytes_in * 1024 * 1e6 if self.bytes_in else None
+            ),
+            "offloaded": self.offloaded,
+        }
+
+
+def is_compressible(content_type: str) -> bool:
+    # Les images, archives et flux binaires sont déjà compressés
+    return (
+        content_type.startswith("text/")
+        or content_type in COMPRESSIBLE_TYPES
+        or content_type.endswith(("+json", "+xml"))
+    )
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    best = None
+    best_quality = 0.0
+    wildcard_quality = 0.0
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if coding == "*":
+            wildcard_quality = quality
+        elif coding:
+            qualities[coding] = quality
+    for encoding in COMPRESSORS:
+        quality = qualities.get(encoding, wildcard_quality)
+        # À qualité égale, l'ordre de COMPRESSORS l'emporte
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
+
+
+def timed_compress(
+    compress: Callable[[bytes], bytes], data: bytes
+) -> tuple[bytes, float]:
+    # Mesuré dans le thread qui compresse : l'attente dans l'exécuteur n'est pas comptée
+    start = time.perf_counter()
+    return compress(data), time.perf_counter() - start
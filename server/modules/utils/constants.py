@@ -1,3 +1,4 @@
-__all__ = ("NS_MULTIPLIER",)
+__all__ = ("NS_MULTIPLIER", "ADMIN_TOKEN_HEADER")
 
 NS_MULTIPLIER = 1_000_000_000
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
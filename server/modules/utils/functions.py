@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+import hmac
 import json
 import mimetypes
 import os
 import posixpath
-from typing import Any, Type
+from typing import Any, AsyncIterator, Type
 
-from aiohttp import web_response, web, StreamReader
+from aiohttp import hdrs, web_response, web, StreamReader
 
+from config import ADMIN_TOKEN, BODY_READ_TIMEOUT, MAX_BUFFERED_BODY_SIZE
 from core_utilities import CustomRequest, CustomHTTPException, HTTPStatus
+from .constants import ADMIN_TOKEN_HEADER
 
 __all__ = (
     "make_json_response",
@@ -17,11 +20,21 @@ __all__ = (
     "verify_content",
     "guess_type",
     "read_max",
+    "BodyBudget",
+    "body_budget",
+    "check_content_length",
+    "read_body",
+    "iter_body",
+    "iter_lines",
     "translate_path",
     "is_api_path",
     "url_match",
     "json_compact_dumps",
     "fix_base64_padding",
+    "get_query_int",
+    "is_admin_request",
+    "check_admin",
+    "etag_matches",
 )
 
 
@@ -35,14 +48,69 @@ async def load_json_request(request: CustomRequest) -> Any:
             HTTPStatus.EXPECTATION_FAILED, "JSON content type expected"
         )
     try:
-        return json.loads(await request.text())
-    except json.JSONDecodeError:
+        return json.loads(await read_body(request))
+    except (json.JSONDecodeError, UnicodeDecodeError):
         raise CustomHTTPException.only_explain(HTTPStatus.BAD_REQUEST, "Bad JSON")
 
 
-def make_json_response(status: int, data: Any) -> web_response.StreamResponse:
+def get_query_int(
+    request: CustomRequest,
+    name: str,
+    default: int | None = None,
+    minimum: int | None = None,
+    maximum: int | None = None,
+) -> int | None:
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise CustomHTTPException.only_explain(
+            HTTPStatus.BAD_REQUEST, f"Invalid '{name}'"
+        )
+    if (minimum is not None and value < minimum) or (
+        maximum is not None and value > maximum
+    ):
+        raise CustomHTTPException.only_explain(
+            HTTPStatus.BAD_REQUEST, f"Invalid '{name}'"
+        )
+    return value
+
+
+def is_admin_request(request: CustomRequest) -> bool:
+    if ADMIN_TOKEN is None:
+        return False
+    token = request.headers.get(ADMIN_TOKEN_HEADER)
+    return token is not None and hmac.compare_digest(
+        token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")
+    )
+
+
+def check_admin(request: CustomRequest):
+    # Sans jeton configuré, les routes d'administration n'existent pas
+    if ADMIN_TOKEN is None:
+        raise CustomHTTPException(HTTPStatus.NOT_FOUND)
+    if not is_admin_request(request):
+        raise CustomHTTPException(HTTPStatus.FORBIDDEN)
+
+
+def etag_matches(request: CustomRequest, etag: str) -> bool:
+    # Comparaison faible d'If-None-Match : l'ETag d'une réponse compressée est rendu faible
+    for value in request.headers.getall(hdrs.IF_NONE_MATCH, ()):
+        for tag in value.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == etag.removeprefix("W/"):
+                return True
+    return False
+
+
+def make_json_response(
+    status: int, data: Any, headers=None
+) -> web_response.StreamResponse:
     return web.Response(
         status=status,
+        headers=headers,
         content_type="application/json",
         charset="utf-8",
         body=json_compact_dumps(data).encode("utf-8"),
@@ -96,6 +164,110 @@ async def read_max(stream: StreamReader, n: int):
         return e.partial
 
 
+class BodyBudget:
+    __slots__ = ("capacity", "used")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+
+    def reserve(self, size: int) -> bool:
+        if self.used + size > self.capacity:
+            return False
+        self.used += size
+        return True
+
+    def release(self, size: int):
+        self.used -= size
+
+
+# Borne la mémoire des corps lus en entier, même avec beaucoup de clients lents
+body_budget = BodyBudget(MAX_BUFFERED_BODY_SIZE)
+
+
+def body_too_large(request: CustomRequest) -> CustomHTTPException:
+    return CustomHTTPException.only_explain(
+        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        f"Request body is limited to {request.client_max_size} bytes",
+    )
+
+
+def check_content_length(request: CustomRequest):
+    content_length = request.content_length
+    if content_length is not None and content_length > request.client_max_size:
+        raise body_too_large(request)
+
+
+async def read_body(request: CustomRequest) -> bytes:
+    if request._read_bytes is not None:
+        return request._read_bytes
+    check_content_length(request)
+    max_size = request.client_max_size
+    # Sans Content-Length, la limite de la route est réservée
+    reserved = request.content_length
+    if reserved is None:
+        reserved = max_size + 1
+    if not body_budget.reserve(reserved):
+        raise CustomHTTPException.only_explain(
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            "Too many request bodies are being received",
+            {"Retry-After": "1"},
+        )
+    try:
+        async with asyncio.timeout(BODY_READ_TIMEOUT):
+            body = await read_max(request.content, reserved)
+    except TimeoutError:
+        raise CustomHTTPException.only_explain(
+            HTTPStatus.REQUEST_TIMEOUT, "Request body was not received in time"
+        ) from None
+    finally:
+        body_budget.release(reserved)
+    if len(body) > max_size:
+        raise body_too_large(request)
+    # request.read(), text() et json() réutilisent le corps lu
+    request._read_bytes = body
+    return body
+
+
+async def iter_body(request: CustomRequest) -> AsyncIterator[bytes]:
+    # Lecture par morceaux pour les gros corps : seul le délai entre deux morceaux est borné
+    check_content_length(request)
+    total_size = 0
+    while True:
+        try:
+            async with asyncio.timeout(BODY_READ_TIMEOUT):
+                chunk = await request.content.readany()
+        except TimeoutError:
+            raise CustomHTTPException.only_explain(
+                HTTPStatus.REQUEST_TIMEOUT, "Request body was not received in time"
+            ) from None
+        if not chunk:
+            return
+        total_size += len(chunk)
+        if total_size > request.client_max_size:
+            raise body_too_large(request)
+        yield chunk
+
+
+async def iter_lines(
+    request: CustomRequest, max_line_size: int
+) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for chunk in iter_body(request):
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_size:
+            raise CustomHTTPException.only_explain(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Line too long"
+            )
+    if buffer:
+        yield bytes(buffer)
+
+
 if not mimetypes.inited:
     mimetypes.init()  # try to read system mime.types
 _extensions_map = mimetypes.types_map.copy()
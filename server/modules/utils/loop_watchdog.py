@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+
+from core_utilities import AutoLogger
+
+__all__ = ("LoopStall", "LoopWatchdog")
+
+HANDLE_QUALNAME = "WebApplication._handle"
+MODULES_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+def find_blocking_handler(frame: FrameType | None) -> str | None:
+    # Seuls f_code et f_lineno sont lus : f_locals matérialiserait les variables d'une frame en cours d'exécution
+    handler = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_qualname == HANDLE_QUALNAME:
+            return handler
+        # Frame la plus profonde du code des modules : là où la requête bloque la boucle
+        if handler is None and os.path.abspath(code.co_filename).startswith(
+            MODULES_PATH
+        ):
+            handler = f"{code.co_qualname}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+class LoopStall:
+    __slots__ = ("last_beat", "detected_at", "duration", "handler", "stack")
+
+    def __init__(
+        self,
+        last_beat: float,
+        detected_at: float,
+        handler: str | None,
+        stack: list[str],
+    ):
+        # Dernier battement avant le blocage, identifie le blocage
+        self.last_beat = last_beat
+        self.detected_at = detected_at
+        # Durée mesurée lorsque la boucle reprend
+        self.duration: float | None = None
+        self.handler = handler
+        self.stack = stack
+
+    def to_dict(self) -> dict:
+        return {
+            "detected_at": self.detected_at,
+            "duration_ms": None if self.duration is None else self.duration * 1000,
+            "handler": self.handler,
+            "stack": self.stack,
+        }
+
+
+class LoopWatchdog(AutoLogger):
+    __slots__ = (
+        "interval",
+        "threshold",
+        "lags",
+        "stalls",
+        "stall_count",
+        "_loop",
+        "_loop_thread_id",
+        "_expected",
+        "_last_beat",
+        "_handle",
+        "_current_stall",
+        "_stop",
+        "_thread",
+    )
+
+    def __init__(
+        self,
+        interval: float,
+        threshold: float,
+        history: int = 15000,
+        stall_history: int = 50,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: collections.deque[float] = collections.deque(maxlen=history)
+        self.stalls: collections.deque[LoopStall] = collections.deque(
+            maxlen=stall_history
+        )
+        self.stall_count = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id = 0
+        self._expected = 0.0
+        self._last_beat = 0.0
+        self._handle: asyncio.TimerHandle | None = None
+        self._current_stall: LoopStall | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._schedule()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="LoopWatchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        self.lags.clear()
+        self.stalls.clear()
+        self.stall_count = 0
+
+    def _schedule(self):
+        self._expected = self._loop.time() + self.interval
+        self._handle = self._loop.call_at(self._expected, self._beat)
+
+    def _beat(self):
+        # Retard du rappel par rapport à l'heure prévue : temps pendant lequel la boucle n'a pas pu l'exécuter
+        lag = max(self._loop.time() - self._expected, 0)
+        self.lags.append(lag)
+        previous_beat, self._last_beat = self._last_beat, time.monotonic()
+        stall = self._current_stall
+        if stall is not None and stall.last_beat == previous_beat:
+            stall.duration = lag
+            self.logger.warning(
+                f"Event loop blocked for {lag * 1000:.0f}ms"
+                + ("" if stall.handler is None else f" in {stall.handler}")
+            )
+        self._schedule()
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            last_beat = self._last_beat
+            if (
+                self._current_stall is not None
+                and self._current_stall.last_beat == last_beat
+            ) or time.monotonic() - last_beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            # La boucle a pu reprendre entre-temps
+            if frame is None or self._last_beat != last_beat:
+                continue
+            stall = LoopStall(
+                last_beat,
+                time.time(),
+                find_blocking_handler(frame),
+                traceback.format_stack(frame),
+            )
+            del frame
+            self._current_stall = stall
+            self.stalls.append(stall)
+            self.stall_count += 1
+            self.logger.warning(
+                f"Event loop blocked for more than {self.threshold * 1000:.0f}ms"
+                + ("" if stall.handler is None else f" in {stall.handler}")
+                + ", stack:\n"
+                + "".join(stall.stack)
+            )
+
+    def lag_percentiles(self) -> dict[str, float | int]:
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0}
+        return {
+            "samples": len(lags),
+            **{
+                f"p{percentile}_ms": lags[
+                    min(len(lags) - 1, len(lags) * percentile // 100)
+                ]
+                * 1000
+                for percentile in (50, 90, 99)
+            },
+            "max_ms": lags[-1] * 1000,
+        }
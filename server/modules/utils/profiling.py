@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import cProfile
+import collections
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from types import FrameType
+
+__all__ = (
+    "PROFILES_DIR",
+    "RouteProfile",
+    "ProfileAggregator",
+    "StackSession",
+    "StackSampler",
+)
+
+PROFILES_DIR = os.path.join("logs", "profiles")
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class RouteProfile:
+    __slots__ = ("requests", "stats", "stacks")
+
+    def __init__(self):
+        self.requests = 0
+        self.stats: pstats.Stats | None = None
+        self.stacks: collections.Counter[str] = collections.Counter()
+
+
+class ProfileAggregator:
+    __slots__ = ("routes",)
+
+    def __init__(self):
+        self.routes: dict[str, RouteProfile] = {}
+
+    def _route(self, route: str) -> RouteProfile:
+        profile = self.routes.get(route)
+        if profile is None:
+            profile = self.routes[route] = RouteProfile()
+        profile.requests += 1
+        return profile
+
+    def add_profile(self, route: str, profiler: cProfile.Profile):
+        profile = self._route(route)
+        if profile.stats is None:
+            profile.stats = pstats.Stats(profiler)
+        else:
+            profile.stats.add(profiler)
+
+    def add_stacks(self, route: str, stacks: collections.Counter[str]):
+        self._route(route).stacks.update(stacks)
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        return {
+            route: {"requests": profile.requests, "samples": profile.stacks.total()}
+            for route, profile in self.routes.items()
+        }
+
+    def dump(self, directory: str) -> list[str]:
+        os.makedirs(directory, exist_ok=True)
+        prefix = time.strftime("%Y-%m-%d_%H-%M-%S")
+        paths = []
+        for route, profile in self.routes.items():
+            base = os.path.join(
+                directory, f"{prefix}_{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')}"
+            )
+            if profile.stats is not None:
+                profile.stats.dump_stats(base + ".pstats")
+                paths.append(base + ".pstats")
+            if profile.stacks:
+                # Format « collapsed » de flamegraph.pl / speedscope, la route sert de racine
+                with open(base + ".collapsed", "w", encoding="utf-8") as file:
+                    for stack, count in profile.stacks.items():
+                        file.write(f"{route};{stack} {count}\n")
+                paths.append(base + ".collapsed")
+        return paths
+
+
+class StackSession:
+    __slots__ = ("root", "stacks")
+
+    def __init__(self, root: FrameType):
+        self.root = root
+        self.stacks: collections.Counter[str] = collections.Counter()
+
+
+class StackSampler:
+    __slots__ = ("interval", "_sessions", "_lock", "_thread")
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sessions: dict[FrameType, StackSession] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, root: FrameType) -> StackSession:
+        # Le thread d'échantillonnage n'existe que tant qu'une requête est profilée
+        session = StackSession(root)
+        with self._lock:
+            self._sessions[root] = session
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(threading.get_ident(),),
+                    name="StackSampler",
+                    daemon=True,
+                )
+                self._thread.start()
+        return session
+
+    def stop(self, session: StackSession):
+        with self._lock:
+            self._sessions.pop(session.root, None)
+
+    def _run(self, thread_id: int):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                # Un échantillon n'est attribué à une requête que si sa coroutine est en cours d'exécution
+                frame = sys._current_frames().get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    session = self._sessions.get(frame)
+                    if session is not None:
+                        session.stacks[";".join(map(frame_label, reversed(stack)))] += 1
+                        break
+                    frame = frame.f_back
@@ -6,6 +6,7 @@ from typing import NamedTuple, Collection, Any, TypeVar
 from pydantic import BaseModel, model_validator, ValidationError
 
 from core_utilities import CustomHTTPException, HTTPStatus, CustomRequest
+from .functions import read_body
 
 __all__ = (
     "FieldValidation",
@@ -52,8 +53,8 @@ async def parse_json_content(request: CustomRequest, model: type[_MODEL]) -> _MO
             HTTPStatus.BAD_REQUEST, "Expected JSON body"
         )
     try:
-        data = await request.json()
-    except json.JSONDecodeError as e:
+        data = json.loads(await read_body(request))
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
         raise CustomHTTPException.only_explain(
             HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}"
         )
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import math
+import mmap
+import os
+import struct
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__all__ = ("RateLimitTable",)
+
+MAGIC = b"SLRATE01"
+# Magie, capacité, réservé
+HEADER = struct.Struct("<8sII")
+# Hachage de la clé (0 : jamais utilisé), fin de la fenêtre (horloge murale, partagée entre processus), appels
+SLOT = struct.Struct("<QdI4x")
+SNAPSHOT_HEADER = struct.Struct("<8sI")
+SNAPSHOT_ENTRY = struct.Struct("<QdI")
+MAX_PROBES = 32
+
+
+class RateLimitTable:
+    __slots__ = ("capacity", "fresh", "_fd", "_mmap")
+
+    def __init__(self, path: str | None, capacity: int):
+        self.capacity = capacity
+        size = HEADER.size + SLOT.size * capacity
+        if path is None:
+            # Table propre au processus
+            self._fd = None
+            self._mmap = mmap.mmap(-1, size)
+            HEADER.pack_into(self._mmap, 0, MAGIC, capacity, 0)
+            self.fresh = True
+            return
+
+        if fcntl is None:
+            raise RuntimeError("A shared rate-limit table requires fcntl")
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            header = os.pread(self._fd, HEADER.size, 0)
+            # Table créée par ce processus, ou d'une capacité différente : elle est réinitialisée
+            self.fresh = (
+                len(header) != HEADER.size
+                or HEADER.unpack(header)[:2] != (MAGIC, capacity)
+                or os.fstat(self._fd).st_size != size
+            )
+            if self.fresh:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, capacity, 0), 0)
+            self._mmap = mmap.mmap(self._fd, size)
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Verrou exclusif sur le fichier : une lecture-modification-écriture n'est jamais entrelacée entre processus
+        if self._fd is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def key(namespace: str, value: str) -> int:
+        digest = hashlib.blake2b(
+            f"{namespace}\0{value}".encode("utf-8"), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def _find(self, key: int, now: float) -> tuple[int, bool]:
+        # Adressage ouvert : les emplacements ne redeviennent jamais vides, les chaînes ne sont pas coupées
+        start = key % self.capacity
+        reusable = None
+        oldest = None
+        oldest_reset_at = math.inf
+        for probe in range(min(MAX_PROBES, self.capacity)):
+            offset = HEADER.size + (start + probe) % self.capacity * SLOT.size
+            slot_key, reset_at, _ = SLOT.unpack_from(self._mmap, offset)
+            if slot_key == key:
+                return offset, True
+            if slot_key == 0:
+                return offset if reusable is None else reusable, False
+            if reusable is None and reset_at <= now:
+                reusable = offset
+            if reset_at < oldest_reset_at:
+                oldest, oldest_reset_at = offset, reset_at
+        # Voisinage plein d'entrées actives : celle qui expire le plus tôt est évincée
+        return oldest if reusable is None else reusable, False
+
+    def get(self, key: int, now: float) -> tuple[float, int] | None:
+        with self._locked():
+            offset, found = self._find(key, now)
+            if not found:
+                return None
+            _, reset_at, calls = SLOT.unpack_from(self._mmap, offset)
+        if reset_at <= now:
+            return None
+        return reset_at, calls
+
+    def hit(self, key: int, reset: float, now: float) -> tuple[float, int]:
+        with self._locked():
+            offset, found = self._find(key, now)
+            if found:
+                _, reset_at, calls = SLOT.unpack_from(self._mmap, offset)
+                if reset_at > now:
+                    calls += 1
+                else:
+                    reset_at, calls = now + reset, 1
+            else:
+                reset_at, calls = now + reset, 1
+            SLOT.pack_into(self._mmap, offset, key, reset_at, calls)
+        return reset_at, calls
+
+    def _merge(self, key: int, reset_at: float, calls: int, now: float):
+        with self._locked():
+            offset, found = self._find(key, now)
+            if found:
+                _, current_reset_at, current_calls = SLOT.unpack_from(
+                    self._mmap, offset
+                )
+                if current_reset_at > now and current_calls >= calls:
+                    return
+            SLOT.pack_into(self._mmap, offset, key, reset_at, calls)
+
+    def dump(self) -> bytes:
+        # Copie brute sous verrou, l'analyse et l'écriture peuvent se faire hors de la boucle
+        with self._locked():
+            return self._mmap[HEADER.size :]
+
+    @staticmethod
+    def write_snapshot(slots: bytes, path: str, now: float) -> int:
+        entries = [
+            SNAPSHOT_ENTRY.pack(key, reset_at, calls)
+            for key, reset_at, calls in SLOT.iter_unpack(slots)
+            if key and reset_at > now
+        ]
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(MAGIC, len(entries)))
+            file.write(b"".join(entries))
+        os.replace(temporary_path, path)
+        return len(entries)
+
+    def restore(self, path: str, now: float) -> int:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        if len(data) < SNAPSHOT_HEADER.size:
+            return 0
+        magic, count = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != MAGIC or len(data) != SNAPSHOT_HEADER.size + count * (
+            SNAPSHOT_ENTRY.size
+        ):
+            return 0
+        restored = 0
+        for key, reset_at, calls in SNAPSHOT_ENTRY.iter_unpack(
+            memoryview(data)[SNAPSHOT_HEADER.size :]
+        ):
+            if reset_at > now:
+                self._merge(key, reset_at, calls, now)
+                restored += 1
+        return restored
+
+    def close(self):
+        self._mmap.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import math
+import time
 from abc import ABC, abstractmethod
 from typing import Callable, Collection
 
@@ -12,6 +14,7 @@ from module_loader import HTTPModule
 from types_ import REQUEST_HANDLER_FUNC
 from .types import CHECK_RATELIMIT_FUNCTIONS
 from .errors import JsonHttpException
+from .ratelimit_table import RateLimitTable
 
 __all__ = (
     "RateLimitCheckerBase",
@@ -19,6 +22,7 @@ __all__ = (
     "RateLimitCheckerGroup",
     "RateLimitWrapper",
     "basic_ip_ratelimit",
+    "shared_ip_ratelimit",
     "check_ratelimit",
     "ip_lock",
 )
@@ -124,6 +128,26 @@ def basic_ip_ratelimit(limit: int, reset: float) -> CHECK_RATELIMIT_FUNCTIONS:
     return predicate, counter
 
 
+def shared_ip_ratelimit(
+    table: RateLimitTable, name: str, limit: int, reset: float
+) -> CHECK_RATELIMIT_FUNCTIONS:
+    # Même comportement que basic_ip_ratelimit, avec un état partagé par les processus et conservé au redémarrage
+    def predicate(_: HTTPModule, request: CustomRequest) -> float:
+        now = time.time()
+        entry = table.get(table.key(name, request.remote), now)
+        if entry is None:
+            return 0
+        reset_at, calls = entry
+        if calls >= limit:
+            return reset_at - now
+        return 0
+
+    def counter(_: HTTPModule, request: CustomRequest):
+        table.hit(table.key(name, request.remote), reset, time.time())
+
+    return predicate, counter
+
+
 def check_ratelimit(
     predicate: CHECK_RATELIMIT_FUNCTIONS,
 ) -> Callable[[REQUEST_HANDLER_FUNC], RateLimitWrapper]:
@@ -136,6 +160,7 @@ def check_ratelimit(
 def ip_lock(func: REQUEST_HANDLER_FUNC) -> REQUEST_HANDLER_FUNC:
     locks: dict[str, tuple[asyncio.Lock, set[asyncio.Task]]] = {}
 
+    @functools.wraps(func)
     async def locker(module: HTTPModule, request: CustomRequest) -> web.StreamResponse:
         current_task = asyncio.current_task()
         ip = request.remote
@@ -156,4 +181,6 @@ def ip_lock(func: REQUEST_HANDLER_FUNC) -> REQUEST_HANDLER_FUNC:
             if not awaiting_tasks:
                 del locks[ip]
 
+    # Enregistrés dans memory_registry par le module, à chaque chargement
+    locker.locks = locks
     return locker
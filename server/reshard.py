@@ -0,0 +1,125 @@
+import argparse
+import os
+import sqlite3
+
+from config import DATABASE_PATH
+from modules.api.utils.database import SQL, connect
+from modules.api.utils.storage import (
+    SITE_ID_RANGE,
+    max_site_id,
+    reserve_site_ids,
+    shard_paths,
+)
+
+SHARD_TABLES = (
+    ("users", "id"),
+    ("sites", "user"),
+    ("deleted_sites", "user"),
+)
+
+
+def close_checkpointed(db: sqlite3.Connection):
+    # Les fichiers déplacés ne doivent plus avoir de journal WAL en attente
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+
+
+def remove_database(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def copy_shard(
+    db: sqlite3.Connection,
+    source_path: str,
+    shard_count: int,
+    shard_index: int,
+):
+    # ATTACH est interdit dans une transaction
+    db.execute("ATTACH DATABASE ? AS source", (source_path,))
+    with db:
+        db.execute("BEGIN")
+        for table, user_column in SHARD_TABLES:
+            db.execute(
+                f"INSERT INTO {table} SELECT * FROM source.{table} WHERE {user_column} % ? = ?",
+                (shard_count, shard_index),
+            )
+    db.execute("DETACH DATABASE source")
+
+
+def copy_index(db: sqlite3.Connection, index_path: str):
+    db.execute("ATTACH DATABASE ? AS source", (index_path,))
+    with db:
+        db.execute("BEGIN")
+        db.execute("INSERT INTO usernames SELECT * FROM source.usernames")
+        db.execute(
+            "UPDATE sqlite_sequence SET seq=(SELECT seq FROM source.sqlite_sequence WHERE name='usernames') WHERE name='usernames'"
+        )
+    db.execute("DETACH DATABASE source")
+
+
+def reshard(path: str, new_count: int):
+    index = connect(path)
+    old_count = index.execute(SQL.SELECT_SHARD_COUNT).fetchone()[0]
+    if old_count == new_count:
+        index.close()
+        print(f"The database is already split into {new_count} shards")
+        return
+
+    old_paths = shard_paths(path, old_count)
+    new_paths = shard_paths(path, new_count)
+
+    # Les nouvelles plages d'identifiants de sites commencent après tous les identifiants déjà attribués
+    first_free_site_id = 0
+    for old_path in old_paths:
+        db = index if old_path == path else connect(old_path)
+        first_free_site_id = max(first_free_site_id, max_site_id(db))
+        if db is not index:
+            close_checkpointed(db)
+    close_checkpointed(index)
+
+    temp_paths = [new_path + ".reshard" for new_path in new_paths]
+    for shard_index, temp_path in enumerate(temp_paths):
+        remove_database(temp_path)
+        db = connect(temp_path)
+        for old_path in old_paths:
+            copy_shard(db, old_path, new_count, shard_index)
+        if new_paths[shard_index] == path:
+            copy_index(db, path)
+        with db:
+            reserve_site_ids(db, first_free_site_id + shard_index * SITE_ID_RANGE)
+            db.execute(SQL.UPDATE_SHARD_COUNT, (new_count,))
+        close_checkpointed(db)
+        print(f"Built shard {shard_index} ({new_paths[shard_index]})")
+
+    for temp_path, new_path in zip(temp_paths, new_paths):
+        remove_database(new_path)
+        os.replace(temp_path, new_path)
+    for old_path in old_paths:
+        if old_path not in new_paths and old_path != path:
+            remove_database(old_path)
+
+    if path not in new_paths:
+        index = connect(path)
+        with index:
+            index.execute("BEGIN")
+            for table, _ in reversed(SHARD_TABLES):
+                index.execute(f"DELETE FROM {table}")
+            index.execute(SQL.UPDATE_SHARD_COUNT, (new_count,))
+        index.execute("VACUUM")
+        close_checkpointed(index)
+
+    print(f"Resharded the database from {old_count} to {new_count} shards")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Redistribute users across a new number of database shards. The server must be stopped."
+    )
+    parser.add_argument("shards", type=int)
+    parser.add_argument("--database", default=DATABASE_PATH)
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("The number of shards must be at least 1")
+    reshard(args.database, args.shards)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les tests importent les paquets du serveur comme main.py, depuis ce dossier
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
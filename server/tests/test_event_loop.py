@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import sys
+import threading
+
+import pytest
+
+from core_utilities import (
+    EVENT_LOOP_BACKENDS,
+    Scheduler,
+    cancel_tasks,
+    memory_registry,
+    new_event_loop,
+)
+from core_utilities.functions import ainput
+
+
+@pytest.fixture(params=EVENT_LOOP_BACKENDS)
+def loop(request):
+    if request.param == "uvloop":
+        uvloop = pytest.importorskip("uvloop")
+    loop = new_event_loop(request.param)
+    if request.param == "uvloop":
+        assert isinstance(loop, uvloop.Loop)
+    yield loop
+    if not loop.is_closed():
+        cancel_tasks(asyncio.all_tasks(loop), loop)
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+@pytest.fixture
+def modules_manager():
+    import module_loader
+
+    modules_manager = module_loader.ModulesManager()
+    yield modules_manager
+    # Chaque gestionnaire enregistre ses structures sous les mêmes noms
+    memory_registry.clear()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        new_event_loop("trio")
+
+
+def test_uvloop_fallback(monkeypatch, caplog):
+    # Une entrée None dans sys.modules fait échouer l'import comme un paquet absent
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    with caplog.at_level(logging.WARNING):
+        loop = new_event_loop("uvloop")
+    try:
+        assert isinstance(loop, asyncio.BaseEventLoop)
+    finally:
+        loop.close()
+    assert "uvloop is not installed" in caplog.text
+
+
+def test_cancel_tasks(loop):
+    async def failing_cleanup():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            raise RuntimeError("cleanup failed")
+
+    sleeper = loop.create_task(asyncio.sleep(3600))
+    failing = loop.create_task(failing_cleanup())
+    loop.run_until_complete(asyncio.sleep(0))
+    contexts = []
+    loop.set_exception_handler(lambda _, context: contexts.append(context))
+
+    cancel_tasks({sleeper, failing}, loop)
+
+    assert sleeper.cancelled()
+    assert [context["task"] for context in contexts] == [failing]
+    assert isinstance(contexts[0]["exception"], RuntimeError)
+
+
+def test_cancel_no_tasks(loop):
+    cancel_tasks(set(), loop)
+    assert not asyncio.all_tasks(loop)
+
+
+def test_ainput(loop, monkeypatch):
+    threads = []
+
+    def fake_input(prompt):
+        threads.append(threading.current_thread())
+        return f"{prompt}y"
+
+    monkeypatch.setattr("builtins.input", fake_input)
+    assert loop.run_until_complete(ainput("> ")) == "> y"
+    # input() bloque : il ne doit pas être appelé dans le thread de la boucle
+    assert threads and threads[0] is not threading.current_thread()
+
+
+def test_scheduler_priority_and_concurrency(loop):
+    async def main():
+        scheduler = Scheduler(1)
+        order = []
+
+        async def job(name):
+            order.append(name)
+            await asyncio.sleep(0)
+
+        scheduler.spawn(job, "first")
+        scheduler.spawn(job, "low", priority=10)
+        scheduler.spawn(job, "high", priority=-10)
+        while scheduler.jobs:
+            await asyncio.sleep(0.01)
+        return order
+
+    assert loop.run_until_complete(main()) == ["first", "high", "low"]
+
+
+def test_scheduler_every(loop):
+    async def main():
+        scheduler = Scheduler()
+        ticks = []
+        job = scheduler.every(0.01, lambda: ticks.append(1), name="tick")
+        await asyncio.sleep(0.1)
+        job.cancel()
+        await asyncio.sleep(0.02)
+        return scheduler, len(ticks)
+
+    scheduler, ticks = loop.run_until_complete(main())
+    assert ticks >= 3
+    assert scheduler.stats["tick"].runs == ticks
+    assert not scheduler.jobs
+
+
+def test_scheduler_failure(loop):
+    async def main():
+        scheduler = Scheduler()
+
+        async def failing():
+            raise ValueError("boom")
+
+        scheduler.spawn(failing, name="failing")
+        await asyncio.sleep(0.01)
+        return scheduler
+
+    stats = loop.run_until_complete(main()).stats["failing"]
+    assert (stats.runs, stats.failures) == (1, 1)
+    assert stats.last_error == "ValueError('boom')"
+
+
+def test_scheduler_cancel_before_start(loop):
+    async def main():
+        scheduler = Scheduler(1)
+        started = asyncio.Event()
+
+        async def job():
+            started.set()
+
+        # La tâche créée n'a pas encore démarré : sa place doit tout de même être libérée
+        scheduler.spawn(asyncio.sleep, 3600, name="sleep")._task.cancel()
+        scheduler.spawn(job, name="job")
+        await asyncio.wait_for(started.wait(), 1)
+        return scheduler
+
+    scheduler = loop.run_until_complete(main())
+    assert scheduler.stats["sleep"].cancelled == 1
+    assert scheduler.stats["sleep"].runs == 0
+
+
+def test_scheduler_cancel_all(loop):
+    async def main():
+        scheduler = Scheduler(1)
+        running = scheduler.spawn(asyncio.sleep, 3600, name="running")
+        queued = scheduler.spawn(asyncio.sleep, 3600, name="queued")
+        later = scheduler.call_later(3600, asyncio.sleep, 0, name="later")
+        await asyncio.sleep(0)
+        assert running.running and not queued.running
+        await scheduler.cancel_all()
+        return scheduler, (running, queued, later)
+
+    scheduler, jobs = loop.run_until_complete(main())
+    assert all(job.cancelled for job in jobs)
+    assert not scheduler.jobs
+    assert scheduler.to_dict()["running"] == 0
+    assert scheduler.stats["running"].cancelled == 1
+    assert "queued" not in scheduler.stats
+
+
+def test_shutdown(loop, modules_manager):
+    # Même séquence que main.py : arrêt de la boucle, annulation, puis fermeture
+    unloaded = []
+    ticks = []
+
+    async def runner():
+        modules_manager.scheduler.every(0.01, lambda: ticks.append(1), name="tick")
+        modules_manager.ready.set()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await modules_manager.unload()
+            unloaded.append(True)
+
+    main_task = loop.create_task(runner())
+    loop.call_later(0.1, loop.stop)
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        cancel_tasks({main_task}, loop)
+        cancel_tasks(asyncio.all_tasks(loop), loop)
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+        asyncio.set_event_loop(None)
+
+    assert unloaded == [True]
+    assert ticks
+    assert not modules_manager.scheduler.jobs
+    assert not modules_manager.ready.is_set()
@@ -1,20 +1,37 @@
 import asyncio
+import contextlib
 import functools
 import logging
-import ssl
 import traceback
-
-from aiohttp import web_request, web_server, web, web_response, web_log, web_protocol
+from typing import Iterable
+
+from aiohttp import (
+    hdrs,
+    web_request,
+    web_server,
+    web,
+    web_response,
+    web_log,
+    web_protocol,
+)
 from aiohttp.web_request import BaseRequest
 from aiohttp.web_response import StreamResponse
 
 import module_loader
-from core_utilities import CustomRequest, CustomHTTPException, HTTPStatus, AutoLogger
+from config import MAX_BODY_SIZE
+from listeners import Listener
+from core_utilities import (
+    CustomRequest,
+    CustomHTTPException,
+    HTTPStatus,
+    AutoLogger,
+    NOOP_SPAN,
+    span,
+    tracer,
+)
 
 __all__ = ("WebApplication",)
 
-CLIENT_MAX_SIZE = 8 * 1024**2
-
 
 class WebAccessLogger(web_log.AccessLogger):
     LOG_FORMAT = '%a "%r" %s %b "%{Host}i" "%{User-Agent}i" %Dms'
@@ -80,7 +97,18 @@ class WebApplication(web_server.Server, AutoLogger):
 
     async def _handle(self, request: CustomRequest) -> web_response.StreamResponse:
         await self.modules_manager.ready.wait()
-        with self.modules_manager.requests_counter:
+        # Les connexions WebSocket restent ouvertes : elles ne comptent pas dans l'activité HTTP
+        # et ne sont pas tracées, leur span racine recueillerait toutes les actualisations
+        if request.headers.get(hdrs.UPGRADE, "").lower() == "websocket":
+            http_requests_counter = contextlib.nullcontext()
+            root_span = NOOP_SPAN
+        else:
+            http_requests_counter = self.modules_manager.http_requests_counter
+            root_span = tracer.start_trace(
+                request.method,
+                {"http.request.method": request.method, "url.path": request.path},
+            )
+        with self.modules_manager.requests_counter, http_requests_counter, root_span:
             request.site_host = self.modules_manager.special_module.get_sitehost(
                 request
             )
@@ -89,7 +117,8 @@ class WebApplication(web_server.Server, AutoLogger):
             try:
                 for pre_handler in self.modules_manager.pre_handlers:
                     pre_handlers_stack.append(pre_handler)
-                    response = await pre_handler.handle_request(request)
+                    with span(f"{pre_handler.__class__.__name__}.handle_request"):
+                        response = await pre_handler.handle_request(request)
                     if response is not None:
                         break
                 else:
@@ -118,14 +147,30 @@ class WebApplication(web_server.Server, AutoLogger):
                     )
                 )
 
+            # Corps refusé sans être lu : la connexion n'est pas réutilisée
+            if response.status >= 400 and not request.content.is_eof():
+                response.force_close()
+
             for pre_handler in reversed(pre_handlers_stack):
                 # noinspection PyBroadException
                 try:
-                    await pre_handler.handle_response(request, response)
+                    with span(f"{pre_handler.__class__.__name__}.handle_response"):
+                        await pre_handler.handle_response(request, response)
                 except Exception:
                     self.logger.error(
                         f"Error occured during execution of {pre_handler} handle_response method :\n{traceback.format_exc()}"
                     )
+
+            # Nom du span racine selon les conventions OpenTelemetry : méthode et route
+            match_info = request._match_info
+            if match_info is not None and match_info.route.resource is not None:
+                root_span.update_name(
+                    f"{request.method} {match_info.route.resource.canonical}"
+                )
+                root_span.set_attribute(
+                    "http.route", match_info.route.resource.canonical
+                )
+            root_span.set_attribute("http.response.status_code", response.status)
             return response
 
     def _make_request(
@@ -144,13 +189,15 @@ class WebApplication(web_server.Server, AutoLogger):
             writer,
             task,
             self._loop,
-            client_max_size=CLIENT_MAX_SIZE,
+            # Remplacée par la limite de la route une fois celle-ci résolue
+            client_max_size=MAX_BODY_SIZE,
         )
 
-    async def run(self, host: str, port: int, ssl_context: ssl.SSLContext | None):
+    async def run(self, listeners: Iterable[Listener]):
+        # Un seul runner pour toutes les écoutes
         runner = web.ServerRunner(self)
         await runner.setup()
-        address = f"{'http' if ssl_context is None else 'https'}://[{host}]:{port}/"
-        site = web.TCPSite(runner, host, port, ssl_context=ssl_context)
-        await site.start()
-        print(f"======= Serving on {address} ======")
+        for listener in listeners:
+            site = listener.make_site(runner)
+            await site.start()
+            print(f"======= Serving on {site.name} ======")